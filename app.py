@@ -3,89 +3,74 @@ from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse,
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, case, or_, and_, update
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, date, timedelta
 from calendar import monthrange
 import pandas as pd
+import asyncio
+import hmac
 import io
 import os
 import shutil
-from fastapi.responses import JSONResponse
+import re
+import json
+import sqlite3
+import tempfile
+import time
+from fastapi.responses import JSONResponse, Response
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 import pytz
 
-from db import engine, Base, get_db
-from models import User, Product, Transaction, TransactionItem, Setting, StockUpdate
-from auth import verify_password, require_login, hash_password
+from db import engine, async_engine, get_db, get_async_db, SessionLocal, DB_PATH
+from models import User, Product, Transaction, TransactionItem, Setting, StockUpdate, DailySales, DailyProductSales
+from auth import (
+    require_login, hash_password, verify_password_async, LoginBusy, login_retry_after, record_login_failure, record_login_success,
+    shutdown_password_workers, require_admin, dummy_password_hash,
+)
+from search import search_products
+from migrations import run_migrations
+from rollups import apply_checkout_to_rollups, clear_rollups, get_sales_totals, rebuild_rollups, local_date_modifier
+from settings_cache import get_settings, refresh_settings_cache, get_timezone_name, get_tzinfo, get_utc_offset, UTC_OFFSET_HOURS
+from catalog import CATALOG_VERSION, get_counter, next_counters, mark_products_changed, record_product_deleted, reset_catalog, get_catalog_changes, publish_product_changes
+from report_cache import REPORT_DATA_VERSION, cached_report, bump_report_version, reset_report_version
+from identity import get_identity, get_identity_async, session_user, bump_identity_version, reset_identity_version, invalidate_identity
+from xlsx_stream import Sheet, stream_xlsx
+from importers import (
+    ImportFileError, StockImportConflict, check_excel_filename, read_import_file, import_products,
+    import_stock_updates, preview_stock_updates, preview_rows, apply_stock_updates, PRODUCT_IMPORT_COLUMNS, STOCK_IMPORT_COLUMNS,
+)
+from jobs import (
+    submit_job, new_job_id, job_file_path, get_job, serialize_job, fail_interrupted_jobs, cleanup_expired_artifacts,
+    shutdown_job_workers,
+)
+from events import broker, event_stream, format_sse, publish_after_commit
+from metrics import MetricsMiddleware, render_metrics, query_budget
+from slow_query import worst_queries, SLOW_QUERY_MS, SLOW_QUERY_LOG
+from profiler import ProfilerMiddleware, list_profiles, profile_path
 from sqlalchemy import text
 
-Base.metadata.create_all(bind=engine)
-
-# Auto-migration: Tambahkan kolom cost_price jika belum ada dan buat tabel stock_updates
-def run_migrations():
-    try:
-        with engine.begin() as conn:  # Gunakan begin() untuk auto-commit
-            # Cek dan tambahkan cost_price ke products
-            try:
-                result = conn.execute(text("PRAGMA table_info(products)"))
-                columns = [row[1] for row in result]
-                if 'cost_price' not in columns:
-                    conn.execute(text("ALTER TABLE products ADD COLUMN cost_price FLOAT NOT NULL DEFAULT 0"))
-                    print("[OK] Migration: Kolom cost_price ditambahkan ke tabel products")
-            except Exception as e:
-                print(f"Migration products: {e}")
-            
-            # Cek dan tambahkan cost_price ke transaction_items
-            try:
-                result = conn.execute(text("PRAGMA table_info(transaction_items)"))
-                columns = [row[1] for row in result]
-                if 'cost_price' not in columns:
-                    conn.execute(text("ALTER TABLE transaction_items ADD COLUMN cost_price FLOAT NOT NULL DEFAULT 0"))
-                    print("[OK] Migration: Kolom cost_price ditambahkan ke tabel transaction_items")
-            except Exception as e:
-                print(f"Migration transaction_items: {e}")
-            
-            # Cek dan buat tabel stock_updates jika belum ada
-            try:
-                result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='stock_updates'"))
-                if not result.fetchone():
-                    conn.execute(text("""
-                        CREATE TABLE stock_updates (
-                            id INTEGER NOT NULL PRIMARY KEY,
-                            product_id INTEGER NOT NULL,
-                            product_code VARCHAR NOT NULL,
-                            product_name VARCHAR NOT NULL,
-                            old_stock INTEGER NOT NULL DEFAULT 0,
-                            new_stock INTEGER NOT NULL DEFAULT 0,
-                            stock_added INTEGER NOT NULL DEFAULT 0,
-                            cost_price FLOAT NOT NULL DEFAULT 0,
-                            total_pengeluaran FLOAT NOT NULL DEFAULT 0,
-                            created_at DATETIME,
-                            updated_by VARCHAR
-                        )
-                    """))
-                    print("[OK] Migration: Tabel stock_updates berhasil dibuat")
-            except Exception as e:
-                print(f"Migration stock_updates: {e}")
-            
-            # Cek dan tambahkan timezone ke settings
-            try:
-                result = conn.execute(text("PRAGMA table_info(settings)"))
-                columns = [row[1] for row in result]
-                if 'timezone' not in columns:
-                    conn.execute(text("ALTER TABLE settings ADD COLUMN timezone VARCHAR DEFAULT 'WIB'"))
-                    print("[OK] Migration: Kolom timezone ditambahkan ke tabel settings")
-            except Exception as e:
-                print(f"Migration settings timezone: {e}")
-    except Exception as e:
-        print(f"Error saat migration: {e}")
-
-run_migrations()
+def startup():
+    """Dijalankan sekali per proses worker saat server mulai (bukan saat modul di-import)"""
+    # Terapkan migrasi skema yang tertunda (no-op jika database sudah versi terbaru)
+    run_migrations(engine)
+    fail_interrupted_jobs()
+    cleanup_expired_artifacts()
+    # Hash dummy untuk login username tak dikenal: dihitung di sini, bukan di event loop
+    dummy_password_hash()
 
 app = FastAPI()
+# Didaftarkan sebelum SessionMiddleware agar berada di dalamnya (butuh role dari session)
+app.add_middleware(ProfilerMiddleware)
 app.add_middleware(SessionMiddleware, secret_key="change-this-secret")
+app.add_middleware(MetricsMiddleware)
+app.add_event_handler("startup", startup)
+app.add_event_handler("shutdown", shutdown_password_workers)
+app.add_event_handler("shutdown", shutdown_job_workers)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -94,31 +79,21 @@ def format_idr(value):
 
 templates.env.filters["format_idr"] = format_idr
 
-# Timezone utility functions
-TIMEZONE_MAP = {
-    "WIB": "Asia/Jakarta",      # UTC+7
-    "WITA": "Asia/Makassar",    # UTC+8
-    "WIT": "Asia/Jayapura"      # UTC+9
-}
-
-def get_current_setting_timezone(db: Session) -> str:
+# Timezone utility functions (Setting & tzinfo dibaca dari settings_cache)
+def get_current_setting_timezone(db: Session = None) -> str:
     """Get timezone from settings, default to WIB"""
-    settings = db.query(Setting).first()
-    return settings.timezone if settings and settings.timezone else "WIB"
+    return get_timezone_name(db)
 
 def get_timezone_offset(timezone_str: str) -> timedelta:
     """Get UTC offset untuk timezone Indonesia"""
-    offsets = {"WIB": 7, "WITA": 8, "WIT": 9}
-    hours = offsets.get(timezone_str, 7)
+    hours = UTC_OFFSET_HOURS.get(timezone_str, 7)
     return timedelta(hours=hours)
 
-def get_current_time_with_tz(db: Session) -> datetime:
+def get_current_time_with_tz(db: Session = None) -> datetime:
     """Get current time adjusted to setting timezone"""
-    tz_name = get_current_setting_timezone(db)
-    tz = pytz.timezone(TIMEZONE_MAP[tz_name])
-    return datetime.now(tz)
+    return datetime.now(get_tzinfo(db))
 
-def format_datetime_with_tz(dt: datetime, db: Session, format_str: str = "%d-%m-%Y %H:%M:%S") -> str:
+def format_datetime_with_tz(dt: datetime, db: Session = None, format_str: str = "%d-%m-%Y %H:%M:%S") -> str:
     """Format datetime dengan timezone yang dipilih"""
     if dt is None:
         return "-"
@@ -127,20 +102,49 @@ def format_datetime_with_tz(dt: datetime, db: Session, format_str: str = "%d-%m-
     if dt.tzinfo is None:
         dt = pytz.utc.localize(dt)
     
-    tz_name = get_current_setting_timezone(db)
-    tz = pytz.timezone(TIMEZONE_MAP[tz_name])
-    dt_local = dt.astimezone(tz)
+    dt_local = dt.astimezone(get_tzinfo(db))
     return dt_local.strftime(format_str)
 
 templates.env.filters["format_datetime_tz"] = format_datetime_with_tz
 
-def make_trx_no(db: Session):
+def get_clock_info(db: Session = None) -> dict:
+    """Zona waktu toko + offset UTC (menit) untuk jam di browser"""
+    now = get_current_time_with_tz(db)
+    return {
+        "timezone": get_current_setting_timezone(db),
+        "utc_offset_minutes": int(now.utcoffset().total_seconds() // 60),
+    }
+
+def make_trx_no(db: Session, terminal: str = ""):
+    """Ambil nomor transaksi berikutnya dari tabel trx_sequences.
+
+    Counter dinaikkan dengan UPDATE di dalam transaksi checkout, jadi biayanya
+    konstan dan dua lane yang checkout bersamaan tidak akan dapat nomor sama
+    (SQLite menahan write lock sampai commit).
+    """
     today = get_current_time_with_tz(db).strftime("%Y%m%d")
-    like = f"TRX-{today}-%"
-    count = db.query(func.count(Transaction.id)).filter(Transaction.trx_no.like(like)).scalar() or 0
-    return f"TRX-{today}-{count+1:04d}"
+    prefix = f"TRX-{today}-{terminal}-" if terminal else f"TRX-{today}-"
+    key = {"d": today, "t": terminal}
+    number = db.execute(
+        text("UPDATE trx_sequences SET last_no = last_no + 1 WHERE business_date = :d AND terminal = :t "
+             "RETURNING last_no"), key
+    ).scalar()
+    if number is None:
+        # Baris pertama untuk hari ini: lanjutkan dari transaksi yang sudah ada (misal upgrade di tengah hari)
+        existing = db.query(func.count(Transaction.id)).filter(Transaction.trx_no.op("GLOB")(prefix + "[0-9]*")).scalar() or 0
+        number = db.execute(
+            text("INSERT INTO trx_sequences (business_date, terminal, last_no) VALUES (:d, :t, :n) "
+                 "ON CONFLICT(business_date, terminal) DO UPDATE SET last_no = last_no + 1 RETURNING last_no"),
+            dict(key, n=existing + 1),
+        ).scalar_one()
+    return f"{prefix}{number:04d}"
+
+def clean_terminal_id(terminal: str) -> str:
+    """ID terminal/lane opsional untuk nomor transaksi, contoh: L1 -> TRX-20250101-L1-0001"""
+    return re.sub(r"[^A-Za-z0-9]", "", terminal or "")[:10].upper()
 
 @app.get("/", response_class=HTMLResponse)
+@query_budget(0)
 def home(request: Request):
     if not request.session.get("user"):
         return RedirectResponse("/login", status_code=302)
@@ -148,39 +152,66 @@ def home(request: Request):
 
 # -------- LOGIN ----------
 @app.get("/login", response_class=HTMLResponse)
+@query_budget(0)
 def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request, "error": None})
 
 @app.post("/login")
-def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
-        return templates.TemplateResponse("login.html", {"request": request, "error": "Username / password salah"})
-    if user.display_name is None:
-        user.display_name = user.username
-        db.commit()
-        db.refresh(user)
+@query_budget(1)
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    def login_error(message: str, status_code: int = 200):
+        return templates.TemplateResponse("login.html", {"request": request, "error": message}, status_code=status_code)
+
+    wait = login_retry_after(username)
+    if wait:
+        return login_error(f"Terlalu banyak percobaan gagal, coba lagi dalam {wait} detik", 429)
+    user = await db.run_sync(lambda s: s.query(User).filter(User.username == username).first())
+    # Lepas koneksi selama menunggu bcrypt agar login yang antri tidak menahan pool checkout
+    await db.commit()
+    try:
+        # Username tidak dikenal tetap menjalankan bcrypt (hash dummy) supaya waktunya sama
+        ok, new_hash = await verify_password_async(password, user.password_hash if user else dummy_password_hash())
+    except LoginBusy:
+        return login_error("Server sedang sibuk, silakan coba lagi", 503)
+    if not user:
+        ok = False
+    if not ok:
+        record_login_failure(username)
+        return login_error("Username / password salah")
+    record_login_success(username)
+    if new_hash or user.display_name is None:
+        # Rehash otomatis saat POS_BCRYPT_ROUNDS berubah
+        if new_hash:
+            user.password_hash = new_hash
+        if user.display_name is None:
+            user.display_name = user.username
+        await db.run_sync(bump_identity_version)
+        await db.commit()
+        invalidate_identity(user.username)
     request.session["user"] = {"username": user.username, "display_name": user.display_name, "role": user.role}
     return RedirectResponse("/cashier", status_code=302)
 
 
 @app.get("/logout")
+@query_budget(0)
 def logout(request: Request):
     request.session.clear()
     return RedirectResponse("/login", status_code=302)
 
 # -------- PRODUCTS ----------
 @app.get("/products", response_class=HTMLResponse)
-def products_page(request: Request, err: str = None, db: Session = Depends(get_db)):
+@query_budget(3)
+def products_page(request: Request, err: str = None, user=Depends(get_identity), db: Session = Depends(get_db)):
     r = require_login(request)
     if r: return r
     products = db.query(Product).order_by(Product.id.desc()).all()
     error_msg = None
     if err == "code-exists":
         error_msg = "Kode produk sudah ada!"
-    return templates.TemplateResponse("products.html", {"request": request, "products": products, "user": request.session["user"], "error": error_msg})
+    return templates.TemplateResponse("products.html", {"request": request, "products": products, "user": user, "error": error_msg})
 
 @app.post("/products/add")
+@query_budget(4)
 def add_product(
     request: Request,
     code: str = Form(...),
@@ -194,11 +225,15 @@ def add_product(
     if r: return r
     if db.query(Product).filter(Product.code == code).first():
         return RedirectResponse("/products?err=code-exists", status_code=302)
-    db.add(Product(code=code, name=name, cost_price=cost_price, price=price, stock=stock, status="active"))
+    p = Product(code=code, name=name, cost_price=cost_price, price=price, stock=stock, status="active")
+    mark_products_changed(db, [p])
+    bump_report_version(db)
+    db.add(p)
     db.commit()
     return RedirectResponse("/products", status_code=302)
 
 @app.post("/products/update")
+@query_budget(5)
 def update_product(
     request: Request,
     pid: int = Form(...),
@@ -244,10 +279,13 @@ def update_product(
         # Jika stock_add = 0 atau tidak diisi, stok tetap sama (hanya update harga/nama)
         # Stok tidak bisa dikurangi manual, hanya berkurang saat transaksi
         
+        mark_products_changed(db, [p])
+        bump_report_version(db)
         db.commit()
     return RedirectResponse("/products", status_code=302)
 
 @app.post("/products/update_name")
+@query_budget(4)
 def update_product_name(
     request: Request,
     pid: int = Form(...),
@@ -262,89 +300,27 @@ def update_product_name(
         p.name = name.strip()
         if not p.name:
             return JSONResponse({"success": False, "message": "Nama produk tidak boleh kosong"}, status_code=400)
+        mark_products_changed(db, [p])
+        bump_report_version(db)
         db.commit()
         return JSONResponse({"success": True, "message": "Nama produk berhasil diupdate"})
     return JSONResponse({"success": False, "message": "Produk tidak ditemukan"}, status_code=404)
 
 @app.post("/products/delete")
+@query_budget(5)
 def delete_product(request: Request, pid: int = Form(...), db: Session = Depends(get_db)):
     r = require_login(request)
     if r: return r
     p = db.query(Product).filter(Product.id == pid).first()
     if p:
+        record_product_deleted(db, p)
+        bump_report_version(db)
         db.delete(p)
         db.commit()
     return RedirectResponse("/products", status_code=302)
 
-@app.post("/products/import_excel")
-def import_products_from_excel(
-    request: Request,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-):
-    r = require_login(request)
-    if r: return r
-
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Hanya file Excel (.xlsx, .xls) yang diizinkan!")
-
-    try:
-        # Read the Excel file into a pandas DataFrame
-        df = pd.read_excel(file.file, engine='openpyxl')
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Gagal membaca file Excel: {e}")
-
-    required_columns = ['kode_produk', 'nama_produk', 'harga_asli', 'harga_jual', 'stok']
-    if not all(col in df.columns for col in required_columns):
-        raise HTTPException(status_code=400, detail=f"File Excel harus memiliki kolom: {', '.join(required_columns)}")
-
-    products_added = 0
-    products_updated = 0
-    errors = []
-
-    for index, row in df.iterrows():
-        code = str(row['kode_produk']).strip()
-        name = str(row['nama_produk']).strip()
-        
-        try:
-            cost_price = float(row['harga_asli'])
-            price = float(row['harga_jual'])
-            stock = int(row['stok'])
-        except ValueError:
-            errors.append(f"Baris {index + 2}: Harga atau stok tidak valid untuk produk {code}.")
-            continue
-
-        if not code or not name or cost_price < 0 or price < 0 or stock < 0:
-            errors.append(f"Baris {index + 2}: Data produk tidak lengkap atau tidak valid (kode, nama, harga_asli, harga_jual, stok).")
-            continue
-
-        existing_product = db.query(Product).filter(Product.code == code).first()
-
-        if existing_product:
-            existing_product.name = name
-            existing_product.cost_price = cost_price
-            existing_product.price = price
-            existing_product.stock = stock
-            products_updated += 1
-        else:
-            new_product = Product(code=code, name=name, cost_price=cost_price, price=price, stock=stock, status="active")
-            db.add(new_product)
-            products_added += 1
-    
-    db.commit()
-
-    if errors:
-        error_message = "Beberapa produk gagal diimpor:\n" + "\n".join(errors)
-        return JSONResponse(status_code=400, content={
-            "message": f"Berhasil mengimpor {products_added} produk baru dan memperbarui {products_updated} produk. Namun, ada beberapa kesalahan:",
-            "detail": error_message
-        })
-    else:
-        return JSONResponse(status_code=200, content={
-            "message": f"Berhasil mengimpor {products_added} produk baru dan memperbarui {products_updated} produk."
-        })
-
 @app.get("/products/export_stock_template")
+@query_budget(1)
 def export_stock_update_template(request: Request, db: Session = Depends(get_db)):
     """Export template Excel untuk update stok"""
     r = require_login(request)
@@ -419,206 +395,430 @@ def export_stock_update_template(request: Request, db: Session = Depends(get_db)
         "Content-Disposition": f"attachment; filename={file_name}"
     })
 
-@app.post("/products/import_stock_update")
-def import_stock_update_from_excel(
+# Import update stok dua fase: preview (diff terhadap stok saat ini, tanpa
+# menulis, sebagai job /api/jobs/preview_stock_update) lalu apply hasil
+# preview yang sudah dikonfirmasi. Import Excel hanya lewat job background.
+STOCK_PREVIEW_ROWS = 50  # Jumlah baris perubahan yang dikirim ke browser
+
+def _stock_preview_path(token: str):
+    if not re.fullmatch(r"[0-9a-f]{32}", token or ""):
+        return None
+    return job_file_path(token, "-stock-preview.json")
+
+def _save_stock_preview(preview: dict, token: str) -> dict:
+    """Simpan hasil preview untuk /apply; return ringkasan + token + contoh baris untuk browser"""
+    with open(_stock_preview_path(token), "w") as f:
+        json.dump(preview, f)
+    summary = {k: v for k, v in preview.items() if k != "changes"}
+    return dict(summary, token=token, rows=preview_rows(preview, STOCK_PREVIEW_ROWS))
+
+@app.post("/products/import_stock_update/apply")
+@query_budget(3)
+def apply_stock_update_import(
     request: Request,
-    file: UploadFile = File(...),
+    token: str = Form(...),
     db: Session = Depends(get_db),
 ):
-    """Import update stok dari Excel dan hitung total pengeluaran"""
     r = require_login(request)
     if r: return r
 
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Hanya file Excel (.xlsx, .xls) yang diizinkan!")
-
+    path = _stock_preview_path(token)
     try:
-        df = pd.read_excel(file.file, engine='openpyxl')
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Gagal membaca file Excel: {e}")
-
-    required_columns = ['kode_produk', 'harga_asli', 'harga_jual', 'stok_baru']
-    if not all(col in df.columns for col in required_columns):
-        raise HTTPException(status_code=400, detail=f"File Excel harus memiliki kolom: {', '.join(required_columns)}")
+        with open(path) as f:
+            preview = json.load(f)
+        os.remove(path)
+    except (TypeError, OSError):
+        return JSONResponse(status_code=404, content={"detail": "Preview tidak ditemukan atau sudah kedaluwarsa. Silakan upload ulang file."})
 
-    products_updated = 0
-    total_pengeluaran = 0
-    errors = []
-    stock_updates = []
-
-    for index, row in df.iterrows():
-        code = str(row['kode_produk']).strip()
-        
-        try:
-            cost_price = float(row['harga_asli'])
-            price = float(row['harga_jual'])
-            new_stock = int(row['stok_baru'])
-        except (ValueError, KeyError) as e:
-            errors.append(f"Baris {index + 2}: Data tidak valid untuk produk {code}.")
-            continue
-
-        if not code or cost_price < 0 or price < 0 or new_stock < 0:
-            errors.append(f"Baris {index + 2}: Data produk tidak lengkap atau tidak valid.")
-            continue
-
-        product = db.query(Product).filter(Product.code == code).first()
-        if not product:
-            errors.append(f"Baris {index + 2}: Produk dengan kode {code} tidak ditemukan.")
-            continue
-
-        old_stock = product.stock
-        
-        # Update produk
-        product.cost_price = cost_price
-        product.price = price
-        product.stock = new_stock
-        
-        # Track stock update jika stok bertambah
-        if new_stock > old_stock:
-            stock_added = new_stock - old_stock
-            pengeluaran = cost_price * stock_added
-            total_pengeluaran += pengeluaran
-            
-            stock_update = StockUpdate(
-                product_id=product.id,
-                product_code=product.code,
-                product_name=product.name,
-                old_stock=old_stock,
-                new_stock=new_stock,
-                stock_added=stock_added,
-                cost_price=cost_price,
-                total_pengeluaran=pengeluaran,
-                updated_by=request.session.get("user", {}).get("display_name", "System")
-            )
-            stock_updates.append(stock_update)
-        
-        products_updated += 1
-    
-    # Commit semua perubahan
-    for su in stock_updates:
-        db.add(su)
-    db.commit()
+    updated_by = request.session.get("user", {}).get("display_name", "System")
+    try:
+        ok, content = apply_stock_updates(db, preview, updated_by)
+    except StockImportConflict as e:
+        return JSONResponse(status_code=409, content={"detail": str(e)})
+    # Error per baris sudah ditampilkan saat preview, baris yang valid tetap diterapkan
+    return JSONResponse(status_code=200, content=content)
+
+# -------- JOBS ----------
+# Versi background dari import/export Excel: request langsung dijawab dengan
+# job id, status dipantau lewat /api/jobs/{id}, hasil export lewat /download.
+# Fungsi _*_job dijalankan di proses worker jobs.py (di-pickle per nama).
+def _save_job_upload(file: UploadFile, job_id: str) -> str:
+    check_excel_filename(file.filename)
+    path = job_file_path(job_id, "-upload" + os.path.splitext(file.filename)[1])
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+    return path
+
+def _import_products_job(db: Session, ctx, upload_path: str):
+    try:
+        df = read_import_file(upload_path, PRODUCT_IMPORT_COLUMNS)
+        ok, content = import_products(db, df, ctx.progress)
+    finally:
+        os.remove(upload_path)
+    return dict(content, ok=ok)
 
-    message = f"Berhasil mengupdate {products_updated} produk."
-    if total_pengeluaran > 0:
-        message += f" Total pengeluaran untuk update stok: Rp {total_pengeluaran:,.0f}".replace(",", ".")
-
-    if errors:
-        error_message = "Beberapa produk gagal diupdate:\n" + "\n".join(errors)
-        return JSONResponse(status_code=400, content={
-            "message": message,
-            "detail": error_message,
-            "total_pengeluaran": total_pengeluaran
-        })
-    else:
-        return JSONResponse(status_code=200, content={
-            "message": message,
-            "total_pengeluaran": total_pengeluaran
-        })
+def _import_stock_job(db: Session, ctx, upload_path: str, updated_by: str):
+    try:
+        df = read_import_file(upload_path, STOCK_IMPORT_COLUMNS)
+        ok, content = import_stock_updates(db, df, updated_by, ctx.progress)
+    except StockImportConflict as e:
+        # Sama dengan 409 di /apply: tidak ada yang disimpan, user cukup upload ulang
+        return {"ok": False, "conflict": True, "detail": str(e)}
+    finally:
+        os.remove(upload_path)
+    return dict(content, ok=ok)
+
+def _preview_stock_job(db: Session, ctx, upload_path: str):
+    try:
+        df = read_import_file(upload_path, STOCK_IMPORT_COLUMNS)
+        ctx.progress(50)
+        preview = preview_stock_updates(db, df)
+    finally:
+        os.remove(upload_path)
+    # Token apply = id job ini
+    return _save_stock_preview(preview, ctx.job_id)
+
+def _export_report_job(db: Session, ctx, mode: str):
+    start, end = get_report_period(mode, db)
+    path = ctx.file_path(".xlsx")
+    with open(path, "wb") as f:
+        for chunk in stream_xlsx(_iter_report_sheets(db, mode, start, end, progress=ctx.progress)):
+            f.write(chunk)
+    ctx.set_artifact(path, report_export_filename(mode, get_report_dates(mode, db)[0]))
+    return {"ok": True, "message": "Laporan siap diunduh."}
+
+def _job_accepted(job_id: str):
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status_url": f"/api/jobs/{job_id}"})
+
+@app.post("/api/jobs/import_products")
+@query_budget(2)
+def submit_import_products_job(request: Request, file: UploadFile = File(...)):
+    r = require_login(request)
+    if r: return r
+    job_id = new_job_id()
+    try:
+        upload_path = _save_job_upload(file, job_id)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    submit_job("import_products", _import_products_job, upload_path,
+               job_id=job_id, created_by=request.session["user"]["username"])
+    return _job_accepted(job_id)
+
+@app.post("/api/jobs/import_stock_update")
+@query_budget(2)
+def submit_import_stock_job(request: Request, file: UploadFile = File(...)):
+    r = require_login(request)
+    if r: return r
+    job_id = new_job_id()
+    try:
+        upload_path = _save_job_upload(file, job_id)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    updated_by = request.session.get("user", {}).get("display_name", "System")
+    submit_job("import_stock", _import_stock_job, upload_path, updated_by,
+               job_id=job_id, created_by=request.session["user"]["username"])
+    return _job_accepted(job_id)
+
+@app.post("/api/jobs/preview_stock_update")
+@query_budget(2)
+def submit_preview_stock_job(request: Request, file: UploadFile = File(...)):
+    """Fase 1 import update stok (lihat /products/import_stock_update/apply) sebagai job background"""
+    r = require_login(request)
+    if r: return r
+    job_id = new_job_id()
+    try:
+        upload_path = _save_job_upload(file, job_id)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    submit_job("preview_stock", _preview_stock_job, upload_path,
+               job_id=job_id, created_by=request.session["user"]["username"])
+    return _job_accepted(job_id)
+
+@app.post("/api/jobs/export_report")
+@query_budget(2)
+def submit_export_report_job(request: Request, mode: str = Query("daily")):
+    r = require_login(request)
+    if r: return r
+    job_id = submit_job("export_report", _export_report_job, mode, created_by=request.session["user"]["username"])
+    return _job_accepted(job_id)
+
+def _get_own_job(request: Request, db: Session, job_id: str):
+    """Job milik user yang login (admin boleh melihat semua); None jika bukan miliknya"""
+    job = get_job(db, job_id)
+    user = request.session["user"]
+    if job and user.get("role") != "admin" and job.created_by != user["username"]:
+        return None
+    return job
+
+@app.get("/api/jobs/{job_id}")
+@query_budget(1)
+def job_status(request: Request, job_id: str, db: Session = Depends(get_db)):
+    r = require_login(request)
+    if r: return r
+    job = _get_own_job(request, db, job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"message": "Job tidak ditemukan"})
+    return serialize_job(job)
+
+@app.get("/api/jobs/{job_id}/download")
+@query_budget(1)
+def job_download(request: Request, job_id: str, db: Session = Depends(get_db)):
+    r = require_login(request)
+    if r: return r
+    job = _get_own_job(request, db, job_id)
+    if not job or job.status != "done" or not job.artifact_path:
+        return JSONResponse(status_code=404, content={"message": "File hasil job tidak ditemukan"})
+    if not os.path.exists(job.artifact_path):
+        return JSONResponse(status_code=410, content={"message": "File hasil job sudah kedaluwarsa"})
+    return FileResponse(
+        job.artifact_path,
+        filename=job.artifact_name,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
 
 
 # -------- CASHIER ----------
-@app.get("/api/timezone-info")
-def get_timezone_info(db: Session = Depends(get_db)):
-    """API untuk mendapatkan timezone dan waktu saat ini"""
-    timezone_name = get_current_setting_timezone(db)
-    current_time = get_current_time_with_tz(db)
-    return {
-        "timezone": timezone_name,
-        "current_time": current_time.strftime("%d-%m-%Y %H:%M:%S"),
-        "current_time_formatted": current_time.strftime("%A, %d %B %Y %H:%M:%S")
-    }
-
-@app.get("/cashier", response_class=HTMLResponse)
-def cashier_page(request: Request, err: str = None, db: Session = Depends(get_db)):
+def get_events_hello() -> dict:
+    db = SessionLocal()
+    try:
+        return dict(
+            get_clock_info(db),
+            catalog_version=get_counter(db, CATALOG_VERSION),
+            server_time_ms=int(datetime.utcnow().replace(tzinfo=pytz.utc).timestamp() * 1000),
+        )
+    finally:
+        db.close()
+
+@app.get("/api/events")
+async def events_stream(request: Request):
+    """Server-Sent Events: satu koneksi per tab untuk jam, pengaturan dan stok produk.
+
+    Event pertama ("hello") berisi waktu server dan offset zona waktu sekali
+    saja; selanjutnya jam dihitung di browser. "hello" juga membawa versi
+    katalog, acuan klien untuk /api/catalog/changes setelah reconnect. Perubahan pengaturan dikirim
+    sebagai event "settings", perubahan produk/stok sebagai event "products".
+    """
     r = require_login(request)
     if r: return r
-    products = db.query(Product).filter(Product.status == "active").order_by(Product.name.asc()).all()
-    settings = db.query(Setting).first()
-    error_msg = None
-    if err == "empty":
-        error_msg = "Keranjang kosong!"
-    elif err == "paid-less":
-        error_msg = "Jumlah bayar kurang dari total!"
-    elif err == "invalid":
-        error_msg = "Data keranjang tidak valid!"
-    return templates.TemplateResponse("cashier.html", {"request": request, "products": products, "user": request.session["user"], "error": error_msg, "settings": settings})
+    hello = format_sse("hello", await run_in_threadpool(get_events_hello))
+    sub = broker.subscribe()
+    return StreamingResponse(
+        event_stream(request, sub, hello),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@app.post("/checkout")
-def checkout(
+@app.get("/api/products/search")
+@query_budget(1)
+async def search_products_api(
     request: Request,
-    payment_method: str = Form(...),
-    paid: float = Form(...),
-    cart_json: str = Form(...),
-    db: Session = Depends(get_db),
+    q: str = Query(""),
+    limit: int = Query(20),
+    offset: int = Query(0),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    """API pencarian produk untuk layar kasir (FTS5, ranked & paginated)"""
     r = require_login(request)
     if r: return r
+    rows, has_more = await db.run_sync(search_products, q, limit, offset)
+    return {
+        "query": q,
+        "offset": offset,
+        "has_more": has_more,
+        "items": [{"id": p.id, "code": p.code, "name": p.name, "price": p.price, "stock": p.stock} for p in rows],
+    }
 
-    import json
+@app.get("/api/catalog/changes")
+@query_budget(3)
+async def catalog_changes_api(request: Request, since: int = Query(0), db: AsyncSession = Depends(get_async_db)):
+    """Delta sync katalog untuk terminal kasir: produk yang berubah sejak versi `since` + tombstone"""
+    r = require_login(request)
+    if r: return r
+    return await db.run_sync(get_catalog_changes, since)
+
+CHECKOUT_ERRORS = {
+    "empty": "Keranjang kosong!",
+    "paid-less": "Jumlah bayar kurang dari total!",
+    "invalid": "Data keranjang tidak valid!",
+}
+
+@app.get("/cashier", response_class=HTMLResponse)
+@query_budget(3)
+def cashier_page(request: Request, err: str = None, user=Depends(get_identity), db: Session = Depends(get_db)):
+    r = require_login(request)
+    if r: return r
+    # Produk tidak lagi dirender ke halaman, dicari lewat /api/products/search
+    settings = get_settings(db)
+    error_msg = CHECKOUT_ERRORS.get(err)
+    return templates.TemplateResponse("cashier.html", {"request": request, "user": user, "error": error_msg, "settings": settings})
+
+def process_checkout(db: Session, cashier: str, payment_method: str, paid: float, cart_json: str, terminal: str = ""):
+    """Simpan transaksi dari keranjang. Return (trx, receipt_items, error_code).
+
+    Stok semua produk di keranjang dikurangi dengan satu UPDATE ... RETURNING
+    yang sekaligus mengembalikan cost_price dan stok barunya, jadi jumlah query
+    tidak bertambah mengikuti jumlah item. Perilakunya sama dengan versi per
+    baris: stok tidak pernah minus, produk yang tidak dikenal tetap dijual
+    dengan cost_price 0.
+    """
     try:
         cart = json.loads(cart_json)  # [{code,name,price,qty}]
-    except (json.JSONDecodeError, ValueError):
-        return RedirectResponse("/cashier?err=invalid", status_code=302)
-    if not cart:
-        return RedirectResponse("/cashier?err=empty", status_code=302)
+        lines = [(str(it["code"]), str(it["name"]), float(it["price"]), int(it["qty"])) for it in cart]
+    except (json.JSONDecodeError, ValueError, TypeError, KeyError):
+        return None, None, "invalid"
+    if not lines:
+        return None, None, "empty"
 
     total = 0
-    for it in cart:
-        total += float(it["price"]) * int(it["qty"])
+    for code, name, price, qty in lines:
+        total += price * qty
 
     change = paid - total
     if change < 0:
-        return RedirectResponse("/cashier?err=paid-less", status_code=302)
+        return None, None, "paid-less"
+
+    qty_by_code = {}
+    for code, name, price, qty in lines:
+        qty_by_code[code] = qty_by_code.get(code, 0) + qty
+
+    # Versi katalog dan versi data laporan dinaikkan dengan satu statement
+    versions = next_counters(db, CATALOG_VERSION, REPORT_DATA_VERSION)
+    version = versions[CATALOG_VERSION]
+
+    # Kurangi stok semua produk dalam satu UPDATE (stok tidak boleh minus)
+    products = Product.__table__
+    stock_delta = case(qty_by_code, value=products.c.code, else_=0)
+    cost_by_code = {}
+    stock_by_code = {}
+    for code, cost_price, stock in db.execute(
+        update(products)
+        .where(products.c.code.in_(list(qty_by_code)))
+        .values(stock=func.max(0, products.c.stock - stock_delta), version=version)
+        .returning(products.c.code, products.c.cost_price, products.c.stock)
+    ):
+        cost_by_code[code] = cost_price
+        stock_by_code[code] = stock
+    if stock_by_code:
+        # Stok baru untuk layar kasir lain
+        publish_product_changes(db, version, [{"code": code, "stock": stock} for code, stock in stock_by_code.items()])
 
     trx = Transaction(
-        trx_no=make_trx_no(db),
-        cashier=request.session["user"]["display_name"],
+        trx_no=make_trx_no(db, clean_terminal_id(terminal)),
+        created_at=datetime.utcnow(),
+        cashier=cashier,
         payment_method=payment_method,
         total=total,
         paid=paid,
         change=change,
     )
-
-    for it in cart:
-        qty = int(it["qty"])
-        price = float(it["price"])
-        subtotal = qty * price
-        # Kurangi stok kalau dipakai dan ambil cost_price
-        p = db.query(Product).filter(Product.code == it["code"]).first()
-        cost_price = p.cost_price if p else 0
-        if p:
-            p.stock = max(0, p.stock - qty)
-        trx.items.append(TransactionItem(
-            product_code=it["code"],
-            product_name=it["name"],
-            price=price,
-            cost_price=cost_price,
-            qty=qty,
-            subtotal=subtotal
-        ))
+    receipt_items = [{
+        "product_code": code,
+        "product_name": name,
+        "price": price,
+        "cost_price": cost_by_code.get(code, 0) or 0,
+        "qty": qty,
+        "subtotal": qty * price,
+    } for code, name, price, qty in lines]
 
     db.add(trx)
-    db.commit()
+    db.flush()
+    # Item disimpan dengan satu executemany (tanpa perlu membaca balik id tiap item)
+    db.execute(TransactionItem.__table__.insert(), [dict(it, transaction_id=trx.id) for it in receipt_items])
+    apply_checkout_to_rollups(db, trx, receipt_items)
+    return trx, receipt_items, None
+
+# SQLite hanya mengizinkan satu penulis. Checkout di event loop yang sama
+# diantrikan di sini (FIFO) alih-alih saling berebut lock database: selama
+# menunggu lock SQLite, busy handler tidur makin lama (sampai 100 ms per
+# percobaan) sehingga sebagian checkout bisa tertahan berdetik-detik.
+# Antrian ini hanya berlaku per proses: dengan beberapa worker uvicorn,
+# checkout dari worker berbeda (dan penulis lain seperti job import) tetap
+# berebut lock SQLite lewat busy_timeout.
+_checkout_lock = asyncio.Lock()
+
+async def run_checkout(db: AsyncSession, cashier: str, payment_method: str, paid: float, cart_json: str, terminal: str):
+    """process_checkout + commit, satu checkout per proses pada satu waktu"""
+    async with _checkout_lock:
+        trx, items, err = await db.run_sync(process_checkout, cashier, payment_method, paid, cart_json, terminal)
+        if not err:
+            await db.commit()
+    return trx, items, err
+
+# Budget checkout: 8 statement dengan cache hangat (counter versi, UPDATE stok ...
+# RETURNING, nomor urut, INSERT transaksi, executemany item, 3 rollup), +1 saat
+# versi identitas dicek ulang (paling sering tiap IDENTITY_CHECK_INTERVAL detik).
+# Tidak bisa <= 5: SQLite hanya menulis satu tabel per statement dan checkout
+# menulis 7 tabel. Checkout pertama setelah restart (cache identitas/settings
+# kosong, nomor urut hari pertama) memakai hingga 13 dan tercatat melebihi budget.
+@app.post("/checkout")
+@query_budget(9)
+async def checkout(
+    request: Request,
+    payment_method: str = Form(...),
+    paid: float = Form(...),
+    cart_json: str = Form(...),
+    terminal: str = Form(""),
+    user=Depends(get_identity_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    r = require_login(request)
+    if r: return r
+
+    trx, _, err = await run_checkout(db, user.display_name, payment_method, paid, cart_json, terminal)
+    if err:
+        return RedirectResponse(f"/cashier?err={err}", status_code=302)
     return RedirectResponse(f"/receipt/{trx.id}", status_code=302)
 
+@app.post("/api/checkout")
+@query_budget(9)  # sama dengan /checkout
+async def checkout_api(
+    request: Request,
+    payment_method: str = Form(...),
+    paid: float = Form(...),
+    cart_json: str = Form(...),
+    terminal: str = Form(""),
+    user=Depends(get_identity_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Checkout versi JSON: langsung mengembalikan data struk tanpa redirect ke /receipt/{id}"""
+    r = require_login(request)
+    if r: return r
+
+    trx, items, err = await run_checkout(db, user.display_name, payment_method, paid, cart_json, terminal)
+    if err:
+        return JSONResponse({"success": False, "error": err, "message": CHECKOUT_ERRORS[err]}, status_code=400)
+    settings = await db.run_sync(get_settings)
+    created_at = await db.run_sync(lambda s: format_datetime_with_tz(trx.created_at, s, "%d/%m/%Y %H:%M"))
+    receipt = {
+        "id": trx.id,
+        "trx_no": trx.trx_no,
+        "created_at": created_at,
+        "cashier": trx.cashier,
+        "payment_method": trx.payment_method,
+        "total": trx.total,
+        "paid": trx.paid,
+        "change": trx.change,
+        "items": [{k: v for k, v in it.items() if k != "cost_price"} for it in items],
+        "store": {
+            "name": settings.store_name if settings else None,
+            "address": settings.store_address if settings else None,
+            "phone": settings.store_phone if settings else None,
+        },
+        "receipt_url": f"/receipt/{trx.id}",
+    }
+    return {"success": True, "receipt": receipt}
+
 # -------- RECEIPT ----------
 @app.get("/receipt/{trx_id}", response_class=HTMLResponse)
-def receipt_page(request: Request, trx_id: int, from_page: str = Query(None, alias="from"), mode: str = Query("daily"), db: Session = Depends(get_db)):
+@query_budget(5)
+def receipt_page(request: Request, trx_id: int, from_page: str = Query(None, alias="from"), mode: str = Query("daily"), user=Depends(get_identity), db: Session = Depends(get_db)):
     r = require_login(request)
     if r: return r
     trx = db.query(Transaction).filter(Transaction.id == trx_id).first()
-    settings = db.query(Setting).first()
+    settings = get_settings(db)
     if not trx:
         return RedirectResponse("/cashier", status_code=302)
-    # Ensure display_name is available in the session for the receipt page
-    logged_in_user = db.query(User).filter(User.username == request.session["user"]["username"]).first()
-    if logged_in_user and logged_in_user.display_name is None:
-        logged_in_user.display_name = logged_in_user.username
-        db.commit()
-        db.refresh(logged_in_user)
-        request.session["user"]["display_name"] = logged_in_user.display_name # Update session immediately
-    
+
     # Tentukan URL kembali berdasarkan dari mana struk dibuka
     back_url = "/cashier"
     if from_page == "reports":
@@ -630,99 +830,150 @@ def receipt_page(request: Request, trx_id: int, from_page: str = Query(None, ali
     return templates.TemplateResponse("receipt.html", {
         "request": request, 
         "trx": trx, 
-        "user": request.session["user"], 
+        "user": user, 
         "settings": settings,
         "back_url": back_url,
         "formatted_created_at": formatted_created_at
     })
 
 # -------- REPORTS ----------
+REPORT_PAGE_SIZE = 50
+
+def get_report_dates(mode: str, db: Session = None):
+    """Tanggal pertama dan terakhir (lokal toko) periode laporan daily/monthly/yearly"""
+    today = get_current_time_with_tz(db).date()
+    if mode == "daily":
+        return today, today
+    if mode == "monthly":
+        # Calculate last day of the month
+        last_day = monthrange(today.year, today.month)[1]
+        return today.replace(day=1), today.replace(day=last_day)
+    return date(today.year, 1, 1), date(today.year, 12, 31)
+
+def get_report_period(mode: str, db: Session = None):
+    """Rentang waktu (start, end) periode laporan dalam UTC naive, untuk filter kolom created_at"""
+    first_day, last_day = get_report_dates(mode, db)
+    offset = get_utc_offset(db)
+    start = datetime(first_day.year, first_day.month, first_day.day, 0, 0, 0) - offset
+    end = datetime(last_day.year, last_day.month, last_day.day, 23, 59, 59) - offset
+    return start, end
+
+def report_period_key(mode: str) -> str:
+    """Key cache laporan: mode + tanggal awal periode (berganti otomatis tiap hari/bulan/tahun)"""
+    if mode not in ("daily", "monthly"):
+        mode = "yearly"
+    first_day, _ = get_report_dates(mode)
+    return f"{mode}:{first_day.isoformat()}"
+
+def encode_trx_cursor(created_at: datetime, trx_id: int) -> str:
+    return f"{created_at.isoformat()}_{trx_id}"
+
+def decode_trx_cursor(cursor: str):
+    created_at, trx_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(created_at), int(trx_id)
+
+def get_transactions_page(db: Session, start: datetime, end: datetime, cursor: str = None, limit: int = REPORT_PAGE_SIZE):
+    """Ambil satu halaman transaksi periode (terbaru dulu) dengan keyset cursor (created_at, id).
+
+    Return (rows, next_cursor). Biaya tiap halaman tetap walaupun periodenya setahun penuh.
+    """
+    q = (
+        db.query(Transaction.id, Transaction.trx_no, Transaction.created_at, Transaction.cashier, Transaction.total)
+        .filter(Transaction.created_at >= start, Transaction.created_at <= end)
+    )
+    if cursor:
+        c_created_at, c_id = decode_trx_cursor(cursor)
+        q = q.filter(or_(
+            Transaction.created_at < c_created_at,
+            and_(Transaction.created_at == c_created_at, Transaction.id < c_id),
+        ))
+    rows = q.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_trx_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+def serialize_trx_rows(rows, db: Session):
+    return [{
+        "id": t.id,
+        "trx_no": t.trx_no,
+        "formatted_created_at": format_datetime_with_tz(t.created_at, db, "%Y-%m-%d %H:%M"),
+        "cashier": t.cashier,
+        "total": t.total,
+    } for t in rows]
+
 @app.get("/reports", response_class=HTMLResponse)
-def reports_page(request: Request, mode: str = "daily", db: Session = Depends(get_db)):
+@query_budget(6)
+def reports_page(request: Request, mode: str = "daily", user=Depends(get_identity), db: Session = Depends(get_db)):
     r = require_login(request)
     if r: return r
 
-    now = datetime.now()
-    q = db.query(Transaction)
-
+    first_day, last_day = get_report_dates(mode, db)
+    start, end = get_report_period(mode, db)
     if mode == "daily":
-        start = datetime(now.year, now.month, now.day, 0, 0, 0)
-        end = datetime(now.year, now.month, now.day, 23, 59, 59)
-        title = f"Laporan Harian ({start.date()})"
+        title = f"Laporan Harian ({first_day})"
     elif mode == "monthly":
-        start = datetime(now.year, now.month, 1, 0, 0, 0)
-        # Calculate last day of the month
-        last_day = monthrange(now.year, now.month)[1]
-        end = datetime(now.year, now.month, last_day, 23, 59, 59)
-        title = f"Laporan Bulanan ({now.strftime('%Y-%m')})"
+        title = f"Laporan Bulanan ({first_day.strftime('%Y-%m')})"
     else:
-        start = datetime(now.year, 1, 1, 0, 0, 0)
-        end = datetime(now.year, 12, 31, 23, 59, 59)
-        title = f"Laporan Tahunan ({now.year})"
-
-    trx_list = q.filter(Transaction.created_at >= start, Transaction.created_at <= end).order_by(Transaction.id.desc()).all()
-    omzet = sum(t.total for t in trx_list)
-    # Hitung modal (cost) dari item transaksi untuk pendapatan rill (omzet - modal penjualan)
-    total_modal = 0
-    for t in trx_list:
-        for item in t.items:
-            total_modal += (item.cost_price or 0) * (item.qty or 0)
+        title = f"Laporan Tahunan ({first_day.year})"
+
+    # Omzet dan modal (cost) penjualan dari rollup harian untuk pendapatan rill (omzet - modal penjualan)
+    totals = get_sales_totals(db, first_day, last_day)
+    omzet = totals["omzet"]
+    total_modal = totals["modal"]
     pendapatan_rill = omzet - total_modal
 
     # Pengeluaran dari upgrade stok (dari tabel stock_updates) pada periode yang sama
-    stock_updates = db.query(StockUpdate).filter(StockUpdate.created_at >= start, StockUpdate.created_at <= end).all()
-    pengeluaran_stok = sum(su.total_pengeluaran or 0 for su in stock_updates)
+    pengeluaran_stok = (
+        db.query(func.coalesce(func.sum(StockUpdate.total_pengeluaran), 0))
+        .filter(StockUpdate.created_at >= start, StockUpdate.created_at <= end)
+        .scalar()
+    )
 
-    jumlah = len(trx_list)
-    
-    # Format created_at untuk semua transaksi
-    for trx in trx_list:
-        trx.formatted_created_at = format_datetime_with_tz(trx.created_at, db, "%Y-%m-%d %H:%M")
+    jumlah = totals["trx_count"]
+
+    # Hanya halaman pertama yang dirender, sisanya dimuat lewat /api/reports/transactions
+    trx_rows, next_cursor = get_transactions_page(db, start, end)
 
     return templates.TemplateResponse("reports.html", {
         "request": request,
         "title": title,
         "mode": mode,
-        "trx_list": trx_list,
+        "trx_list": serialize_trx_rows(trx_rows, db),
+        "next_cursor": next_cursor,
         "omzet": format_idr(omzet),
         "pendapatan_rill": format_idr(pendapatan_rill),
         "pengeluaran_stok": format_idr(pengeluaran_stok),
         "jumlah": jumlah,
-        "user": request.session["user"]
+        "user": user
     })
 
+@app.get("/api/reports/transactions")
+@query_budget(2)
+async def get_report_transactions(request: Request, mode: str = Query("daily"), cursor: str = Query(None), db: AsyncSession = Depends(get_async_db)):
+    """Halaman berikutnya dari tabel transaksi di halaman laporan (keyset pagination)"""
+    r = require_login(request)
+    if r: return r
+
+    def load(s: Session):
+        start, end = get_report_period(mode, s)
+        rows, next_cursor = get_transactions_page(s, start, end, cursor)
+        return {"items": serialize_trx_rows(rows, s), "next_cursor": next_cursor}
+
+    try:
+        return await db.run_sync(load)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+
 # Helper function for summary report (can be called internally or via API)
 def get_summary_report_helper(db: Session, mode: str = "yearly"):
     total_products = db.query(Product).count()
-    
-    now = datetime.now()
-    
-    # Determine date range based on mode
-    if mode == "daily":
-        start_date = datetime(now.year, now.month, now.day, 0, 0, 0)
-        end_date = datetime(now.year, now.month, now.day, 23, 59, 59)
-    elif mode == "monthly":
-        start_date = datetime(now.year, now.month, 1, 0, 0, 0)
-        end_date = datetime(now.year, now.month, monthrange(now.year, now.month)[1], 23, 59, 59)
-    else:  # yearly
-        start_date = datetime(now.year, 1, 1, 0, 0, 0)
-        end_date = datetime(now.year, 12, 31, 23, 59, 59)
-    
-    # Total transactions in the period
-    total_transactions = (
-        db.query(Transaction)
-        .filter(Transaction.created_at >= start_date, Transaction.created_at <= end_date)
-        .count()
-    )
-    
-    # Products sold in the period (sum of transaction items)
-    products_sold = (
-        db.query(func.sum(TransactionItem.qty))
-        .join(Transaction)
-        .filter(Transaction.created_at >= start_date, Transaction.created_at <= end_date)
-        .scalar()
-        or 0
-    )
+
+    # Total transaksi dan produk terjual dalam periode (dari rollup harian)
+    totals = get_sales_totals(db, *get_report_dates(mode, db))
+    total_transactions = totals["trx_count"]
+    products_sold = totals["items_sold"]
 
     return {
         "total_products": total_products,
@@ -731,24 +982,14 @@ def get_summary_report_helper(db: Session, mode: str = "yearly"):
     }
 
 @app.get("/api/reports/summary")
-def get_summary_report(mode: str = Query("yearly"), db: Session = Depends(get_db)):
-    return get_summary_report_helper(db, mode)
+@query_budget(4)
+async def get_summary_report(request: Request, mode: str = Query("yearly"), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(cached_report, request, "summary", report_period_key(mode), lambda s: get_summary_report_helper(s, mode))
 
 # Helper function for top products report
 def get_top_products_report_helper(db: Session, mode: str = "yearly"):
-    now = datetime.now()
-    
-    # Determine date range based on mode
-    if mode == "daily":
-        start_date = datetime(now.year, now.month, now.day, 0, 0, 0)
-        end_date = datetime(now.year, now.month, now.day, 23, 59, 59)
-    elif mode == "monthly":
-        start_date = datetime(now.year, now.month, 1, 0, 0, 0)
-        end_date = datetime(now.year, now.month, monthrange(now.year, now.month)[1], 23, 59, 59)
-    else:  # yearly
-        start_date = datetime(now.year, 1, 1, 0, 0, 0)
-        end_date = datetime(now.year, 12, 31, 23, 59, 59)
-    
+    start_date, end_date = get_report_period(mode, db)
+
     top_selling_products = (
         db.query(
             Product.name,
@@ -781,28 +1022,19 @@ def get_top_products_report_helper(db: Session, mode: str = "yearly"):
     }
 
 @app.get("/api/reports/top_products")
-def get_top_products_report(mode: str = Query("yearly"), db: Session = Depends(get_db)):
-    return get_top_products_report_helper(db, mode)
+@query_budget(4)
+async def get_top_products_report(request: Request, mode: str = Query("yearly"), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(cached_report, request, "top_products", report_period_key(mode), lambda s: get_top_products_report_helper(s, mode))
 
 @app.get("/api/reports/problem_products")
-def get_problem_products_report(mode: str = Query("yearly"), db: Session = Depends(get_db)):
-    return get_problem_products_report_helper(db, mode)
+@query_budget(4)
+async def get_problem_products_report(request: Request, mode: str = Query("yearly"), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(cached_report, request, "problem_products", report_period_key(mode), lambda s: get_problem_products_report_helper(s, mode))
 
 # Helper function for problem products report
 def get_problem_products_report_helper(db: Session, mode: str = "yearly"):
-    now = datetime.now()
-    
-    # Determine date range based on mode
-    if mode == "daily":
-        start_date = datetime(now.year, now.month, now.day, 0, 0, 0)
-        end_date = datetime(now.year, now.month, now.day, 23, 59, 59)
-    elif mode == "monthly":
-        start_date = datetime(now.year, now.month, 1, 0, 0, 0)
-        end_date = datetime(now.year, now.month, monthrange(now.year, now.month)[1], 23, 59, 59)
-    else:  # yearly
-        start_date = datetime(now.year, 1, 1, 0, 0, 0)
-        end_date = datetime(now.year, 12, 31, 23, 59, 59)
-    
+    start_date, end_date = get_report_period(mode, db)
+
     # Produk jarang laku (terjual kurang dari 5 unit dalam periode)
     rarely_sold_products = (
         db.query(
@@ -861,14 +1093,20 @@ def get_stock_report_helper(db: Session, mode: str = "yearly"):
     }
 
 @app.get("/api/reports/stock")
-def get_stock_report(mode: str = Query("yearly"), db: Session = Depends(get_db)):
-    return get_stock_report_helper(db, mode)
+@query_budget(3)
+async def get_stock_report(request: Request, mode: str = Query("yearly"), db: AsyncSession = Depends(get_async_db)):
+    # Stok adalah kondisi saat ini, tidak tergantung periode
+    return await db.run_sync(cached_report, request, "stock", "current", lambda s: get_stock_report_helper(s, mode))
 
 @app.get("/api/reports/sales_trend")
-def get_sales_trend_report(db: Session = Depends(get_db)):
+@query_budget(3)
+async def get_sales_trend_report(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(cached_report, request, "sales_trend", "all", get_sales_trend_report_helper)
+
+def get_sales_trend_report_helper(db: Session):
     sales_trend = (
         db.query(
-            func.strftime("%Y-%m", Transaction.created_at).label("month"),
+            func.strftime("%Y-%m", Transaction.created_at, local_date_modifier(get_timezone_name(db))).label("month"),
             func.sum(Transaction.total).label("total_sales")
         )
         .group_by("month")
@@ -880,30 +1118,109 @@ def get_sales_trend_report(db: Session = Depends(get_db)):
         "sales_trend": [{"month": s.month, "total_sales": s.total_sales} for s in sales_trend]
     }
 
+# Helper function for dashboard laporan (semua panel sekaligus)
+def get_dashboard_report_helper(db: Session, mode: str = "yearly"):
+    """Semua panel halaman laporan dari satu agregasi per produk + satu agregasi harian.
+
+    Membaca tabel rollup (daily_product_sales, daily_sales) sehingga tabel
+    transaction_items tidak di-scan sama sekali. Semantik sama dengan
+    endpoint per panel: jarang laku = terjual 1-4 unit dalam periode,
+    tidak pernah terjual = tidak ada penjualan sepanjang waktu.
+    """
+    start, end = get_report_dates(mode, db)
+    in_period = and_(DailyProductSales.business_date >= start, DailyProductSales.business_date <= end)
+
+    # Satu pass: semua produk + penjualan periode + penjualan sepanjang waktu
+    product_rows = (
+        db.query(
+            Product.name,
+            Product.stock,
+            Product.status,
+            func.sum(case((in_period, DailyProductSales.qty), else_=0)).label("period_qty"),
+            func.sum(case((in_period, DailyProductSales.omzet), else_=0)).label("period_omzet"),
+            func.count(DailyProductSales.product_code).label("sold_days"),
+        )
+        .outerjoin(DailyProductSales, DailyProductSales.product_code == Product.code)
+        .group_by(Product.id)
+        .all()
+    )
+
+    qty_by_name = {}
+    omzet_by_name = {}
+    never_sold, low_stock, overstock = [], [], []
+    for p in product_rows:
+        if p.sold_days:
+            qty_by_name[p.name] = qty_by_name.get(p.name, 0) + (p.period_qty or 0)
+            omzet_by_name[p.name] = omzet_by_name.get(p.name, 0) + (p.period_omzet or 0)
+        else:
+            never_sold.append({"name": p.name})
+        if p.status == "active" and p.stock < 10:
+            low_stock.append({"name": p.name, "stock": p.stock})
+        elif p.status == "active" and p.stock > 100:
+            overstock.append({"name": p.name, "stock": p.stock})
+
+    sold = [(name, qty) for name, qty in qty_by_name.items() if qty > 0]
+    top_selling = sorted(sold, key=lambda x: x[1], reverse=True)
+    highest_revenue = sorted(
+        [(name, omzet_by_name[name]) for name, _ in sold], key=lambda x: x[1], reverse=True
+    )
+    rarely_sold = sorted([(name, qty) for name, qty in sold if qty < 5], key=lambda x: x[1])
+
+    # Satu pass di rollup harian: tren per bulan + total periode
+    in_period_daily = and_(DailySales.business_date >= start, DailySales.business_date <= end)
+    month = func.substr(DailySales.business_date, 1, 7)
+    daily_rows = (
+        db.query(
+            month.label("month"),
+            func.sum(DailySales.omzet).label("total_sales"),
+            func.sum(case((in_period_daily, DailySales.trx_count), else_=0)).label("trx_count"),
+            func.sum(case((in_period_daily, DailySales.items_sold), else_=0)).label("items_sold"),
+        )
+        .group_by(month)
+        .order_by(month)
+        .all()
+    )
+
+    return {
+        "mode": mode,
+        "summary": {
+            "total_products": len(product_rows),
+            "total_transactions": sum(r.trx_count for r in daily_rows),
+            "products_sold_this_month": sum(r.items_sold for r in daily_rows),
+        },
+        "top_selling_products": [{"name": n, "total_qty_sold": q} for n, q in top_selling],
+        "highest_revenue_products": [{"name": n, "total_revenue": v} for n, v in highest_revenue],
+        "rarely_sold_products": [{"name": n, "total_qty_sold": q} for n, q in rarely_sold],
+        "never_sold_products": never_sold,
+        "low_stock_products": sorted(low_stock, key=lambda x: x["stock"]),
+        "overstock_products": sorted(overstock, key=lambda x: x["stock"], reverse=True),
+        "sales_trend": [{"month": r.month, "total_sales": r.total_sales} for r in daily_rows],
+    }
+
+@app.get("/api/reports/dashboard")
+@query_budget(4)
+async def get_dashboard_report(request: Request, mode: str = Query("daily"), db: AsyncSession = Depends(get_async_db)):
+    """Semua panel halaman laporan dalam satu response (pengganti 5 request terpisah)"""
+    return await db.run_sync(cached_report, request, "dashboard", report_period_key(mode), lambda s: get_dashboard_report_helper(s, mode))
+
 # -------- SETTINGS ----------
 @app.get("/settings", response_class=HTMLResponse)
-def settings_page(request: Request, db: Session = Depends(get_db)):
+@query_budget(5)
+def settings_page(request: Request, user=Depends(get_identity), db: Session = Depends(get_db)):
     r = require_login(request)
     if r: return r
     # Dapatkan pengaturan yang ada atau buat yang baru jika tidak ada
-    settings = db.query(Setting).first()
+    settings = get_settings(db)
     if not settings:
-        settings = Setting(store_name="Nama Toko Anda", store_address="Alamat Toko Anda", store_phone="")
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
-
-    # Inisialisasi display_name jika belum ada
-    current_user_db = db.query(User).filter(User.username == request.session["user"]["username"]).first()
-    if current_user_db and current_user_db.display_name is None:
-        current_user_db.display_name = current_user_db.username
+        db.add(Setting(store_name="Nama Toko Anda", store_address="Alamat Toko Anda", store_phone=""))
         db.commit()
-        db.refresh(current_user_db)
-        request.session["user"]["display_name"] = current_user_db.display_name # Update session immediately
+        settings = refresh_settings_cache(db)
 
-    return templates.TemplateResponse("settings.html", {"request": request, "user": request.session["user"], "settings": settings})
+    profiles = list_profiles() if user.role == "admin" else []
+    return templates.TemplateResponse("settings.html", {"request": request, "user": user, "settings": settings, "profiles": profiles})
 
 @app.post("/settings")
+@query_budget(3)
 def update_settings(
     request: Request,
     store_name: str = Form(...),
@@ -923,50 +1240,100 @@ def update_settings(
     if not settings:
         settings = Setting()
         db.add(settings)
+    timezone_changed = settings.timezone != timezone
     settings.store_name = store_name
     settings.store_address = store_address
     settings.store_phone = store_phone
     settings.timezone = timezone
+    if timezone_changed:
+        # Rollup dikunci per tanggal lokal toko: hitung ulang dengan zona waktu baru
+        # (di luar budget route ini, tapi jarang dan hanya oleh admin)
+        rebuild_rollups(db, timezone)
+        bump_report_version(db)
     db.commit()
+    refresh_settings_cache(db)
+    broker.publish("settings", dict(get_clock_info(db), store_name=store_name))
     return RedirectResponse("/settings?msg=updated", status_code=302)
 
 @app.post("/settings/update_display_name")
+@query_budget(4)
 def update_display_name(
     request: Request,
     new_display_name: str = Form(...),
+    user=Depends(get_identity),
     db: Session = Depends(get_db),
 ):
     r = require_login(request)
     if r: return r
 
-    user_in_db = db.query(User).filter(User.username == request.session["user"]["username"]).first()
-    if user_in_db:
-        user_in_db.display_name = new_display_name
-        db.commit()
-        db.refresh(user_in_db)
-        request.session["user"]["display_name"] = user_in_db.display_name # Update session immediately
-        return RedirectResponse("/settings?msg=display_name_updated", status_code=302)
-    return RedirectResponse("/settings?msg=error", status_code=302)
+    updated = db.query(User).filter(User.username == user.username).update(
+        {User.display_name: new_display_name}, synchronize_session=False
+    )
+    if not updated:
+        return RedirectResponse("/settings?msg=error", status_code=302)
+    bump_identity_version(db)
+    db.commit()
+    invalidate_identity(user.username)
+    request.session["user"] = dict(session_user(user), display_name=new_display_name)
+    return RedirectResponse("/settings?msg=display_name_updated", status_code=302)
+
 
+@app.get("/settings/slow-queries", response_class=HTMLResponse)
+@query_budget(2)
+def slow_queries_page(request: Request, user=Depends(get_identity)):
+    """Daftar query lambat dari log (khusus admin)"""
+    r = require_admin(request)
+    if r: return r
+    return templates.TemplateResponse("slow_queries.html", {
+        "request": request, "user": user, "queries": worst_queries(),
+        "threshold_ms": SLOW_QUERY_MS, "log_path": SLOW_QUERY_LOG,
+    })
+
+@app.get("/settings/profiles/{name}")
+@query_budget(0)
+def download_profile(request: Request, name: str):
+    """Download profil request (collapsed stacks, untuk speedscope/flamegraph.pl)"""
+    r = require_admin(request)
+    if r: return r
+    path = profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profil tidak ditemukan.")
+    return FileResponse(path, filename=name, media_type="text/plain")
 
 @app.get("/settings/export_db")
+@query_budget(0)
 def export_database(request: Request):
     """Export seluruh database SQLite (pos.db) sebagai file download."""
     r = require_login(request)
     if r: return r
-    db_path = os.path.join(os.path.dirname(__file__), "pos.db")
-    if not os.path.exists(db_path):
+    if not DB_PATH or not os.path.exists(DB_PATH):
         raise HTTPException(status_code=404, detail="File database tidak ditemukan.")
     filename = f"pos_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+
+    # Pakai SQLite backup API: hasilnya konsisten walaupun ada transaksi berjalan
+    # dan data yang masih ada di file WAL ikut tersalin
+    fd, tmp_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    raw = engine.raw_connection()
+    try:
+        dst = sqlite3.connect(tmp_path)
+        try:
+            raw.driver_connection.backup(dst)
+        finally:
+            dst.close()
+    finally:
+        raw.close()
     return FileResponse(
-        path=db_path,
+        path=tmp_path,
         media_type="application/octet-stream",
         filename=filename,
+        background=BackgroundTask(os.remove, tmp_path),
     )
 
 
 @app.post("/settings/import_db")
-def import_database(
+@query_budget(7)
+async def import_database(
     request: Request,
     file: UploadFile = File(...),
 ):
@@ -978,9 +1345,18 @@ def import_database(
     if not file.filename.lower().endswith((".db", ".sqlite", ".sqlite3")):
         return RedirectResponse("/settings?msg=error_import", status_code=302)
 
-    db_dir = os.path.dirname(__file__)
-    db_path = os.path.join(db_dir, "pos.db")
-    tmp_path = os.path.join(db_dir, "pos_import_tmp.db")
+    # Tidak boleh ada checkout di tengah penggantian file: checkout yang
+    # sedang berjalan selesai dulu, yang baru menunggu sampai database baru siap
+    async with _checkout_lock:
+        # Pool async juga harus ditutup; kalau tidak, route async tetap menulis
+        # ke file lama yang sudah di-unlink dan datanya hilang
+        await async_engine.dispose()
+        ok = await run_in_threadpool(_replace_database, file)
+    return RedirectResponse("/settings?msg=imported" if ok else "/settings?msg=error_import", status_code=302)
+
+def _replace_database(file: UploadFile) -> bool:
+    db_path = DB_PATH
+    tmp_path = os.path.join(os.path.dirname(db_path), "pos_import_tmp.db")
 
     try:
         # Simpan upload ke file sementara
@@ -990,10 +1366,30 @@ def import_database(
         # Tutup semua koneksi aktif ke SQLite sebelum replace
         engine.dispose()
 
+        # File WAL/SHM milik database lama tidak boleh ikut terbaca oleh database baru
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
         # Replace database lama dengan yang baru
         shutil.move(tmp_path, db_path)
 
-        return RedirectResponse("/settings?msg=imported", status_code=302)
+        # Pastikan skema (termasuk index pencarian) sesuai dengan versi aplikasi
+        run_migrations(engine)
+
+        # Versi katalog di database baru tidak nyambung dengan versi di terminal: paksa full sync
+        db = SessionLocal()
+        try:
+            reset_catalog(db)
+            reset_report_version(db)
+            reset_identity_version(db)
+            db.commit()
+            settings = refresh_settings_cache(db)
+            broker.publish("settings", dict(get_clock_info(db), store_name=settings.store_name if settings else None))
+        finally:
+            db.close()
+
+        return True
     except Exception as e:
         # Bersihkan tmp jika ada
         try:
@@ -1002,9 +1398,10 @@ def import_database(
         except:
             pass
         print(f"Error import database: {e}")
-        return RedirectResponse("/settings?msg=error_import", status_code=302)
+        return False
 
 @app.post("/settings/clear_database")
+@query_budget(11)
 def clear_database(request: Request, db: Session = Depends(get_db)):
     """Hapus semua data dari database (produk, transaksi, stock updates, dll)"""
     r = require_login(request)
@@ -1016,6 +1413,9 @@ def clear_database(request: Request, db: Session = Depends(get_db)):
         db.query(StockUpdate).delete()
         db.query(Transaction).delete()
         db.query(Product).delete()
+        clear_rollups(db)
+        reset_catalog(db)
+        reset_report_version(db)
         # Settings dan User tidak dihapus untuk keamanan
         db.commit()
         return RedirectResponse("/settings?msg=database_cleared", status_code=302)
@@ -1023,225 +1423,176 @@ def clear_database(request: Request, db: Session = Depends(get_db)):
         db.rollback()
         return RedirectResponse("/settings?msg=error_clear", status_code=302)
 
-def _apply_excel_styling(workbook, writer, transactions, total_pendapatan, total_pengeluaran, db):
-    """Fungsi helper untuk apply styling ke semua sheet Excel"""
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.utils import get_column_letter
-    
-    # Define styles
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")  # Biru
-    header_font = Font(bold=True, color="FFFFFF", size=10, name="Roboto")  # Font lebih kecil
-    border_style = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    center_align = Alignment(horizontal='center', vertical='center')
-    right_align = Alignment(horizontal='right', vertical='center')
-    left_align = Alignment(horizontal='left', vertical='center')
-    
-    # Fungsi helper untuk styling sheet dengan desain yang konsisten
-    def style_sheet_consistent(ws, sheet_name):
-        """Apply styling konsisten ke semua sheet"""
-        if ws.max_row <= 1:
-            return  # Skip jika tidak ada data
-        
-        ws.freeze_panes = 'A2'
-        
-        # Style header - semua sheet menggunakan warna biru yang sama
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = center_align
-            cell.border = border_style
-        
-        # Set row height untuk header
-        ws.row_dimensions[1].height = 20
-        
-        # Style data rows
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-            for cell in row:
-                cell.border = border_style
-                
-                # Format angka - cek semua kolom yang mungkin berisi angka
-                if isinstance(cell.value, (int, float)):
-                    cell.number_format = '#,##0'
-                    cell.alignment = right_align
-                elif cell.column_letter == 'A':  # Kolom pertama biasanya teks
-                    cell.alignment = left_align
-                else:
-                    cell.alignment = left_align
-        
-        # Auto-width untuk semua kolom
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if cell.value:
-                        cell_str = str(cell.value)
-                        if len(cell_str) > max_length:
-                            max_length = len(cell_str)
-                except:
-                    pass
-            adjusted_width = min(max(max_length + 2, 10), 50)
-            if adjusted_width > 0:
-                ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Apply styling konsisten ke semua sheet
-    for sheet_name in workbook.sheetnames:
-        ws = workbook[sheet_name]
-        style_sheet_consistent(ws, sheet_name)
+EXPORT_CHUNK_SIZE = 1000
+
+def _with_progress(rows, total: int, progress):
+    for i, row in enumerate(rows, start=1):
+        if i % EXPORT_CHUNK_SIZE == 0:
+            progress(i * 100 // total)
+        yield row
+
+def _iter_report_sheets(db: Session, mode: str, start: datetime, end: datetime, progress=None):
+    """Daftar sheet laporan Excel. Query tiap sheet baru dijalankan saat sheet itu ditulis
+    (baris transaksi dan update stok per chunk); di depan hanya dua agregat ringkasan."""
+    # Hitung total pendapatan dan total pengeluaran (modal penjualan) dari rollup harian
+    totals = get_sales_totals(db, *get_report_dates(mode, db))
+    total_pendapatan = totals["omzet"]
+    total_pengeluaran_penjualan = totals["modal"]
+
+    # Total pengeluaran dari stock updates dalam periode yang sama
+    stock_filter = and_(StockUpdate.created_at >= start, StockUpdate.created_at <= end)
+    total_pengeluaran_stock, stock_update_count = db.query(
+        func.coalesce(func.sum(StockUpdate.total_pengeluaran), 0), func.count(StockUpdate.id)
+    ).filter(stock_filter).one()
+    total_pengeluaran = total_pengeluaran_penjualan + total_pengeluaran_stock
+
+    # Ringkasan Transaksi - tetap gunakan tanggal lengkap untuk mengetahui tgl pembelian
+    def transactions():
+        rows = (
+            (t.trx_no, t.created_at.strftime("%Y-%m-%d %H:%M"), t.created_at.strftime("%Y-%m"),
+             t.cashier, t.payment_method, t.total, t.paid, t.change)
+            for t in db.query(
+                Transaction.trx_no, Transaction.created_at, Transaction.cashier, Transaction.payment_method,
+                Transaction.total, Transaction.paid, Transaction.change,
+            ).filter(Transaction.created_at >= start, Transaction.created_at <= end)
+            .order_by(Transaction.created_at, Transaction.id)
+            .yield_per(EXPORT_CHUNK_SIZE)
+        )
+        if progress and totals["trx_count"]:
+            # Jumlah transaksi periode sudah diketahui dari rollup
+            rows = _with_progress(rows, totals["trx_count"], progress)
+        return rows
+
+    sheets = [
+        Sheet("Transaksi", ["TRX_NO", "TANGGAL", "BULAN_TAHUN", "KASIR", "METODE_BAYAR", "TOTAL", "BAYAR", "KEMBALI"], transactions),
+        Sheet("Ringkasan Keuangan", ["Keterangan", "Nilai"], [
+            ("Total Pendapatan", total_pendapatan),
+            ("Total Pengeluaran (Penjualan)", total_pengeluaran_penjualan),
+            ("Total Pengeluaran (Update Stok)", total_pengeluaran_stock),
+            ("Total Pengeluaran", total_pengeluaran),
+            ("Laba/Rugi", total_pendapatan - total_pengeluaran),
+        ]),
+    ]
+
+    # Tambah sheet Detail Update Stok jika ada
+    if stock_update_count:
+        def stock_updates():
+            return (
+                (su.created_at.strftime("%Y-%m-%d %H:%M"), su.product_code, su.product_name, su.old_stock,
+                 su.new_stock, su.stock_added, su.cost_price, su.total_pengeluaran, su.updated_by or "System")
+                for su in db.query(
+                    StockUpdate.created_at, StockUpdate.product_code, StockUpdate.product_name, StockUpdate.old_stock,
+                    StockUpdate.new_stock, StockUpdate.stock_added, StockUpdate.cost_price,
+                    StockUpdate.total_pengeluaran, StockUpdate.updated_by,
+                ).filter(stock_filter).order_by(StockUpdate.created_at, StockUpdate.id).yield_per(EXPORT_CHUNK_SIZE)
+            )
+        sheets.append(Sheet("Detail Update Stok", [
+            "TANGGAL", "KODE_PRODUK", "NAMA_PRODUK", "STOK_LAMA", "STOK_BARU", "STOK_DITAMBAH",
+            "HARGA_ASLI", "TOTAL_PENGELUARAN", "DIPERBARUI_OLEH",
+        ], stock_updates))
 
-@app.get("/api/reports/export_excel")
-def export_reports_excel(request: Request, mode: str = "daily", db: Session = Depends(get_db)):
-    r = require_login(request)
-    if r: return r
+    # Panel produk dari satu agregasi (sama dengan dashboard laporan), dijalankan
+    # sekali saat sheet pertama yang membutuhkannya ditulis
+    dashboard_cache = []
 
-    now = datetime.now()
-    start, end, title_prefix = None, None, ""
+    def dashboard():
+        if not dashboard_cache:
+            dashboard_cache.append(get_dashboard_report_helper(db, mode))
+        return dashboard_cache[0]
 
+    def panel(key, fields):
+        return lambda: [tuple(p[f] for f in fields) for p in dashboard()[key]]
+
+    # Dynamic label berdasarkan mode
     if mode == "daily":
-        start = datetime(now.year, now.month, now.day, 0, 0, 0)
-        end = datetime(now.year, now.month, now.day, 23, 59, 59)
-        title_prefix = f"Harian-{start.date()}"
+        label_suffix = "Harian"
     elif mode == "monthly":
-        start = datetime(now.year, now.month, 1, 0, 0, 0)
-        last_day = monthrange(now.year, now.month)[1]
-        end = datetime(now.year, now.month, last_day, 23, 59, 59)
-        title_prefix = f"Bulanan-{now.strftime('%Y-%m')}"
+        label_suffix = "Bulan Ini"
     else:
-        start = datetime(now.year, 1, 1, 0, 0, 0)
-        end = datetime(now.year, 12, 31, 23, 59, 59)
-        title_prefix = f"Tahunan-{now.year}"
+        label_suffix = "Tahun Ini"
+
+    def product_summary():
+        summary = dashboard()["summary"]
+        return [
+            ("Total Produk", summary["total_products"]),
+            (f"Produk Terjual {label_suffix}", summary["products_sold_this_month"]),
+        ]
+
+    sheets += [
+        Sheet("Ringkasan Produk", ["Ringkasan", "Nilai"], product_summary),
+        Sheet("Top Produk Laku", ["Nama Produk", "Total Terjual"], panel("top_selling_products", ("name", "total_qty_sold"))),
+        Sheet("Top Produk Omzet", ["Nama Produk", "Total Omzet"], panel("highest_revenue_products", ("name", "total_revenue"))),
+        Sheet("Jarang Laku", ["Nama Produk", "Jumlah Terjual"], panel("rarely_sold_products", ("name", "total_qty_sold"))),
+        Sheet("Tidak Terjual", ["Nama Produk"], panel("never_sold_products", ("name",))),
+        Sheet("Stok Hampir Habis", ["Nama Produk", "Stok"], panel("low_stock_products", ("name", "stock"))),
+        Sheet("Overstock", ["Nama Produk", "Stok"], panel("overstock_products", ("name", "stock"))),
+        Sheet("Tren Penjualan", ["Bulan", "Total Penjualan"], panel("sales_trend", ("month", "total_sales"))),
+    ]
+    return sheets
+
+def report_export_filename(mode: str, start: date) -> str:
+    if mode == "daily":
+        title_prefix = f"Harian-{start}"
+    elif mode == "monthly":
+        title_prefix = f"Bulanan-{start.strftime('%Y-%m')}"
+    else:
+        title_prefix = f"Tahunan-{start.year}"
+    return f"Laporan_Penjualan_{title_prefix}.xlsx"
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        workbook = writer.book
-        # Ringkasan Transaksi - tetap gunakan tanggal lengkap untuk mengetahui tgl pembelian
-        transactions = db.query(Transaction).filter(Transaction.created_at >= start, Transaction.created_at <= end).all()
-        
-        df_trx = pd.DataFrame([{
-            "TRX_NO": t.trx_no,
-            "TANGGAL": t.created_at.strftime("%Y-%m-%d %H:%M"),
-            "BULAN_TAHUN": t.created_at.strftime("%Y-%m"),  # Tambah kolom bulan-tahun untuk ringkasan
-            "KASIR": t.cashier,
-            "METODE_BAYAR": t.payment_method,
-            "TOTAL": t.total,
-            "BAYAR": t.paid,
-            "KEMBALI": t.change,
-        } for t in transactions])
-        df_trx.to_excel(writer, sheet_name='Transaksi', index=False)
-        
-        # Hitung total pendapatan dan total pengeluaran
-        total_pendapatan = sum(t.total for t in transactions)
-        total_pengeluaran = 0
-        for t in transactions:
-            for item in t.items:
-                total_pengeluaran += item.cost_price * item.qty
-        
-        # Tambahkan total pengeluaran dari stock updates dalam periode yang sama
-        stock_updates = db.query(StockUpdate).filter(
-            StockUpdate.created_at >= start,
-            StockUpdate.created_at <= end
-        ).all()
-        total_pengeluaran_stock = sum(su.total_pengeluaran for su in stock_updates)
-        total_pengeluaran += total_pengeluaran_stock
-        
-        # Tambah sheet Ringkasan Keuangan
-        df_keuangan = pd.DataFrame([{
-            "Keterangan": "Total Pendapatan",
-            "Nilai": total_pendapatan
-        }, {
-            "Keterangan": "Total Pengeluaran (Penjualan)",
-            "Nilai": total_pengeluaran - total_pengeluaran_stock
-        }, {
-            "Keterangan": "Total Pengeluaran (Update Stok)",
-            "Nilai": total_pengeluaran_stock
-        }, {
-            "Keterangan": "Total Pengeluaran",
-            "Nilai": total_pengeluaran
-        }, {
-            "Keterangan": "Laba/Rugi",
-            "Nilai": total_pendapatan - total_pengeluaran
-        }])
-        df_keuangan.to_excel(writer, sheet_name='Ringkasan Keuangan', index=False)
-        
-        # Tambah sheet Detail Update Stok jika ada
-        if stock_updates:
-            df_stock_updates = pd.DataFrame([{
-                "TANGGAL": su.created_at.strftime("%Y-%m-%d %H:%M"),
-                "KODE_PRODUK": su.product_code,
-                "NAMA_PRODUK": su.product_name,
-                "STOK_LAMA": su.old_stock,
-                "STOK_BARU": su.new_stock,
-                "STOK_DITAMBAH": su.stock_added,
-                "HARGA_ASLI": su.cost_price,
-                "TOTAL_PENGELUARAN": su.total_pengeluaran,
-                "DIPERBARUI_OLEH": su.updated_by or "System"
-            } for su in stock_updates])
-            df_stock_updates.to_excel(writer, sheet_name='Detail Update Stok', index=False)
-
-        # Ringkasan Produk (efisien - hanya data penting)
-        summary_data = get_summary_report_helper(db, mode)
-        
-        # Dynamic label berdasarkan mode
-        if mode == "daily":
-            label_suffix = "Harian"
-        elif mode == "monthly":
-            label_suffix = "Bulan Ini"
-        else:
-            label_suffix = "Tahun Ini"
-        
-        df_summary = pd.DataFrame([{
-            "Ringkasan": "Total Produk", "Nilai": summary_data["total_products"]},
-            {"Ringkasan": f"Produk Terjual {label_suffix}", "Nilai": summary_data["products_sold_this_month"]},
-        ])
-        df_summary.to_excel(writer, sheet_name='Ringkasan Produk', index=False)
-
-        # Top Produk Paling Laku
-        top_products = get_top_products_report_helper(db, mode)
-        df_top_selling = pd.DataFrame(top_products["top_selling_products"])
-        df_top_selling.rename(columns={'name': 'Nama Produk', 'total_qty_sold': 'Total Terjual'})
-        df_top_selling.to_excel(writer, sheet_name='Top Produk Laku', index=False)
-
-        # Top Produk Omzet Tertinggi
-        df_highest_revenue = pd.DataFrame(top_products["highest_revenue_products"])
-        df_highest_revenue.rename(columns={'name': 'Nama Produk', 'total_revenue': 'Total Omzet'})
-        df_highest_revenue.to_excel(writer, sheet_name='Top Produk Omzet', index=False)
-
-        # Produk Bermasalah
-        problem_products = get_problem_products_report_helper(db, mode)
-        df_rarely_sold = pd.DataFrame(problem_products["rarely_sold_products"])
-        df_rarely_sold.rename(columns={'name': 'Nama Produk', 'total_qty_sold': 'Jumlah Terjual'})
-        df_rarely_sold.to_excel(writer, sheet_name='Jarang Laku', index=False)
-
-        df_never_sold = pd.DataFrame(problem_products["never_sold_products"])
-        df_never_sold.rename(columns={'name': 'Nama Produk'})
-        df_never_sold.to_excel(writer, sheet_name='Tidak Terjual', index=False)
-
-        # Stok Produk
-        stock_report = get_stock_report_helper(db, mode)
-        df_low_stock = pd.DataFrame(stock_report["low_stock_products"])
-        df_low_stock.rename(columns={'name': 'Nama Produk', 'stock': 'Stok'})
-        df_low_stock.to_excel(writer, sheet_name='Stok Hampir Habis', index=False)
-
-        df_overstock = pd.DataFrame(stock_report["overstock_products"])
-        df_overstock.rename(columns={'name': 'Nama Produk', 'stock': 'Stok'})
-        df_overstock.to_excel(writer, sheet_name='Overstock', index=False)
-
-        # Tren Penjualan
-        sales_trend = get_sales_trend_report(db)
-        df_sales_trend = pd.DataFrame(sales_trend["sales_trend"])
-        df_sales_trend.rename(columns={'month': 'Bulan', 'total_sales': 'Total Penjualan'})
-        df_sales_trend.to_excel(writer, sheet_name='Tren Penjualan', index=False)
-        
-        # Apply styling ke semua sheet
-        _apply_excel_styling(workbook, writer, transactions, total_pendapatan, total_pengeluaran, db)
+def _stream_report_workbook(mode: str, start: datetime, end: datetime):
+    # Session sendiri: generator masih berjalan setelah dependency get_db ditutup
+    db = SessionLocal()
+    try:
+        yield from stream_xlsx(_iter_report_sheets(db, mode, start, end))
+    finally:
+        db.close()
 
-    output.seek(0)
-    file_name = f"Laporan_Penjualan_{title_prefix}.xlsx"
-    return StreamingResponse(output, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={
+@app.get("/api/reports/export_excel")
+@query_budget(7)
+def export_reports_excel(request: Request, mode: str = "daily"):
+    r = require_login(request)
+    if r: return r
+
+    start, end = get_report_period(mode)
+    # File dikirim sambil ditulis (streaming), tanpa menampung seluruh workbook di memori
+    file_name = report_export_filename(mode, get_report_dates(mode)[0])
+    return StreamingResponse(_stream_report_workbook(mode, start, end), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={
         "Content-Disposition": f"attachment; filename={file_name}"
     })
+
+# -------- MONITORING ----------
+# Batas latensi database untuk /healthz (ms); di atasnya dilaporkan 503
+HEALTH_MAX_DB_MS = float(os.getenv("POS_HEALTH_MAX_DB_MS", "500"))
+
+# Token untuk scraper Prometheus (header "Authorization: Bearer <token>").
+# Tanpa token, /metrics hanya bisa dibuka admin yang sedang login.
+METRICS_TOKEN = os.getenv("POS_METRICS_TOKEN", "")
+
+def _metrics_token_ok(request: Request) -> bool:
+    if not METRICS_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}")
+
+@app.get("/metrics")
+@query_budget(0)
+def metrics_endpoint(request: Request):
+    """Metrik proses ini dalam format teks Prometheus"""
+    if not _metrics_token_ok(request):
+        r = require_admin(request)
+        if r: return r
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/healthz")
+@query_budget(1)
+def healthz():
+    """Cek database: satu query kecil, gagal (503) jika error atau lebih lambat dari HEALTH_MAX_DB_MS"""
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT value FROM counters LIMIT 1")).fetchall()
+    except Exception as e:
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=503)
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    if latency_ms > HEALTH_MAX_DB_MS:
+        return JSONResponse({"status": "slow", "db_latency_ms": latency_ms}, status_code=503)
+    return {"status": "ok", "db_latency_ms": latency_ms}
@@ -1,8 +1,39 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from passlib.context import CryptContext
 from fastapi import Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
+
+# Cost bcrypt. Hash dengan cost berbeda tetap bisa login, lalu otomatis
+# di-hash ulang dengan cost ini (min = max = default -> needs_update).
+BCRYPT_ROUNDS = int(os.getenv("POS_BCRYPT_ROUNDS", "12"))
+
+# Verifikasi password dijalankan di process pool terpisah (prioritas CPU
+# diturunkan) supaya lonjakan login saat ganti shift tidak merebut CPU
+# dari checkout. AUTH_QUEUE_LIMIT membatasi login yang menunggu giliran.
+AUTH_WORKERS = int(os.getenv("POS_AUTH_WORKERS", "1"))
+AUTH_QUEUE_LIMIT = int(os.getenv("POS_AUTH_QUEUE_LIMIT", "16"))
+AUTH_WORKER_NICE = 10
+
+# Backoff per username: setelah LOGIN_FREE_ATTEMPTS gagal berturut-turut,
+# percobaan berikutnya ditolak (tanpa bcrypt) selama 2, 4, 8, ... detik.
+LOGIN_FREE_ATTEMPTS = 3
+LOGIN_MAX_BACKOFF = 300  # detik
+LOGIN_TRACKED_USERS = 10000
 
-pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def hash_password(p: str) -> str:
     return pwd.hash(p)
@@ -10,6 +41,121 @@ def hash_password(p: str) -> str:
 def verify_password(p: str, hashed: str) -> bool:
     return pwd.verify(p, hashed)
 
+
+_dummy_hash = None
+_dummy_hash_lock = threading.Lock()
+
+def dummy_password_hash() -> str:
+    """Hash acak dengan cost yang sama, diverifikasi saat username tidak ada
+    agar waktu respons login tidak membocorkan username mana yang terdaftar"""
+    global _dummy_hash
+    with _dummy_hash_lock:
+        if _dummy_hash is None:
+            _dummy_hash = hash_password(os.urandom(16).hex())
+        return _dummy_hash
+
+
+class LoginBusy(Exception):
+    """Antrian verifikasi password penuh"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+def _init_worker():
+    try:
+        os.nice(AUTH_WORKER_NICE)
+    except (AttributeError, OSError):
+        pass
+
+def _verify_and_update(password: str, hashed: str):
+    # Dijalankan di proses worker: (cocok, hash baru atau None)
+    return pwd.verify_and_update(password, hashed)
+
+def _get_executor(reset: bool = False):
+    global _executor
+    with _executor_lock:
+        if reset and _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            # spawn, bukan fork: fork dari proses yang sudah punya banyak thread
+            # (threadpool, koneksi aiosqlite) bisa mewarisi lock yang sedang
+            # terkunci sehingga worker macet selamanya
+            _executor = ProcessPoolExecutor(
+                max_workers=AUTH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor
+
+def shutdown_password_workers():
+    """Hentikan process pool saat aplikasi berhenti (uvicorn keluar lewat sinyal, atexit tidak jalan)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+async def verify_password_async(password: str, hashed: str):
+    """Verifikasi di process pool. Return (cocok, hash baru jika perlu rehash).
+
+    Raise LoginBusy jika sudah ada AUTH_QUEUE_LIMIT verifikasi yang antri.
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= AUTH_QUEUE_LIMIT:
+            raise LoginBusy()
+        _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_get_executor(), _verify_and_update, password, hashed)
+        except BrokenProcessPool:
+            # Worker mati (mis. di-kill): buat pool baru dan coba sekali lagi
+            return await loop.run_in_executor(_get_executor(reset=True), _verify_and_update, password, hashed)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+_failures = {}  # username -> (jumlah gagal berturut-turut, diblokir sampai)
+_failures_lock = threading.Lock()
+
+def login_retry_after(username: str) -> int:
+    """Sisa detik sebelum username boleh mencoba login lagi (0 = boleh)"""
+    with _failures_lock:
+        entry = _failures.get(username)
+    if not entry:
+        return 0
+    remaining = entry[1] - time.monotonic()
+    return int(remaining) + 1 if remaining > 0 else 0
+
+def record_login_failure(username: str):
+    now = time.monotonic()
+    with _failures_lock:
+        if len(_failures) >= LOGIN_TRACKED_USERS and username not in _failures:
+            _prune_failures(now)
+        count = _failures.get(username, (0, 0))[0] + 1
+        blocked_until = 0
+        if count >= LOGIN_FREE_ATTEMPTS:
+            blocked_until = now + min(2 ** (count - LOGIN_FREE_ATTEMPTS + 1), LOGIN_MAX_BACKOFF)
+        _failures[username] = (count, blocked_until)
+
+def record_login_success(username: str):
+    with _failures_lock:
+        _failures.pop(username, None)
+
+def _prune_failures(now: float):
+    # Buang username yang tidak sedang diblokir; jika masih penuh, yang tertua
+    for name in [n for n, (_, until) in _failures.items() if until <= now]:
+        del _failures[name]
+    while len(_failures) >= LOGIN_TRACKED_USERS:
+        del _failures[next(iter(_failures))]
+
+
 def get_current_user(request: Request):
     return request.session.get("user")
 
@@ -17,3 +163,12 @@ def require_login(request: Request):
     if not get_current_user(request):
         return RedirectResponse("/login", status_code=302)
     return None
+
+def require_admin(request: Request):
+    """Seperti require_login, ditambah cek role admin dari session (403 jika bukan admin)"""
+    user = get_current_user(request)
+    if not user:
+        return RedirectResponse("/login", status_code=302)
+    if user.get("role") != "admin":
+        return PlainTextResponse("Halaman ini hanya untuk admin", status_code=403)
+    return None
@@ -0,0 +1,410 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+# Benchmark HTTP berulang untuk checkout, kasir dan laporan. Aplikasi
+# dijalankan (uvicorn, subprocess) di atas salinan database fixture hasil
+# seed.py, lalu beberapa jenis klien berjalan bersamaan selama --duration:
+#   lane     : buka /cashier sesekali, cari produk, POST /checkout, buka struk
+#   manager  : /reports?mode=yearly lalu /api/reports/dashboard, jeda berpikir
+#   exporter : download /api/reports/export_excel?mode=yearly sampai selesai
+#   importer : upload import produk (--import-rows baris) sebagai job background
+#              lalu poll statusnya sampai selesai, berulang
+# Hasil (p50/p95/p99, throughput, error rate per route) ditulis sebagai JSON
+# agar bisa dibandingkan antar commit (--compare hasil_lama.json).
+# Hanya butuh library standar + dependency aplikasi; berjalan offline.
+
+BENCH_DIR = os.path.abspath(os.getenv("POS_BENCH_DIR", "./bench_data"))
+SERVER_START_TIMEOUT = 60  # detik
+MANAGER_THINK_SECONDS = 1.0
+CASHIER_PAGE_EVERY = 20  # lane membuka ulang /cashier setiap sekian checkout
+PRODUCT_SAMPLE_SIZE = 500
+JOB_POLL_SECONDS = 0.5
+
+
+class Client:
+    """Klien HTTP keep-alive satu thread dengan cookie session (tanpa ikut redirect)"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.cookie = None
+        self.conn = None
+
+    def request(self, method: str, path: str, form: dict = None, stream: bool = False):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        body = urlencode(form) if form is not None else None
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if form is not None else {}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            if stream:
+                while resp.read(65536):
+                    pass
+                data = b""
+            else:
+                data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        for name, value in resp.getheaders():
+            if name.lower() == "set-cookie" and value.startswith("session="):
+                self.cookie = value.split(";", 1)[0]
+        return resp.status, resp.getheader("Location"), data
+
+    def upload(self, path: str, filename: str, content: bytes):
+        """POST multipart satu file (field "file")"""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        boundary = "posbench" + os.urandom(8).hex()
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}", "Cookie": self.cookie or ""}
+        try:
+            self.conn.request("POST", path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            return resp.status, resp.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+
+    def login(self, username: str, password: str):
+        status, location, _ = self.request("POST", "/login", {"username": username, "password": password})
+        if status != 302 or location != "/cashier":
+            raise RuntimeError(f"Login gagal (status {status})")
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}  # route -> [detik]
+        self.errors = {}  # route -> jumlah
+
+    def reset(self):
+        with self._lock:
+            self.latencies.clear()
+            self.errors.clear()
+
+    def record(self, route: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def timed(client: Client, recorder: Recorder, route: str, method: str, path: str, form: dict = None,
+          ok_status=(200,), stream: bool = False):
+    started = time.perf_counter()
+    try:
+        status, location, data = client.request(method, path, form, stream)
+        ok = status in ok_status
+    except Exception:
+        status, location, data, ok = None, None, b"", False
+    recorder.record(route, time.perf_counter() - started, ok)
+    return status, location, data
+
+
+def lane_worker(client, recorder, products, stop, lane_no):
+    rng = random.Random(lane_no)
+    checkouts = 0
+    while not stop.is_set():
+        if checkouts % CASHIER_PAGE_EVERY == 0:
+            timed(client, recorder, "GET /cashier", "GET", "/cashier")
+        cart = []
+        for code, name, price in rng.sample(products, min(len(products), rng.randint(1, 6))):
+            term = name.split()[0][:4]
+            timed(client, recorder, "GET /api/products/search", "GET", "/api/products/search?" + urlencode({"q": term}))
+            cart.append({"code": code, "name": name, "price": price, "qty": rng.randint(1, 3)})
+        total = sum(it["price"] * it["qty"] for it in cart)
+        status, location, _ = timed(
+            client, recorder, "POST /checkout", "POST", "/checkout",
+            {"payment_method": "cash", "paid": str(total), "cart_json": json.dumps(cart), "terminal": f"B{lane_no}"},
+            ok_status=(302,),
+        )
+        checkouts += 1
+        if status == 302 and location and location.startswith("/receipt/"):
+            timed(client, recorder, "GET /receipt/{id}", "GET", location)
+
+
+def manager_worker(client, recorder, stop):
+    while not stop.is_set():
+        timed(client, recorder, "GET /reports?mode=yearly", "GET", "/reports?mode=yearly")
+        timed(client, recorder, "GET /api/reports/dashboard?mode=yearly", "GET", "/api/reports/dashboard?mode=yearly")
+        stop.wait(MANAGER_THINK_SECONDS)
+
+
+def exporter_worker(client, recorder, stop):
+    while not stop.is_set():
+        timed(client, recorder, "GET /api/reports/export_excel?mode=yearly", "GET",
+              "/api/reports/export_excel?mode=yearly", stream=True)
+
+
+def import_file(rows: int) -> bytes:
+    """File import produk: kode tetap, jadi run pertama insert dan berikutnya update"""
+    import io
+    import pandas as pd
+    from importers import PRODUCT_IMPORT_COLUMNS
+    buf = io.BytesIO()
+    pd.DataFrame(
+        [[f"BENCHIMP{i:06d}", f"Produk Import Bench {i}", 1000, 1500, 10] for i in range(rows)],
+        columns=PRODUCT_IMPORT_COLUMNS,
+    ).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def importer_worker(client, recorder, stop, content: bytes):
+    # Dicatat sebagai satu "request": submit sampai job selesai
+    while not stop.is_set():
+        started = time.perf_counter()
+        ok = False
+        try:
+            status, data = client.upload("/api/jobs/import_products", "bench.xlsx", content)
+            if status == 202:
+                status_url = json.loads(data)["status_url"]
+                while True:
+                    status, _, data = client.request("GET", status_url)
+                    job_status = json.loads(data)["status"] if status == 200 else "failed"
+                    if job_status in ("done", "failed"):
+                        ok = job_status == "done"
+                        break
+                    time.sleep(JOB_POLL_SECONDS)
+        except Exception:
+            pass
+        recorder.record("JOB import_products", time.perf_counter() - started, ok)
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile dari list yang sudah terurut"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    routes = {}
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        errors = recorder.errors.get(route, 0)
+        routes[route] = {
+            "count": len(values),
+            "errors": errors,
+            "error_rate": round(errors / len(values), 4),
+            "throughput_rps": round(len(values) / duration, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    total = sum(r["count"] for r in routes.values())
+    errors = sum(r["errors"] for r in routes.values())
+    return {
+        "routes": routes,
+        "total": {
+            "count": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "throughput_rps": round(total / duration, 2),
+        },
+    }
+
+
+def ensure_fixture(args) -> str:
+    """Database fixture di BENCH_DIR, dibuat sekali dengan seed.py (seed tetap agar hasil bisa diulang)"""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"fixture-p{args.products}-t{args.transactions}-y{args.years}.db")
+    if os.path.exists(path) and not args.regenerate:
+        return path
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    print(f"Membuat fixture {path}...", file=sys.stderr)
+    subprocess.run(
+        [sys.executable, "seed.py", "--products", str(args.products), "--transactions", str(args.transactions),
+         "--years", str(args.years), "--seed", "42"],
+        env=dict(os.environ, POS_DB_URL=f"sqlite:///{path}"),
+        stdout=sys.stderr,
+        check=True,
+    )
+    # Gabungkan WAL ke file utama supaya fixture cukup disalin satu file
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    return path
+
+
+def sample_products(db_path: str, size: int):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT code, name, price FROM products WHERE stock > 0 ORDER BY random() LIMIT ?", (size,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str, port: int, workdir: str):
+    env = dict(os.environ, POS_DB_URL=f"sqlite:///{db_path}", POS_JOB_DIR=os.path.join(workdir, "jobs"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Server berhenti saat start")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server tidak merespons dalam batas waktu")
+
+
+def login_client(port: int) -> Client:
+    # Login dilakukan sebelum pengukuran: bcrypt sengaja berprioritas CPU
+    # rendah dan bisa sangat lambat saat server sudah sibuk
+    client = Client("127.0.0.1", port)
+    client.login("admin", "admin123")
+    return client
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    fixture = ensure_fixture(args)
+    workdir = tempfile.mkdtemp(prefix="pos-bench-")
+    try:
+        # Setiap run memakai salinan baru: checkout dari run sebelumnya tidak menumpuk
+        db_path = os.path.join(workdir, "bench.db")
+        shutil.copyfile(fixture, db_path)
+        products = sample_products(db_path, PRODUCT_SAMPLE_SIZE)
+        port = args.port or free_port()
+        server = start_server(db_path, port, workdir)
+        try:
+            recorder = Recorder()
+            stop = threading.Event()
+            threads = [threading.Thread(target=lane_worker, args=(login_client(port), recorder, products, stop, i))
+                       for i in range(args.lanes)]
+            threads += [threading.Thread(target=manager_worker, args=(login_client(port), recorder, stop))
+                        for _ in range(args.managers)]
+            threads += [threading.Thread(target=exporter_worker, args=(login_client(port), recorder, stop))
+                        for _ in range(args.exporters)]
+            if args.importers:
+                content = import_file(args.import_rows)
+                threads += [threading.Thread(target=importer_worker, args=(login_client(port), recorder, stop, content))
+                            for _ in range(args.importers)]
+            for t in threads:
+                t.daemon = True
+                t.start()
+            if args.warmup:
+                time.sleep(args.warmup)
+                recorder.reset()
+            started = time.time()
+            time.sleep(args.duration)
+            stop.set()
+            duration = time.time() - started
+            for t in threads:
+                t.join(timeout=120)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = summarize(recorder, duration)
+    result["meta"] = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "duration_s": round(duration, 2),
+        "lanes": args.lanes,
+        "managers": args.managers,
+        "exporters": args.exporters,
+        "importers": args.importers,
+        "import_rows": args.import_rows,
+        "fixture": {"products": args.products, "transactions": args.transactions, "years": args.years},
+    }
+    return result
+
+
+def compare(current: dict, baseline: dict):
+    """Ringkasan perubahan p95 dan throughput per route terhadap hasil sebelumnya"""
+    print(f"{'route':48} {'p95 lama':>10} {'p95 baru':>10} {'delta':>8} {'rps lama':>9} {'rps baru':>9}", file=sys.stderr)
+    for route, cur in current["routes"].items():
+        old = baseline.get("routes", {}).get(route)
+        if not old:
+            print(f"{route:48} {'-':>10} {cur['p95_ms']:>10} {'baru':>8}", file=sys.stderr)
+            continue
+        delta = (cur["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0
+        print(f"{route:48} {old['p95_ms']:>10} {cur['p95_ms']:>10} {delta:>+7.1f}% "
+              f"{old['throughput_rps']:>9} {cur['throughput_rps']:>9}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTTP campuran checkout/kasir/laporan/export")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=200000)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--regenerate", action="store_true", help="buat ulang database fixture")
+    parser.add_argument("--duration", type=float, default=30, help="detik pengukuran")
+    parser.add_argument("--warmup", type=float, default=3, help="detik pemanasan (tidak dihitung)")
+    parser.add_argument("--lanes", type=int, default=8, help="jumlah lane kasir bersamaan")
+    parser.add_argument("--managers", type=int, default=2, help="jumlah klien dashboard laporan")
+    parser.add_argument("--exporters", type=int, default=1, help="jumlah export Excel bersamaan")
+    parser.add_argument("--importers", type=int, default=0, help="jumlah klien import produk (job background)")
+    parser.add_argument("--import-rows", type=int, default=20000, help="jumlah baris file import produk")
+    parser.add_argument("--port", type=int, default=0, help="port server (default: port bebas)")
+    parser.add_argument("--output", help="tulis hasil JSON ke file (default: stdout)")
+    parser.add_argument("--compare", help="hasil JSON sebelumnya untuk dibandingkan")
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import Product, CatalogTombstone
+from events import publish_after_commit
+
+# Versi katalog naik setiap ada perubahan produk (tambah, update, hapus,
+# checkout, import Excel). Terminal kasir menyimpan versi terakhir yang
+# diterima lalu cukup menarik delta lewat /api/catalog/changes?since=N.
+CATALOG_VERSION = "catalog_version"
+# Versi saat katalog dikosongkan/diganti; terminal dengan versi lebih lama wajib full sync
+CATALOG_RESET = "catalog_reset"
+
+CATALOG_COLUMNS = ["id", "code", "name", "price", "stock", "status", "version"]
+
+# Perubahan produk dikirim ke layar kasir lewat SSE (event "products").
+# Lebih dari batas ini (mis. import Excel) cukup dikirim full=True agar
+# klien mengulang pencariannya sendiri.
+PRODUCT_EVENT_MAX_ITEMS = 200
+
+
+def get_counter(db: Session, name: str) -> int:
+    value = db.execute(text("SELECT value FROM counters WHERE name = :name"), {"name": name}).scalar()
+    return value or 0
+
+
+def next_counter(db: Session, name: str) -> int:
+    """Naikkan counter secara atomik di dalam transaksi yang sedang berjalan"""
+    return next_counters(db, name)[name]
+
+
+def next_counters(db: Session, *names: str) -> dict:
+    """Naikkan beberapa counter sekaligus dengan satu statement. Return {name: nilai baru}."""
+    params = {f"n{i}": name for i, name in enumerate(names)}
+    values = ", ".join(f"(:{key}, 1)" for key in params)
+    rows = db.execute(
+        text(f"INSERT INTO counters (name, value) VALUES {values} "
+             "ON CONFLICT(name) DO UPDATE SET value = value + 1 RETURNING name, value"),
+        params,
+    ).all()
+    return dict(rows)
+
+
+def jump_counter(db: Session, name: str) -> int:
+    """Naikkan counter ke max(value + 1, waktu sekarang dalam ms).
+
+    Dipakai saat database dikosongkan/diganti: database hasil import bisa
+    membawa counter yang kebetulan sama dengan versi yang sudah di-cache
+    worker lain, jadi +1 saja tidak cukup.
+    """
+    return db.execute(
+        text("INSERT INTO counters (name, value) VALUES (:name, :value) "
+             "ON CONFLICT(name) DO UPDATE SET value = max(value + 1, excluded.value) RETURNING value"),
+        {"name": name, "value": int(time.time() * 1000)},
+    ).scalar_one()
+
+
+def bump_catalog_version(db: Session) -> int:
+    return next_counter(db, CATALOG_VERSION)
+
+
+def mark_products_changed(db: Session, products) -> int:
+    """Tandai produk (ORM object) sebagai berubah pada versi katalog baru"""
+    version = bump_catalog_version(db)
+    for p in products:
+        p.version = version
+    publish_product_changes(db, version, [
+        {"code": p.code, "name": p.name, "price": p.price, "stock": p.stock, "status": p.status}
+        for p in products
+    ])
+    return version
+
+
+def record_product_deleted(db: Session, product: Product) -> int:
+    version = bump_catalog_version(db)
+    db.add(CatalogTombstone(product_id=product.id, code=product.code, version=version))
+    publish_product_changes(db, version, [], deleted=[product.code])
+    return version
+
+
+def publish_product_changes(db: Session, version: int, products, deleted=()):
+    """Kirim event "products" ke klien SSE setelah transaksi di-commit.
+
+    `products` berisi dict dengan minimal key "code"; field lain (stock,
+    price, name, status) opsional dan hanya yang dikirim yang diperbarui klien.
+    """
+    if len(products) + len(deleted) > PRODUCT_EVENT_MAX_ITEMS:
+        publish_after_commit(db, "products", {"version": version, "full": True})
+    else:
+        publish_after_commit(db, "products", {"version": version, "products": products, "deleted": list(deleted)})
+
+
+def reset_catalog(db: Session) -> int:
+    """Dipanggil saat seluruh katalog dihapus/diganti: semua terminal harus full sync"""
+    version = bump_catalog_version(db)
+    db.execute(
+        text("INSERT INTO counters (name, value) VALUES (:name, :value) "
+             "ON CONFLICT(name) DO UPDATE SET value = excluded.value"),
+        {"name": CATALOG_RESET, "value": version},
+    )
+    db.query(CatalogTombstone).delete()
+    publish_after_commit(db, "products", {"version": version, "full": True})
+    return version
+
+
+def get_catalog_changes(db: Session, since: int = 0) -> dict:
+    """Ambil produk yang berubah sejak versi `since` beserta tombstone produk yang dihapus.
+
+    Jika `since` lebih lama dari reset terakhir (atau lebih baru dari versi
+    server, misalnya setelah import database) dikirim snapshot penuh.
+    """
+    version = get_counter(db, CATALOG_VERSION)
+    reset = get_counter(db, CATALOG_RESET)
+    full = since <= 0 or since < reset or since > version
+
+    q = db.query(Product.id, Product.code, Product.name, Product.price, Product.stock, Product.status, Product.version)
+    deleted = []
+    if full:
+        rows = q.order_by(Product.id).all()
+    else:
+        rows = q.filter(Product.version > since).order_by(Product.version, Product.id).all()
+        deleted = [
+            t.code for t in
+            db.query(CatalogTombstone.code).filter(CatalogTombstone.version > since).order_by(CatalogTombstone.version)
+        ]
+
+    return {
+        "version": version,
+        "full": full,
+        "columns": CATALOG_COLUMNS,
+        "products": [list(r) for r in rows],
+        "deleted": deleted,
+    }
@@ -0,0 +1,249 @@
+import argparse
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+# Cek query budget semua route (lihat metrics.query_budget). Aplikasi
+# dijalankan lewat TestClient di atas database fixture sementara (seed.py,
+# ratusan transaksi), setiap skenario request dijalankan dengan cache
+# in-process kosong (checkout: dengan cache hangat), lalu jumlah statement SQL
+# yang dikeluarkan request itu dibandingkan dengan budget route-nya. Checkout dan import dijalankan dengan
+# ukuran keranjang/file berbeda, jadi query per item (N+1) langsung ketahuan.
+#
+#   python check_query_budgets.py            # exit 1 jika ada pelanggaran
+#   python check_query_budgets.py --verbose  # tampilkan SQL route yang melanggar
+#
+# Route tanpa budget hanya dilaporkan; route ber-budget tanpa skenario dianggap gagal.
+
+BIG_BASKET = 20
+IMPORT_ROWS = 100
+
+
+def build_fixture(workdir: str, products: int, transactions: int):
+    # Env harus di-set sebelum modul aplikasi (db.py) di-import
+    os.environ.update(
+        POS_DB_URL=f"sqlite:///{os.path.join(workdir, 'budget.db')}",
+        POS_JOB_DIR=os.path.join(workdir, "jobs"),
+        POS_PROFILE_DIR=os.path.join(workdir, "profiles"),
+        POS_SLOW_QUERY_MS="0",
+    )
+    import seed
+    with redirect_stdout(sys.stderr):
+        seed.generate(products, transactions, 1, seed_value=42)
+
+
+def _excel(rows, columns) -> bytes:
+    import pandas as pd
+    buf = io.BytesIO()
+    pd.DataFrame(rows, columns=columns).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def _cart(products, size: int) -> str:
+    return json.dumps([{"code": code, "name": name, "price": price, "qty": 1} for code, name, price in products[:size]])
+
+
+def scenarios(db_path: str, values: dict):
+    """(method, route, deskripsi, kwargs request) untuk setiap route yang diuji.
+
+    Generator ini dibaca satu per satu, jadi skenario bisa memakai `values`
+    yang diisi dari respons skenario sebelumnya (id struk, token, job).
+    """
+    from importers import PRODUCT_IMPORT_COLUMNS, STOCK_IMPORT_COLUMNS
+
+    conn = sqlite3.connect(db_path)
+    products = conn.execute("SELECT code, name, price FROM products WHERE stock > 100 ORDER BY id LIMIT ?", (IMPORT_ROWS,)).fetchall()
+    product_id = conn.execute("SELECT id FROM products ORDER BY id LIMIT 1").fetchone()[0]
+    conn.close()
+
+    def checkout(size):
+        # Diukur dengan cache hangat (identitas, settings, nomor urut hari ini), seperti kasir yang sedang berjalan
+        return {"warm": True,
+                "data": {"payment_method": "cash", "paid": "999999999", "cart_json": _cart(products, size), "terminal": "Q1"}}
+
+    def upload(rows, columns, name="data.xlsx"):
+        return {"files": {"file": (name, _excel(rows, columns))}}
+
+    new_products = [[f"BUDGET{i:04d}", f"Produk Budget {i}", 1000, 1500, 10] for i in range(IMPORT_ROWS)]
+    stock_rows = [[code, 1000, 1500, 500] for code, _, _ in products]
+
+    yield "POST", "/login", "admin", {"data": {"username": "admin", "password": "admin123"}}
+    yield "GET", "/", "", {}
+    yield "GET", "/login", "", {}
+    yield "GET", "/cashier", "", {}
+    for size in (1, BIG_BASKET):
+        yield "POST", "/checkout", f"{size} item hangat", checkout(size)
+        yield "POST", "/api/checkout", f"{size} item hangat", checkout(size)
+    yield "GET", "/receipt/{trx_id}", "", {"url": f"/receipt/{values['last_trx']}"}
+    yield "GET", "/api/products/search", "", {"params": {"q": products[0][1].split()[0]}}
+    yield "GET", "/api/catalog/changes", "full sync", {"params": {"since": 0}}
+    yield "GET", "/products", "", {}
+    for mode in ("daily", "yearly"):
+        yield "GET", "/reports", mode, {"params": {"mode": mode}}
+        for endpoint in ("transactions", "summary", "top_products", "problem_products", "stock", "dashboard"):
+            yield "GET", f"/api/reports/{endpoint}", mode, {"params": {"mode": mode}}
+        yield "GET", "/api/reports/export_excel", mode, {"params": {"mode": mode}}
+    yield "GET", "/api/reports/sales_trend", "", {}
+    yield "POST", "/products/add", "", {"data": {"code": "BUDGET-NEW", "name": "Produk Baru", "cost_price": 1000, "price": 1500, "stock": 5}}
+    yield "POST", "/products/update", "", {"data": {"pid": product_id, "name": "Produk Ubah", "cost_price": 1000, "price": 1600, "stock_add": 5, "stock": 0}}
+    yield "POST", "/products/update_name", "", {"data": {"pid": product_id, "name": "Produk Ubah Nama"}}
+    yield "GET", "/products/export_stock_template", "", {}
+    yield "POST", "/api/jobs/import_products", "", upload(new_products, PRODUCT_IMPORT_COLUMNS)
+    yield "POST", "/api/jobs/import_stock_update", "", upload(stock_rows, STOCK_IMPORT_COLUMNS)
+    yield "POST", "/api/jobs/preview_stock_update", "", upload(
+        [[code, 1000, 1500, 400] for code, _, _ in products], STOCK_IMPORT_COLUMNS)
+    # Token apply = id job preview (job dijalankan berurutan, jadi import di atas sudah selesai)
+    _wait_for_job(values["client"], values["preview_token"])
+    yield "POST", "/products/import_stock_update/apply", f"{IMPORT_ROWS} baris", {"data": {"token": values["preview_token"]}}
+    yield "POST", "/api/jobs/export_report", "", {"params": {"mode": "daily"}}
+    _wait_for_job(values["client"], values["job_id"])
+    yield "GET", "/api/jobs/{job_id}", "", {"url": f"/api/jobs/{values['job_id']}"}
+    yield "GET", "/api/jobs/{job_id}/download", "", {"url": f"/api/jobs/{values['job_id']}/download"}
+    yield "GET", "/settings", "", {}
+    yield "POST", "/settings", "", {"data": {"store_name": "Toko Budget", "store_address": "Jl. Uji", "store_phone": "1", "timezone": "WIB"}}
+    yield "POST", "/settings/update_display_name", "", {"data": {"new_display_name": "Admin Budget"}}
+    # Sekalian merekam satu profil untuk skenario download di bawah
+    yield "GET", "/settings/slow-queries", "", {"params": {"_profile": 1}}
+    yield "GET", "/settings/profiles/{name}", "", {"url": f"/settings/profiles/{values['profile']}"}
+    yield "GET", "/metrics", "", {}
+    yield "GET", "/healthz", "", {}
+    yield "POST", "/products/delete", "", {"data": {"pid": product_id}}
+    yield "GET", "/settings/export_db", "", {}
+    yield "POST", "/settings/import_db", "", {"files": {"file": ("backup.db", values["backup"])}}
+    yield "POST", "/settings/clear_database", "", {}
+    yield "GET", "/logout", "", {}
+
+
+def clear_caches():
+    from report_cache import clear_report_cache
+    from identity import clear_identity_cache
+    from settings_cache import invalidate_settings_cache
+    clear_report_cache()
+    clear_identity_cache()
+    invalidate_settings_cache()
+
+
+def run(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="pos-budget-")
+    try:
+        build_fixture(workdir, args.products, args.transactions)
+        return check(os.path.join(workdir, "budget.db"), args.verbose)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check(db_path: str, verbose: bool) -> int:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    with redirect_stdout(sys.stderr):
+        import app as pos_app
+    from db import engine, async_engine
+    from metrics import current_request_stats
+
+    # Hanya statement di dalam request yang dihitung (job background tidak)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if current_request_stats() is not None:
+            statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", count)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", count)
+
+    budgets = {}
+    for route in pos_app.app.routes:
+        # Hanya route aplikasi (bukan /docs, /openapi.json bawaan FastAPI)
+        if getattr(getattr(route, "endpoint", None), "__module__", None) != "app":
+            continue
+        for method in route.methods:
+            if method != "HEAD":
+                budgets[(method, route.path)] = getattr(route.endpoint, "query_budget", None)
+
+    used = {}  # (method, route) -> [(deskripsi, jumlah, statements)]
+    failures = []
+    with TestClient(pos_app.app) as client:
+        values = {"client": client}
+        for method, route, label, spec in scenarios(db_path, values):
+            spec = dict(spec)
+            url = spec.pop("url", route)
+            if spec.pop("warm", False):
+                # Request yang sama sekali dulu (tidak dihitung) untuk mengisi cache
+                client.request(method, url, follow_redirects=False, **spec)
+            else:
+                clear_caches()
+            statements.clear()
+            resp = client.request(method, url, follow_redirects=False, **spec)
+            if resp.status_code >= 400:
+                failures.append(f"{method} {route} ({label or 'default'}): status {resp.status_code} {resp.text[:200]}")
+                continue
+            used.setdefault((method, route), []).append((label, len(statements), list(statements)))
+            _remember(values, route, resp)
+
+    width = max(len(f"{m} {r}") for m, r in budgets)
+    print(f"{'route':{width}}  {'budget':>6}  {'dipakai':>7}  skenario")
+    for (method, route), budget in sorted(budgets.items(), key=lambda kv: kv[0][1]):
+        runs = used.get((method, route))
+        name = f"{method} {route}"
+        if runs is None:
+            if budget is not None:
+                failures.append(f"{name}: punya budget {budget} tapi tidak ada skenario")
+            print(f"{name:{width}}  {budget if budget is not None else '-':>6}  {'-':>7}  (tidak diuji)")
+            continue
+        worst = max(n for _, n, _ in runs)
+        detail = ", ".join(f"{label or 'default'}={n}" for label, n, _ in runs)
+        print(f"{name:{width}}  {budget if budget is not None else '-':>6}  {worst:>7}  {detail}")
+        if budget is None:
+            continue
+        for label, n, sqls in runs:
+            if n > budget:
+                failures.append(f"{name} ({label or 'default'}): {n} statement > budget {budget}")
+                if verbose:
+                    failures.extend("    " + " ".join(sql.split())[:160] for sql in sqls)
+
+    if failures:
+        print("\nGAGAL:")
+        for line in failures:
+            print("  " + line)
+        return 1
+    print("\nSemua route dalam budget.")
+    return 0
+
+
+def _remember(values: dict, route: str, resp):
+    # Nilai yang dibutuhkan skenario berikutnya
+    if route == "/checkout":
+        values["last_trx"] = resp.headers["location"].rsplit("/", 1)[-1]
+    elif route == "/api/jobs/preview_stock_update":
+        values["preview_token"] = resp.json()["job_id"]
+    elif route == "/api/jobs/export_report":
+        values["job_id"] = resp.json()["job_id"]
+    elif route == "/settings/slow-queries":
+        values["profile"] = resp.headers.get("x-pos-profile-file")
+    elif route == "/settings/export_db":
+        values["backup"] = resp.content
+
+
+def _wait_for_job(client, job_id: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.get(f"/api/jobs/{job_id}").json().get("status") in ("done", "failed"):
+            return
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cek jumlah statement SQL per route terhadap query_budget")
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--verbose", action="store_true", help="tampilkan SQL route yang melanggar budget")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
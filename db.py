@@ -1,8 +1,78 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-DB_URL = "sqlite:///./pos.db"
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+from metrics import TimedQueuePool, TimedAsyncQueuePool, instrument_engine
+from slow_query import install_slow_query_log
+from search import probe_product_search_index
+
+DB_URL = os.getenv("POS_DB_URL", "sqlite:///./pos.db")
+
+# Profil engine SQLite, dipilih lewat env POS_DB_PROFILE (default: production).
+# - production: WAL (laporan tidak memblokir checkout), synchronous=NORMAL
+#   (aman dari korupsi, paling banyak kehilangan commit terakhir saat listrik mati)
+# - safe: WAL + synchronous=FULL untuk hardware yang sering mati mendadak
+# - legacy: perilaku lama (rollback journal, tanpa PRAGMA tambahan)
+DB_PROFILES = {
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,        # ms, tunggu lock alih-alih langsung "database is locked"
+        "cache_size": -65536,        # 64 MB page cache per koneksi
+        "mmap_size": 268435456,      # 256 MB memory-mapped I/O
+        "temp_store": "MEMORY",
+    },
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 10000,
+        "cache_size": -16384,
+        "temp_store": "MEMORY",
+    },
+    "legacy": {},
+}
+
+DB_PROFILE = os.getenv("POS_DB_PROFILE", "production")
+if DB_PROFILE not in DB_PROFILES:
+    raise ValueError(f"POS_DB_PROFILE tidak dikenal: {DB_PROFILE} (pilihan: {', '.join(DB_PROFILES)})")
+
+# Pool default disesuaikan dengan threadpool Starlette (40 thread):
+# 10 koneksi tetap + 30 overflow, sehingga tiap worker thread bisa dapat koneksi.
+POOL_SIZE = int(os.getenv("POS_DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("POS_DB_MAX_OVERFLOW", "30"))
+POOL_TIMEOUT = int(os.getenv("POS_DB_POOL_TIMEOUT", "30"))
+
+engine = create_engine(
+    DB_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=TimedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+)
+
+# Lokasi file database (untuk backup/restore dari halaman pengaturan)
+DB_PATH = os.path.abspath(engine.url.database) if engine.url.database else None
+
+def apply_sqlite_pragmas(dbapi_connection, profile=DB_PROFILE):
+    pragmas = DB_PROFILES[profile]
+    if not pragmas:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    apply_sqlite_pragmas(dbapi_connection)
+    probe_product_search_index(dbapi_connection, connection_record)
+
+instrument_engine(engine, "main")
+install_slow_query_log(engine, "main", DB_PATH)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -13,3 +83,35 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Engine async (aiosqlite) untuk route `async def` yang paling sering dipanggil
+# (checkout, pencarian, laporan). Route async tidak memakai threadpool Starlette,
+# jadi jumlah query bersamaan dibatasi oleh pool ini: request yang tidak
+# kebagian koneksi menunggu (maks POOL_TIMEOUT detik) di event loop.
+# Default URL diturunkan dari POS_DB_URL sehingga kedua engine memakai file yang sama.
+ASYNC_DB_URL = os.getenv("POS_ASYNC_DB_URL", engine.url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False))
+ASYNC_POOL_SIZE = int(os.getenv("POS_ASYNC_DB_POOL_SIZE", str(POOL_SIZE)))
+
+async_engine = create_async_engine(
+    ASYNC_DB_URL,
+    poolclass=TimedAsyncQueuePool,
+    pool_size=ASYNC_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=POOL_TIMEOUT,
+)
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _on_async_connect(dbapi_connection, connection_record):
+    apply_sqlite_pragmas(dbapi_connection)
+    probe_product_search_index(dbapi_connection, connection_record)
+
+instrument_engine(async_engine.sync_engine, "async")
+install_slow_query_log(
+    async_engine.sync_engine, "async", os.path.abspath(async_engine.url.database) if async_engine.url.database else None
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Broker Server-Sent Events in-process. Setiap tab kasir membuka satu koneksi
+# /api/events yang menerima perubahan pengaturan (zona waktu) dan stok produk,
+# sebagai ganti polling jam ke server setiap detik.
+#
+# Catatan: broker hanya menjangkau klien yang terhubung ke proses worker yang
+# sama. Dengan beberapa worker uvicorn, event dari worker lain tidak terkirim
+# (klien tetap benar setelah reconnect/refresh).
+
+SSE_KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._recorded = None
+
+    def subscribe(self):
+        sub = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, name: str, data: dict):
+        """Kirim event ke semua subscriber. Aman dipanggil dari thread mana pun."""
+        message = format_sse(name, data)
+        with self._lock:
+            if self._recorded is not None:
+                self._recorded.append((name, data))
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put_nowait, queue, message)
+            except RuntimeError:
+                # Event loop subscriber sudah ditutup
+                self.unsubscribe((loop, queue))
+
+    def start_recording(self) -> list:
+        """Di proses worker job (tanpa subscriber): simpan event untuk diteruskan ke proses web"""
+        with self._lock:
+            self._recorded = []
+            return self._recorded
+
+    def stop_recording(self):
+        with self._lock:
+            self._recorded = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def _put_nowait(queue: asyncio.Queue, message: str):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # Klien terlalu lambat, event dibuang (klien akan sinkron lagi saat reconnect)
+        pass
+
+
+def format_sse(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+broker = EventBroker()
+
+
+async def event_stream(request, sub, first_message: str):
+    """Generator untuk StreamingResponse: kirim event + keepalive sampai klien putus"""
+    try:
+        yield first_message
+        loop, queue = sub
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                message = ": keepalive\n\n"
+            yield message
+    finally:
+        broker.unsubscribe(sub)
+
+
+def publish_after_commit(db: Session, name: str, data: dict):
+    """Antrikan event yang baru dikirim setelah transaksi db berhasil di-commit"""
+    if not db.in_transaction():
+        # Event terikat ke transaksi: tanpa ini rollback/close tidak membuangnya
+        db.begin()
+    db.info.setdefault("pending_events", []).append((name, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_events(session):
+    for name, data in session.info.pop("pending_events", []):
+        broker.publish(name, data)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending_events(session, transaction):
+    # Transaksi utama selesai tanpa commit (rollback, atau close() yang tidak
+    # memicu after_rollback): event yang tersisa dibuang
+    if transaction.parent is None:
+        session.info.pop("pending_events", None)
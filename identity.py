@@ -0,0 +1,150 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from catalog import get_counter, next_counter, jump_counter
+from db import SessionLocal, get_async_db
+from models import User
+
+# Cache identitas user (username, display_name, role) per proses, dipakai
+# semua route lewat dependency get_identity (route async: get_identity_async).
+# Halaman umum seperti struk tidak perlu query tabel users sama sekali.
+#
+# Validitas dijaga counter "user_identity" di tabel counters yang dinaikkan
+# setiap display_name, role atau password berubah. Counter hanya dicek
+# paling sering sekali per IDENTITY_CHECK_INTERVAL detik, sehingga worker
+# uvicorn lain ikut melihat perubahan paling lambat setelah selang itu.
+IDENTITY_VERSION = "user_identity"
+IDENTITY_CHECK_INTERVAL = 5  # detik
+
+_lock = threading.Lock()
+_cache = {}  # username -> snapshot identitas
+_state = {"version": None, "checked_at": None}
+stats = {"hits": 0, "misses": 0}
+
+
+def _snapshot(row: User):
+    return SimpleNamespace(
+        id=row.id,
+        username=row.username,
+        display_name=row.display_name or row.username,
+        role=row.role,
+    )
+
+
+def session_user(identity) -> dict:
+    """Bentuk identitas yang disimpan di cookie session"""
+    return {"username": identity.username, "display_name": identity.display_name, "role": identity.role}
+
+
+def bump_identity_version(db: Session) -> int:
+    """Tandai data user berubah (di dalam transaksi yang sedang berjalan)"""
+    return next_counter(db, IDENTITY_VERSION)
+
+
+def reset_identity_version(db: Session) -> int:
+    """Dipakai saat database diganti: tabel users bisa berbeda seluruhnya"""
+    version = jump_counter(db, IDENTITY_VERSION)
+    clear_identity_cache()
+    return version
+
+
+def invalidate_identity(username: str):
+    """Buang satu user dari cache proses ini (panggil setelah commit)"""
+    with _lock:
+        _cache.pop(username, None)
+
+
+def clear_identity_cache():
+    with _lock:
+        _cache.clear()
+        _state["checked_at"] = None
+
+
+def _version_checked() -> bool:
+    checked_at = _state["checked_at"]
+    return checked_at is not None and time.monotonic() - checked_at < IDENTITY_CHECK_INTERVAL
+
+
+def load_identity(db: Session, username: str):
+    """Identitas dari cache, atau dari database jika belum ada / versi berubah.
+
+    User lama tanpa display_name diisi username-nya sekali di sini.
+    """
+    if not _version_checked():
+        version = get_counter(db, IDENTITY_VERSION)
+        with _lock:
+            if version != _state["version"]:
+                _cache.clear()
+                _state["version"] = version
+            _state["checked_at"] = time.monotonic()
+
+    identity = _cache.get(username)
+    if identity is not None:
+        stats["hits"] += 1
+        return identity
+
+    stats["misses"] += 1
+    row = db.query(User).filter(User.username == username).first()
+    if row is None:
+        return None
+    if row.display_name is None:
+        row.display_name = row.username
+        db.commit()
+    identity = _snapshot(row)
+    with _lock:
+        _cache[username] = identity
+    return identity
+
+
+def _cached(username: str):
+    identity = _cache.get(username) if _version_checked() else None
+    if identity is not None:
+        stats["hits"] += 1
+    return identity
+
+
+def _resolve(request: Request, identity):
+    if identity is None:
+        request.session.clear()
+        return None
+    current = session_user(identity)
+    if request.session["user"] != current:
+        request.session["user"] = current
+    return identity
+
+
+def get_identity(request: Request):
+    """Dependency: identitas user yang login, None jika belum login.
+
+    Session dengan user yang sudah tidak ada di database dikosongkan
+    (require_login lalu mengarahkan ke /login). Cookie session ikut
+    diperbarui jika display_name/role berubah sejak login.
+    """
+    user = request.session.get("user")
+    if not user:
+        return None
+    identity = _cached(user["username"])
+    if identity is None:
+        db = SessionLocal()
+        try:
+            identity = load_identity(db, user["username"])
+        finally:
+            db.close()
+    return _resolve(request, identity)
+
+
+async def get_identity_async(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """get_identity untuk route async: cache miss dibaca lewat session aiosqlite
+    milik request (dependency yang sama dengan route), bukan SessionLocal di threadpool"""
+    user = request.session.get("user")
+    if not user:
+        return None
+    identity = _cached(user["username"])
+    if identity is None:
+        identity = await db.run_sync(load_identity, user["username"])
+    return _resolve(request, identity)
@@ -0,0 +1,290 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.orm import Session
+
+from models import Product, StockUpdate
+from catalog import bump_catalog_version, publish_product_changes
+from report_cache import bump_report_version
+
+# Import Excel produk dan update stok. Dipakai oleh endpoint lama
+# (/products/import_excel, /products/import_stock_update) maupun job
+# background, jadi tidak bergantung pada Request.
+
+PRODUCT_IMPORT_COLUMNS = ['kode_produk', 'nama_produk', 'harga_asli', 'harga_jual', 'stok']
+STOCK_IMPORT_COLUMNS = ['kode_produk', 'harga_asli', 'harga_jual', 'stok_baru']
+# Jumlah kode per query IN (batas parameter SQLite versi lama = 999)
+LOOKUP_CHUNK_SIZE = 500
+
+
+class ImportFileError(ValueError):
+    """File tidak bisa dibaca atau kolom wajib tidak lengkap"""
+
+
+def check_excel_filename(filename: str):
+    if not (filename or "").endswith(('.xlsx', '.xls')):
+        raise ImportFileError("Hanya file Excel (.xlsx, .xls) yang diizinkan!")
+
+
+def read_import_file(file, required_columns) -> pd.DataFrame:
+    try:
+        df = pd.read_excel(file, engine='openpyxl')
+    except Exception as e:
+        raise ImportFileError(f"Gagal membaca file Excel: {e}")
+    if not all(col in df.columns for col in required_columns):
+        raise ImportFileError(f"File Excel harus memiliki kolom: {', '.join(required_columns)}")
+    return df
+
+
+def _numeric(series: pd.Series) -> pd.Series:
+    """Kolom angka (float); sel yang bukan angka menjadi NaN"""
+    return pd.to_numeric(series, errors="coerce").astype(float)
+
+
+def _lookup_existing_codes(db: Session, codes) -> set:
+    existing = set()
+    for i in range(0, len(codes), LOOKUP_CHUNK_SIZE):
+        chunk = codes[i:i + LOOKUP_CHUNK_SIZE]
+        existing.update(c for (c,) in db.query(Product.code).filter(Product.code.in_(chunk)))
+    return existing
+
+
+def import_products(db: Session, df: pd.DataFrame, progress=None):
+    """Tambah/update produk dari DataFrame. Return (ok, content) untuk JSONResponse/hasil job.
+
+    Validasi dilakukan per kolom (tanpa iterrows), kode yang sudah ada dicari
+    dengan query IN per chunk, lalu insert dan update dijalankan sebagai
+    executemany dalam satu transaksi dengan satu kenaikan versi katalog.
+    Jika satu kode muncul beberapa kali, baris terakhir yang dipakai; seperti
+    versi per baris, kemunculan berikutnya terhitung "diperbarui". Harga kosong
+    (NaN) ditolak per baris, dulu lolos lalu gagal NOT NULL saat commit.
+    """
+    code = df['kode_produk'].map(str).str.strip()
+    name = df['nama_produk'].map(str).str.strip()
+    cost_price = _numeric(df['harga_asli'])
+    price = _numeric(df['harga_jual'])
+    stock = _numeric(df['stok'])
+
+    # Urutan pengecekan sama dengan versi per baris: angka tidak valid dulu, baru data tidak lengkap
+    bad_number = ~(np.isfinite(cost_price) & np.isfinite(price) & np.isfinite(stock))
+    bad_data = ~bad_number & ((code == "") | (name == "") | (cost_price < 0) | (price < 0) | (stock < 0))
+    errors = [
+        f"Baris {index + 2}: Harga atau stok tidak valid untuk produk {code[index]}."
+        if bad_number[index] else
+        f"Baris {index + 2}: Data produk tidak lengkap atau tidak valid (kode, nama, harga_asli, harga_jual, stok)."
+        for index in df.index[bad_number | bad_data]
+    ]
+    if progress:
+        progress(30)
+
+    valid = ~(bad_number | bad_data)
+    rows = pd.DataFrame({
+        "code": code[valid],
+        "name": name[valid],
+        "cost_price": cost_price[valid].astype(float),
+        "price": price[valid].astype(float),
+        "stock": stock[valid].astype("int64"),  # int() memotong desimal
+    })
+    last_rows = rows.drop_duplicates("code", keep="last")
+
+    existing = _lookup_existing_codes(db, last_rows["code"].tolist())
+    if progress:
+        progress(50)
+
+    is_existing = last_rows["code"].isin(existing)
+    products_added = int((~is_existing).sum())
+    products_updated = len(rows) - products_added
+
+    if len(last_rows):
+        version = bump_catalog_version(db)
+        records = last_rows.assign(version=version).to_dict("records")
+        inserts = [dict(r, status="active") for r, e in zip(records, is_existing) if not e]
+        updates = [{"b_" + k: v for k, v in r.items()} for r, e in zip(records, is_existing) if e]
+        if inserts:
+            db.execute(Product.__table__.insert(), inserts)
+        if updates:
+            db.execute(
+                update(Product.__table__)
+                .where(Product.__table__.c.code == bindparam("b_code"))
+                .values(
+                    name=bindparam("b_name"),
+                    cost_price=bindparam("b_cost_price"),
+                    price=bindparam("b_price"),
+                    stock=bindparam("b_stock"),
+                    version=bindparam("b_version"),
+                ),
+                updates,
+            )
+        publish_product_changes(db, version, [
+            {"code": r["code"], "name": r["name"], "price": r["price"], "stock": r["stock"]} for r in records
+        ])
+        bump_report_version(db)
+    db.commit()
+
+    message = f"Berhasil mengimpor {products_added} produk baru dan memperbarui {products_updated} produk."
+    if errors:
+        return False, {
+            "message": message + " Namun, ada beberapa kesalahan:",
+            "detail": "Beberapa produk gagal diimpor:\n" + "\n".join(errors),
+        }
+    return True, {"message": message}
+
+
+STOCK_PREVIEW_COLUMNS = ["row", "product_id", "code", "product_name", "old_stock", "new_stock", "stock_added",
+                         "old_cost_price", "cost_price", "old_price", "price", "total_pengeluaran"]
+
+
+class StockImportConflict(Exception):
+    """Stok produk berubah (mis. ada penjualan) antara preview dan apply"""
+
+
+def _lookup_products(db: Session, codes) -> pd.DataFrame:
+    """Produk untuk kode-kode di sheet. File berisi banyak kode (mis. seluruh katalog)
+    lebih cepat dibaca dengan satu scan tabel daripada ratusan query IN."""
+    columns = [Product.id, Product.code, Product.name, Product.stock, Product.cost_price, Product.price]
+    if len(codes) > LOOKUP_CHUNK_SIZE * 4:
+        rows = db.execute(select(*columns)).all()
+    else:
+        rows = []
+        for i in range(0, len(codes), LOOKUP_CHUNK_SIZE):
+            chunk = codes[i:i + LOOKUP_CHUNK_SIZE]
+            rows.extend(db.execute(select(*columns).where(Product.code.in_(chunk))).all())
+    return pd.DataFrame(rows, columns=["product_id", "code", "product_name", "old_stock", "old_cost_price", "old_price"])
+
+
+def preview_stock_updates(db: Session, df: pd.DataFrame) -> dict:
+    """Fase 1 import update stok: bandingkan sheet dengan produk saat ini tanpa menulis apa pun.
+
+    Return dict berisi baris yang berubah (untuk apply), ringkasan dan daftar
+    error per baris (pesan sama dengan import lama). Jika satu kode muncul
+    beberapa kali, baris terakhir yang dipakai.
+    """
+    code = df['kode_produk'].map(str).str.strip()
+    cost_price = _numeric(df['harga_asli'])
+    price = _numeric(df['harga_jual'])
+    new_stock = _numeric(df['stok_baru'])
+
+    bad_number = ~(np.isfinite(cost_price) & np.isfinite(price) & np.isfinite(new_stock))
+    bad_data = ~bad_number & ((code == "") | (cost_price < 0) | (price < 0) | (new_stock < 0))
+    valid = ~(bad_number | bad_data)
+
+    sheet = pd.DataFrame({
+        "row": df.index + 2,
+        "code": code,
+        "cost_price": cost_price,
+        "price": price,
+        "new_stock": new_stock,
+    }).loc[valid].astype({"new_stock": "int64"})
+
+    products = _lookup_products(db, sheet["code"].drop_duplicates().tolist())
+    merged = sheet.merge(products, on="code", how="left")
+    unknown = merged[merged["product_id"].isna()]
+
+    row_errors = {}
+    for index in df.index[bad_number]:
+        row_errors[index + 2] = f"Baris {index + 2}: Data tidak valid untuk produk {code[index]}."
+    for index in df.index[bad_data]:
+        row_errors[index + 2] = f"Baris {index + 2}: Data produk tidak lengkap atau tidak valid."
+    for r in unknown.itertuples():
+        row_errors[r.row] = f"Baris {r.row}: Produk dengan kode {r.code} tidak ditemukan."
+    errors = [row_errors[row] for row in sorted(row_errors)]
+
+    found = merged[merged["product_id"].notna()].drop_duplicates("code", keep="last").copy()
+    found["product_id"] = found["product_id"].astype("int64")
+    found["old_stock"] = found["old_stock"].astype("int64")
+    found["stock_added"] = (found["new_stock"] - found["old_stock"]).clip(lower=0)
+    found["total_pengeluaran"] = found["cost_price"] * found["stock_added"]
+    changed = found[
+        (found["new_stock"] != found["old_stock"])
+        | (found["cost_price"] != found["old_cost_price"])
+        | (found["price"] != found["old_price"])
+    ]
+
+    return {
+        "products_matched": int(merged["product_id"].notna().sum()),
+        "rows_changed": len(changed),
+        "stock_added": int(changed["stock_added"].sum()),
+        "total_pengeluaran": float(changed["total_pengeluaran"].sum()),
+        "unknown_codes": unknown["code"].drop_duplicates().tolist(),
+        "errors": errors,
+        # Disimpan per kolom (jauh lebih cepat dari list of dict untuk file besar)
+        "changes": {col: changed[col].tolist() for col in STOCK_PREVIEW_COLUMNS},
+    }
+
+
+def preview_rows(preview: dict, limit: int = None) -> list:
+    """Baris perubahan hasil preview sebagai list of dict"""
+    changes = preview["changes"]
+    count = preview["rows_changed"] if limit is None else min(limit, preview["rows_changed"])
+    return [{col: changes[col][i] for col in STOCK_PREVIEW_COLUMNS} for i in range(count)]
+
+
+def apply_stock_updates(db: Session, preview: dict, updated_by: str = "System"):
+    """Fase 2: terapkan hasil preview dalam satu transaksi.
+
+    UPDATE bersyarat (stok masih sama dengan saat preview) dijalankan sebagai
+    executemany; jika ada produk yang stoknya sudah berubah, seluruh apply
+    dibatalkan dengan StockImportConflict. Return (ok, content) seperti import lama.
+    """
+    rows = preview_rows(preview)
+    if rows:
+        version = bump_catalog_version(db)
+        result = db.execute(
+            update(Product.__table__)
+            .where(Product.__table__.c.id == bindparam("b_id"), Product.__table__.c.stock == bindparam("b_old_stock"))
+            .values(
+                cost_price=bindparam("b_cost_price"),
+                price=bindparam("b_price"),
+                stock=bindparam("b_new_stock"),
+                version=version,
+            ),
+            [{"b_id": r["product_id"], "b_old_stock": r["old_stock"], "b_cost_price": r["cost_price"],
+              "b_price": r["price"], "b_new_stock": r["new_stock"]} for r in rows],
+        )
+        if result.rowcount != len(rows):
+            db.rollback()
+            raise StockImportConflict(
+                "Stok sebagian produk berubah sejak preview dibuat (mis. ada penjualan). Silakan upload ulang file."
+            )
+
+        now = datetime.utcnow()
+        stock_updates = [{
+            "product_id": r["product_id"],
+            "product_code": r["code"],
+            "product_name": r["product_name"],
+            "old_stock": r["old_stock"],
+            "new_stock": r["new_stock"],
+            "stock_added": r["stock_added"],
+            "cost_price": r["cost_price"],
+            "total_pengeluaran": r["total_pengeluaran"],
+            "updated_by": updated_by,
+            "created_at": now,
+        } for r in rows if r["stock_added"] > 0]
+        if stock_updates:
+            db.execute(StockUpdate.__table__.insert(), stock_updates)
+        publish_product_changes(db, version, [
+            {"code": r["code"], "price": r["price"], "stock": r["new_stock"]} for r in rows
+        ])
+        bump_report_version(db)
+    db.commit()
+
+    total_pengeluaran = preview["total_pengeluaran"]
+    message = f"Berhasil mengupdate {preview['products_matched']} produk."
+    if total_pengeluaran > 0:
+        message += f" Total pengeluaran untuk update stok: Rp {total_pengeluaran:,.0f}".replace(",", ".")
+
+    content = {"message": message, "total_pengeluaran": total_pengeluaran}
+    if preview["errors"]:
+        content["detail"] = "Beberapa produk gagal diupdate:\n" + "\n".join(preview["errors"])
+        return False, content
+    return True, content
+
+
+def import_stock_updates(db: Session, df: pd.DataFrame, updated_by: str = "System", progress=None):
+    """Preview + apply sekaligus (endpoint lama dan job background)"""
+    preview = preview_stock_updates(db, df)
+    if progress:
+        progress(50)
+    return apply_stock_updates(db, preview, updated_by)
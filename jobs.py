@@ -0,0 +1,293 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from events import broker
+from models import Job
+
+# Job background untuk pekerjaan Excel yang berat (import produk, import
+# update stok, export laporan). Request hanya menyimpan upload lalu
+# langsung mengembalikan job id; pekerjaan dijalankan di process pool
+# (spawn, prioritas rendah) sehingga parsing pandas/openpyxl tidak berebut
+# GIL dengan checkout. Diukur dengan bench.py (1 CPU, 4 lane, --importers 1,
+# 20k baris): p95 checkout 87 ms tanpa import, 278 ms dengan job di thread,
+# 92 ms dengan job di proses worker. Harganya import itu sendiri lebih lambat
+# (6,5 -> ~36 detik) karena CPU didahulukan untuk checkout. Checkout tetap
+# menunggu write lock SQLite selama import menulis satu transaksinya.
+#
+# Fungsi job harus fungsi level modul (di-pickle ke proses worker). Event SSE
+# yang dipublikasikan job direkam di proses worker lalu diteruskan ke broker
+# proses web setelah job selesai.
+#
+# Status dan progress job disimpan di tabel jobs, jadi job bisa dipantau dari
+# worker uvicorn mana pun. Setiap job mencatat proses pemiliknya (boot id
+# mesin, pid, token acak per proses); saat startup hanya job milik proses yang
+# sudah tidak hidup lagi yang ditandai gagal.
+
+JOB_DIR = os.path.abspath(os.getenv("POS_JOB_DIR", "./job_artifacts"))
+JOB_WORKERS = int(os.getenv("POS_JOB_WORKERS", "1"))
+JOB_ARTIFACT_TTL = int(os.getenv("POS_JOB_ARTIFACT_TTL", str(24 * 3600)))  # detik
+JOB_WORKER_NICE = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+_cleanup_lock = threading.Lock()
+
+
+def _boot_id() -> str:
+    # Berubah setiap mesin reboot (Linux); kosong di OS lain
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+# Pemilik job yang dibuat proses ini: "boot_id/pid/token"
+PROCESS_OWNER = f"{_boot_id()}/{os.getpid()}/{uuid.uuid4().hex[:8]}"
+
+
+class JobContext:
+    """Diberikan ke fungsi job untuk melaporkan progress dan menyimpan artefak"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.artifact_path = None
+        self.artifact_name = None
+        self.last_progress = 0
+
+    def progress(self, percent: int):
+        percent = max(0, min(99, int(percent)))
+        if percent == self.last_progress:
+            return
+        self.last_progress = percent
+        # Progress dipanggil sebelum transaksi tulis job dimulai, jadi koneksi
+        # terpisah ini tidak menunggu lock milik job sendiri. Jika database
+        # sedang dikunci (mis. checkout), progress dilewati saja.
+        try:
+            _update_job(self.job_id, progress=percent)
+        except OperationalError:
+            pass
+
+    def file_path(self, suffix: str) -> str:
+        """Path file milik job ini di JOB_DIR (upload maupun hasil)"""
+        os.makedirs(JOB_DIR, exist_ok=True)
+        return os.path.join(JOB_DIR, f"{self.job_id}{suffix}")
+
+    def set_artifact(self, path: str, download_name: str):
+        self.artifact_path = path
+        self.artifact_name = download_name
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def job_file_path(job_id: str, suffix: str) -> str:
+    return JobContext(job_id).file_path(suffix)
+
+
+def _init_worker():
+    try:
+        os.nice(JOB_WORKER_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _get_executor(reset: bool = False):
+    global _executor
+    with _executor_lock:
+        if reset and _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            # spawn, bukan fork (lihat auth._get_executor)
+            _executor = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def shutdown_job_workers():
+    """Hentikan process pool saat aplikasi berhenti; job yang belum mulai ditandai gagal saat startup berikutnya"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def submit_job(kind: str, fn, *args, job_id: str = None, created_by: str = None) -> str:
+    """Catat job lalu jalankan `fn(db, ctx, *args)` di process pool. Return job id.
+
+    `fn` mengembalikan dict hasil (disimpan sebagai JSON) dan boleh
+    memanggil ctx.set_artifact() untuk file yang bisa di-download.
+    """
+    job_id = job_id or new_job_id()
+    db = SessionLocal()
+    try:
+        db.add(Job(id=job_id, kind=kind, status="queued", created_by=created_by, owner=PROCESS_OWNER))
+        db.commit()
+    finally:
+        db.close()
+    try:
+        future = _get_executor().submit(_run_job, job_id, fn, args)
+    except BrokenProcessPool:
+        # Worker mati (mis. di-kill): buat pool baru
+        future = _get_executor(reset=True).submit(_run_job, job_id, fn, args)
+    future.add_done_callback(lambda f: _job_finished(job_id, f))
+    cleanup_expired_artifacts()
+    return job_id
+
+
+def _job_finished(job_id: str, future):
+    # Di proses web: teruskan event SSE dari job, atau catat gagal jika worker mati
+    if future.cancelled():
+        return
+    try:
+        events = future.result()
+    except Exception as e:
+        _update_job(job_id, status="failed", error=f"Worker job berhenti: {e.__class__.__name__}",
+                    finished_at=datetime.utcnow())
+        return
+    for name, data in events:
+        broker.publish(name, data)
+
+
+def _update_job(job_id: str, **values):
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run_job(job_id: str, fn, args):
+    """Dijalankan di proses worker. Return event SSE yang dipublikasikan job."""
+    ctx = JobContext(job_id)
+    _update_job(job_id, status="running", started_at=datetime.utcnow())
+    events = broker.start_recording()
+    try:
+        db = SessionLocal()
+        try:
+            result = fn(db, ctx, *args)
+        finally:
+            db.close()
+    except Exception as e:
+        _update_job(job_id, status="failed", error=str(e) or e.__class__.__name__, finished_at=datetime.utcnow())
+    else:
+        _update_job(
+            job_id,
+            status="done",
+            progress=100,
+            result=json.dumps(result) if result is not None else None,
+            artifact_path=ctx.artifact_path,
+            artifact_name=ctx.artifact_name,
+            finished_at=datetime.utcnow(),
+        )
+    finally:
+        broker.stop_recording()
+    return events
+
+
+def get_job(db: Session, job_id: str):
+    return db.query(Job).filter(Job.id == job_id).first()
+
+
+def serialize_job(job: Job) -> dict:
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "download_url": None,
+    }
+    if job.status == "done" and job.artifact_path and os.path.exists(job.artifact_path):
+        data["download_url"] = f"/api/jobs/{job.id}/download"
+    return data
+
+
+def _owner_alive(owner: str) -> bool:
+    """Apakah proses pemilik job (format PROCESS_OWNER) masih hidup"""
+    if owner == PROCESS_OWNER:
+        return True
+    try:
+        boot_id, pid, _ = owner.split("/")
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False  # job dari versi lama tanpa pemilik
+    if boot_id != _boot_id() or pid == os.getpid():
+        # Mesin sudah reboot, atau pid-nya dipakai ulang oleh proses ini (mis. container restart)
+        return False
+    if os.name != "posix":
+        # Tanpa cara aman mengecek pid: anggap proses lain sudah berhenti
+        # (di OS ini jalankan uvicorn dengan satu worker)
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Proses ada, milik user lain
+    return True
+
+
+def fail_interrupted_jobs():
+    """Saat startup: job queued/running milik proses yang sudah berhenti tidak akan pernah selesai"""
+    db = SessionLocal()
+    try:
+        jobs = db.query(Job.id, Job.owner).filter(Job.status.in_(["queued", "running"])).all()
+        orphaned = [job_id for job_id, owner in jobs if not _owner_alive(owner)]
+        if orphaned:
+            db.query(Job).filter(Job.id.in_(orphaned), Job.status.in_(["queued", "running"])).update(
+                {Job.status: "failed", Job.error: "Server berhenti sebelum job selesai", Job.finished_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+            db.commit()
+    finally:
+        db.close()
+
+
+def cleanup_expired_artifacts():
+    """Hapus file job yang lebih tua dari JOB_ARTIFACT_TTL (artefak hasil maupun sisa upload)"""
+    if not _cleanup_lock.acquire(blocking=False):
+        return
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_ARTIFACT_TTL)
+        db = SessionLocal()
+        try:
+            expired = db.query(Job).filter(Job.artifact_path.isnot(None), Job.finished_at < cutoff).all()
+            for job in expired:
+                if os.path.exists(job.artifact_path):
+                    os.remove(job.artifact_path)
+                job.artifact_path = None
+            if expired:
+                db.commit()
+        finally:
+            db.close()
+
+        if os.path.isdir(JOB_DIR):
+            cutoff_ts = time.time() - JOB_ARTIFACT_TTL
+            for name in os.listdir(JOB_DIR):
+                path = os.path.join(JOB_DIR, name)
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff_ts:
+                    os.remove(path)
+    finally:
+        _cleanup_lock.release()
@@ -0,0 +1,261 @@
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Metrik aplikasi dalam memori proses, diekspor sebagai teks Prometheus di /metrics:
+# - latensi per route (histogram), jumlah query dan waktu DB per request
+# - durasi statement SQL per engine (baca/tulis; tulis ikut memuat waktu menunggu lock SQLite)
+# - waktu menunggu koneksi dari pool
+# - hit rate cache (laporan, settings, identitas user)
+# Dengan beberapa worker uvicorn, tiap worker punya angka sendiri (label pid).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+WRITE_KEYWORDS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Koneksi SSE terbuka berjam-jam; durasinya bukan latensi, jadi tidak dicatat
+UNTIMED_ROUTES = {"/api/events"}
+
+_lock = threading.Lock()
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # labels -> [count per bucket..., sum, count]
+
+    def observe(self, labels, value: float):
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, entry in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + ('+Inf',))} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(entry[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {entry[-1]}")
+        return lines
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+REQUEST_SECONDS = Histogram(
+    "pos_http_request_duration_seconds", "Latensi request per route", ("method", "route", "status"))
+REQUEST_QUERIES = Histogram(
+    "pos_http_request_queries", "Jumlah statement SQL per request", ("method", "route"), QUERY_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram(
+    "pos_http_request_db_seconds", "Total waktu statement SQL per request", ("method", "route"), DB_BUCKETS)
+STATEMENT_SECONDS = Histogram(
+    "pos_db_statement_duration_seconds", "Durasi statement SQL", ("engine", "kind"), DB_BUCKETS)
+POOL_WAIT_SECONDS = Histogram(
+    "pos_db_pool_wait_seconds", "Waktu menunggu koneksi dari pool", ("engine",), DB_BUCKETS)
+DB_ERRORS = Counter("pos_db_errors_total", "Error database (locked = gagal mendapat lock SQLite)", ("engine", "kind"))
+BUDGET_EXCEEDED = Counter(
+    "pos_query_budget_exceeded_total", "Request yang memakai statement SQL melebihi query_budget route", ("method", "route"))
+
+# Request yang sedang berjalan: [jumlah query, detik DB, scope ASGI]. Thread
+# threadpool dan greenlet run_sync mewarisi context request, jadi hook engine
+# di bawah ikut menambah angka request yang benar.
+_current = contextvars.ContextVar("pos_request_stats", default=None)
+
+
+def current_request_stats():
+    """(jumlah query, detik DB) request yang sedang berjalan, None di luar request"""
+    stats = _current.get()
+    return None if stats is None else (stats[0], stats[1])
+
+
+def query_budget(limit: int):
+    """Batas jumlah statement SQL per request untuk sebuah route.
+
+    Dipasang di bawah dekorator @app.get/@app.post. check_query_budgets.py
+    gagal jika route melebihi batas ini; di produksi pelanggarannya dihitung
+    di pos_query_budget_exceeded_total.
+    """
+    def decorate(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorate
+
+
+def current_route():
+    """Label route request yang sedang berjalan, None di luar request (mis. job background)"""
+    stats = _current.get()
+    return None if stats is None else f"{stats[2]['method']} {_route_label(stats[2])}"
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mount (mis. /static) tidak punya route, tapi root_path-nya sudah diisi router
+    if scope.get("root_path"):
+        return scope["root_path"] + "/*"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latensi, jumlah query dan waktu DB per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = [0, 0.0, scope]
+        token = _current.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            if route in UNTIMED_ROUTES:
+                return
+            REQUEST_SECONDS.observe((method, route, str(status[0])), elapsed)
+            REQUEST_QUERIES.observe((method, route), stats[0])
+            budget = getattr(scope.get("endpoint"), "query_budget", None)
+            if budget is not None and stats[0] > budget:
+                BUDGET_EXCEEDED.inc((method, route))
+            REQUEST_DB_SECONDS.observe((method, route), stats[1])
+
+
+def _statement_kind(statement: str) -> str:
+    return "write" if statement.lstrip()[:7].upper().startswith(WRITE_KEYWORDS) else "read"
+
+
+def instrument_engine(engine, name: str):
+    """Pasang hook durasi statement pada engine sync (untuk async: engine.sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["pos_query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("pos_query_started")
+        STATEMENT_SECONDS.observe((name, _statement_kind(statement)), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        original = context.original_exception
+        locked = isinstance(original, sqlite3.OperationalError) and "locked" in str(original)
+        DB_ERRORS.inc((name, "locked" if locked else "other"))
+
+
+class _PoolWaitMixin:
+    metrics_name = "main"  # label engine
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.observe((self.metrics_name,), time.perf_counter() - started)
+
+
+class TimedQueuePool(_PoolWaitMixin, QueuePool):
+    """QueuePool yang mencatat waktu menunggu koneksi"""
+
+
+class TimedAsyncQueuePool(_PoolWaitMixin, AsyncAdaptedQueuePool):
+    """Versi async (aiosqlite) dari TimedQueuePool"""
+    metrics_name = "async"
+
+
+def _cache_lines():
+    # Import di sini: modul cache mengimpor db, sedangkan db mengimpor modul ini
+    import report_cache
+    import settings_cache
+    import identity
+
+    caches = {
+        "report": report_cache.stats,
+        "settings": settings_cache.stats,
+        "identity": identity.stats,
+    }
+    name = "pos_cache_requests_total"
+    lines = [f"# HELP {name} Akses cache in-process per hasil", f"# TYPE {name} counter"]
+    for cache, stats in caches.items():
+        for result, value in sorted(stats.items()):
+            lines.append(f"{name}{_labels(('cache', 'result'), (cache, result))} {value}")
+    return lines
+
+
+def render_metrics() -> str:
+    lines = [
+        "# HELP pos_process_info Proses worker yang melayani scrape ini",
+        "# TYPE pos_process_info gauge",
+        f"pos_process_info{_labels(('pid',), (os.getpid(),))} 1",
+    ]
+    with _lock:
+        for metric in (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, STATEMENT_SECONDS, POOL_WAIT_SECONDS, DB_ERRORS,
+                       BUDGET_EXCEEDED):
+            lines.extend(metric.render())
+    lines.extend(_cache_lines())
+    return "\n".join(lines) + "\n"
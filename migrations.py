@@ -0,0 +1,97 @@
+from sqlalchemy import text
+
+from db import Base
+import models  # Daftarkan semua tabel ke Base.metadata untuk create_all()
+from search import ensure_product_search_index
+from rollups import rebuild_rollups
+
+# Migrasi skema bernomor. Versi yang sudah diterapkan disimpan di
+# PRAGMA user_version, jadi saat database sudah up-to-date startup hanya
+# membaca satu angka tanpa introspeksi tabel sama sekali.
+#
+# Setiap perubahan skema (tabel, kolom atau index baru) WAJIB ditambahkan
+# sebagai migrasi baru di akhir daftar MIGRATIONS. Tabel baru dari models.py
+# dibuat otomatis oleh create_all() setiap kali ada migrasi yang tertunda.
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+def _add_column(conn, table, column, ddl):
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def m001_legacy_columns(conn):
+    """Kolom-kolom yang dulu ditambahkan lewat pengecekan PRAGMA manual"""
+    _add_column(conn, "products", "cost_price", "FLOAT NOT NULL DEFAULT 0")
+    _add_column(conn, "transaction_items", "cost_price", "FLOAT NOT NULL DEFAULT 0")
+    _add_column(conn, "settings", "timezone", "VARCHAR DEFAULT 'WIB'")
+
+def m002_catalog_version(conn):
+    _add_column(conn, "products", "version", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_version ON products (version)"))
+
+def m003_product_search(conn):
+    ensure_product_search_index(conn)
+
+def m004_report_indexes(conn):
+    """Index untuk filter periode dan join di semua laporan"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_created_at ON transactions (created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transaction_items_transaction_id ON transaction_items (transaction_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transaction_items_product_code ON transaction_items (product_code)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_stock_updates_created_at ON stock_updates (created_at)"))
+
+def m005_daily_rollups(conn):
+    """Tabel rollup dibuat oleh create_all(); isi dari histori transaksi yang sudah ada"""
+    rebuild_rollups(conn)
+
+def m006_jobs(conn):
+    """Tabel jobs dibuat oleh create_all(); tidak ada data lama yang perlu diisi"""
+
+def m007_job_owner(conn):
+    """Proses pemilik job, agar startup worker lain tidak menggagalkan job yang masih berjalan"""
+    _add_column(conn, "jobs", "owner", "VARCHAR")
+
+def m008_local_business_date(conn):
+    """Rollup lama memakai tanggal UTC; hitung ulang per tanggal lokal toko"""
+    rebuild_rollups(conn)
+
+
+MIGRATIONS = [
+    (1, "Kolom cost_price dan timezone", m001_legacy_columns),
+    (2, "Kolom version untuk delta sync katalog", m002_catalog_version),
+    (3, "Index pencarian produk (FTS5)", m003_product_search),
+    (4, "Index laporan (created_at, transaction_id, product_code)", m004_report_indexes),
+    (5, "Rollup penjualan harian", m005_daily_rollups),
+    (6, "Tabel job background import/export", m006_jobs),
+    (7, "Pemilik proses job background", m007_job_owner),
+    (8, "Rollup per tanggal lokal toko", m008_local_business_date),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute(text("PRAGMA user_version")).scalar() or 0
+
+
+def run_migrations(engine) -> int:
+    """Terapkan migrasi yang belum dijalankan. Return versi skema setelah migrasi."""
+    with engine.connect() as conn:
+        current = get_schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        return current
+
+    with engine.begin() as conn:
+        Base.metadata.create_all(bind=conn)
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        # Satu transaksi per migrasi; user_version ikut di-commit bersama perubahan skema
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(text(f"PRAGMA user_version = {version}"))
+        print(f"[OK] Migration {version:03d}: {description}")
+        current = version
+    return current
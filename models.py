@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from db import Base
@@ -20,12 +20,13 @@ class Product(Base):
     cost_price = Column(Float, nullable=False, default=0)  # Harga asli/harga beli
     stock = Column(Integer, nullable=False, default=0)
     status = Column(String, default="active")  # active/inactive
+    version = Column(Integer, nullable=False, default=0, index=True)  # Versi katalog saat terakhir berubah
 
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True)
     trx_no = Column(String, unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     cashier = Column(String, nullable=False)
     payment_method = Column(String, default="cash")  # cash/qris/transfer
     total = Column(Float, nullable=False, default=0)
@@ -37,8 +38,8 @@ class Transaction(Base):
 class TransactionItem(Base):
     __tablename__ = "transaction_items"
     id = Column(Integer, primary_key=True)
-    transaction_id = Column(Integer, ForeignKey("transactions.id"))
-    product_code = Column(String, nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), index=True)
+    product_code = Column(String, nullable=False, index=True)
     product_name = Column(String, nullable=False)
     price = Column(Float, nullable=False, default=0)  # Harga jual
     cost_price = Column(Float, nullable=False, default=0)  # Harga asli/harga beli
@@ -58,7 +59,7 @@ class StockUpdate(Base):
     stock_added = Column(Integer, nullable=False, default=0)  # Jumlah stok yang ditambahkan
     cost_price = Column(Float, nullable=False, default=0)  # Harga asli saat update
     total_pengeluaran = Column(Float, nullable=False, default=0)  # cost_price * stock_added
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_by = Column(String, nullable=True)  # User yang melakukan update
 
 class Setting(Base):
@@ -68,3 +69,66 @@ class Setting(Base):
     store_address = Column(String, default="Alamat Toko Anda")
     store_phone = Column(String, default="")
     timezone = Column(String, default="WIB")  # WIB (UTC+7), WITA (UTC+8), WIT (UTC+9)
+
+class Counter(Base):
+    __tablename__ = "counters"
+    name = Column(String, primary_key=True)  # catalog_version, catalog_reset, ...
+    value = Column(Integer, nullable=False, default=0)
+
+class CatalogTombstone(Base):
+    __tablename__ = "catalog_tombstones"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    code = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, index=True)  # Versi katalog saat produk dihapus
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+class TrxSequence(Base):
+    __tablename__ = "trx_sequences"
+    business_date = Column(String, primary_key=True)  # YYYYMMDD sesuai zona waktu toko
+    terminal = Column(String, primary_key=True, default="")  # Kosong = nomor bersama semua lane
+    last_no = Column(Integer, nullable=False, default=0)
+
+# Rollup penjualan harian, di-update oleh checkout dalam transaksi yang sama.
+# business_date = tanggal lokal toko dari created_at transaksi (sama dengan periode laporan).
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+    business_date = Column(Date, primary_key=True)
+    omzet = Column(Float, nullable=False, default=0)
+    modal = Column(Float, nullable=False, default=0)  # Total cost_price * qty
+    trx_count = Column(Integer, nullable=False, default=0)
+    items_sold = Column(Integer, nullable=False, default=0)
+
+class DailyPaymentSales(Base):
+    __tablename__ = "daily_payment_sales"
+    business_date = Column(Date, primary_key=True)
+    payment_method = Column(String, primary_key=True)
+    omzet = Column(Float, nullable=False, default=0)
+    trx_count = Column(Integer, nullable=False, default=0)
+
+class DailyProductSales(Base):
+    __tablename__ = "daily_product_sales"
+    business_date = Column(Date, primary_key=True)
+    product_code = Column(String, primary_key=True, index=True)
+    product_name = Column(String, nullable=False)
+    qty = Column(Integer, nullable=False, default=0)
+    omzet = Column(Float, nullable=False, default=0)
+    modal = Column(Float, nullable=False, default=0)
+
+# Job background (import/export Excel), lihat jobs.py. Baris ini mencatat
+# status, progress saat berjalan, proses pemilik, hasil akhir dan artefak.
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)  # uuid hex
+    kind = Column(String, nullable=False)  # import_products/import_stock/preview_stock/export_report
+    status = Column(String, nullable=False, default="queued", index=True)  # queued/running/done/failed
+    progress = Column(Integer, nullable=False, default=0)  # 0-100
+    result = Column(Text, nullable=True)  # JSON hasil job
+    error = Column(Text, nullable=True)
+    artifact_path = Column(String, nullable=True)  # File hasil di JOB_DIR, dihapus setelah TTL
+    artifact_name = Column(String, nullable=True)  # Nama file untuk download
+    created_by = Column(String, nullable=True)
+    owner = Column(String, nullable=True)  # Proses yang menjalankan job: "boot_id/pid/token"
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
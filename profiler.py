@@ -0,0 +1,170 @@
+import linecache
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+
+# Profiler sampling on-demand untuk satu request. Admin menambahkan
+# ?_profile=1 atau header "X-POS-Profile: 1"; selama request itu berjalan,
+# thread sampler mengambil stack semua thread setiap PROFILE_INTERVAL detik
+# dan hasilnya disimpan dalam format "collapsed stacks" (satu baris per stack,
+# "frame;frame;frame jumlah") yang langsung bisa dibuka di speedscope atau
+# flamegraph.pl. Tanpa switch itu middleware hanya memeriksa query string
+# dan header, tidak ada hook atau thread tambahan.
+#
+# Yang disampling adalah seluruh proses: request lain yang berjalan bersamaan
+# ikut terekam (akar stack = nama thread). Thread yang sedang menganggur
+# (menunggu antrian/IO) tidak dihitung.
+PROFILE_DIR = os.path.abspath(os.getenv("POS_PROFILE_DIR", "./profiles"))
+PROFILE_INTERVAL = 0.005  # detik
+PROFILE_KEEP = 50  # file profil terbaru yang disimpan
+PROFILE_QUERY_PARAM = "_profile"
+PROFILE_HEADER = b"x-pos-profile"
+
+# Frame teratas thread yang sedang menunggu pekerjaan
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select")}
+# Worker yang menunggu di queue.get() versi C (tidak punya frame Python sendiri):
+# idle jika baris yang sedang dijalankan adalah pemanggilan .get(
+QUEUE_WORKERS = {("thread.py", "_worker"), ("core.py", "_connection_worker_thread")}
+
+_run_lock = threading.Lock()  # satu profil pada satu waktu
+logger = logging.getLogger("pos.profiler")
+
+
+def _is_idle(frame) -> bool:
+    key = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    if key in IDLE_FRAMES:
+        return True
+    return key in QUEUE_WORKERS and ".get(" in linecache.getline(frame.f_code.co_filename, frame.f_lineno)
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pos-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_requested(scope) -> bool:
+    if any(name == PROFILE_HEADER and value == b"1" for name, value in scope.get("headers", ())):
+        return True
+    # Dijalankan di setiap request: parse_qs hanya jika parameternya memang ada
+    query_string = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() not in query_string:
+        return False
+    query = parse_qs(query_string.decode("latin-1"))
+    return query.get(PROFILE_QUERY_PARAM, [None])[-1] == "1"
+
+
+def _is_admin(scope) -> bool:
+    user = scope.get("session", {}).get("user")
+    return bool(user) and user.get("role") == "admin"
+
+
+def _profile_name(scope) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{scope['method']}-{slug[:60]}.folded"
+
+
+def list_profiles():
+    """Profil tersimpan, terbaru dulu: [{"name", "size", "modified"}]"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    result = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".folded"):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            result.append({"name": name, "size": stat.st_size, "modified": datetime.fromtimestamp(stat.st_mtime)})
+    return sorted(result, key=lambda p: p["modified"], reverse=True)
+
+
+def profile_path(name: str):
+    """Path file profil, None jika nama tidak valid/tidak ada (mencegah path traversal)"""
+    if os.path.basename(name) != name or not name.endswith(".folded"):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _save(scope, sampler: Sampler, elapsed: float, name: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        f.write(sampler.collapsed())
+    for old in list_profiles()[PROFILE_KEEP:]:
+        os.remove(os.path.join(PROFILE_DIR, old["name"]))
+    logger.info("%s %s %.0f ms, %d sampel -> %s", scope["method"], scope["path"], elapsed * 1000, sampler.samples, name)
+
+
+class ProfilerMiddleware:
+    """Middleware ASGI: jalankan satu request di bawah sampler jika diminta admin.
+
+    Harus berada di dalam SessionMiddleware (role dibaca dari session).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profile_requested(scope) or not _is_admin(scope):
+            return await self.app(scope, receive, send)
+        if not _run_lock.acquire(blocking=False):
+            # Profil lain sedang berjalan: layani request seperti biasa
+            return await self.app(scope, receive, send)
+        try:
+            sampler = Sampler()
+            name = _profile_name(scope)
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message = dict(message, headers=list(message.get("headers", [])) + [
+                        (b"x-pos-profile-file", name.encode()),
+                    ])
+                await send(message)
+
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                sampler.stop()
+                _save(scope, sampler, time.perf_counter() - started, name)
+        finally:
+            _run_lock.release()
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from catalog import get_counter, next_counter, jump_counter
+
+# Cache hasil /api/reports/* per (endpoint, mode, awal periode).
+# Validitas dijaga counter "report_data" di tabel counters yang dinaikkan
+# oleh setiap penulisan yang mempengaruhi laporan (checkout, perubahan
+# produk/stok, import, clear/import database). Karena counter dibaca dari
+# database, beberapa worker uvicorn tetap konsisten walau cache-nya terpisah.
+REPORT_DATA_VERSION = "report_data"
+REPORT_CACHE_MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # key -> (version, etag, body bytes)
+stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+def bump_report_version(db: Session) -> int:
+    """Tandai data laporan berubah (di dalam transaksi yang sedang berjalan)"""
+    return next_counter(db, REPORT_DATA_VERSION)
+
+
+def reset_report_version(db: Session) -> int:
+    """Dipakai saat database dikosongkan/diganti: lompat ke versi berbasis waktu"""
+    version = jump_counter(db, REPORT_DATA_VERSION)
+    clear_report_cache()
+    return version
+
+
+def get_report_version(db: Session) -> int:
+    return get_counter(db, REPORT_DATA_VERSION)
+
+
+def clear_report_cache():
+    with _lock:
+        _cache.clear()
+
+
+def _make_etag(key, version: int) -> str:
+    digest = hashlib.sha1(repr((key, version)).encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def cached_report(db: Session, request: Request, endpoint: str, period: str, build):
+    """Response JSON laporan dari cache, atau 304 jika ETag klien masih berlaku.
+
+    `period` membedakan rentang waktu (mis. "daily:2024-05-01") sehingga
+    pergantian hari/bulan otomatis memakai key baru. `build(db)` hanya
+    dipanggil saat cache kosong atau data sudah berubah.
+
+    Session di argumen pertama supaya bisa dipanggil lewat
+    `await async_db.run_sync(cached_report, request, ...)`.
+    """
+    key = (endpoint, period)
+    version = get_report_version(db)
+    etag = _make_etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request, etag):
+        stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == version:
+            _cache.move_to_end(key)
+    if entry and entry[0] == version:
+        stats["hits"] += 1
+        body = entry[2]
+    else:
+        stats["misses"] += 1
+        body = json.dumps(jsonable_encoder(build(db))).encode()
+        with _lock:
+            _cache[key] = (version, etag, body)
+            _cache.move_to_end(key)
+            while len(_cache) > REPORT_CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return Response(content=body, media_type="application/json", headers=headers)
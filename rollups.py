@@ -0,0 +1,144 @@
+from datetime import date, datetime
+from sqlalchemy import text, func
+from sqlalchemy.orm import Session
+
+from models import DailySales, DailyPaymentSales, DailyProductSales
+from settings_cache import UTC_OFFSET_HOURS, DEFAULT_TIMEZONE, get_utc_offset
+
+# Rollup penjualan per hari (daily_sales, daily_payment_sales) dan per hari
+# per produk (daily_product_sales). Checkout menambahkan angkanya di dalam
+# transaksi yang sama, sehingga laporan harian/bulanan/tahunan cukup membaca
+# maksimal 366 baris agregat alih-alih seluruh histori transaksi.
+#
+# business_date = tanggal lokal toko (WIB/WITA/WIT) dari created_at (UTC),
+# hari yang sama dengan periode laporan. Mengganti zona waktu toko berarti
+# rollup dihitung ulang (lihat update_settings).
+
+ROLLUP_TABLES = ["daily_product_sales", "daily_payment_sales", "daily_sales"]
+
+
+def business_date_of(created_at: datetime, db: Session = None) -> date:
+    """Tanggal lokal toko untuk created_at (UTC naive)"""
+    return (created_at + get_utc_offset(db)).date()
+
+
+def local_date_modifier(timezone_name: str) -> str:
+    """Modifier fungsi date()/strftime() SQLite untuk mengubah created_at (UTC) ke waktu lokal toko"""
+    return f"+{UTC_OFFSET_HOURS.get(timezone_name, UTC_OFFSET_HOURS[DEFAULT_TIMEZONE])} hours"
+
+
+def apply_checkout_to_rollups(db: Session, trx, items):
+    """Tambahkan satu transaksi ke tabel rollup. `items` = list dict item transaksi."""
+    business_date = business_date_of(trx.created_at, db).isoformat()
+    modal = sum((it["cost_price"] or 0) * it["qty"] for it in items)
+    items_sold = sum(it["qty"] for it in items)
+
+    db.execute(text("""
+        INSERT INTO daily_sales (business_date, omzet, modal, trx_count, items_sold)
+        VALUES (:d, :omzet, :modal, 1, :items_sold)
+        ON CONFLICT(business_date) DO UPDATE SET
+            omzet = omzet + excluded.omzet,
+            modal = modal + excluded.modal,
+            trx_count = trx_count + 1,
+            items_sold = items_sold + excluded.items_sold
+    """), {"d": business_date, "omzet": trx.total, "modal": modal, "items_sold": items_sold})
+
+    db.execute(text("""
+        INSERT INTO daily_payment_sales (business_date, payment_method, omzet, trx_count)
+        VALUES (:d, :method, :omzet, 1)
+        ON CONFLICT(business_date, payment_method) DO UPDATE SET
+            omzet = omzet + excluded.omzet,
+            trx_count = trx_count + 1
+    """), {"d": business_date, "method": trx.payment_method, "omzet": trx.total})
+
+    per_product = {}
+    for it in items:
+        row = per_product.setdefault(it["product_code"], {
+            "d": business_date, "code": it["product_code"], "name": it["product_name"],
+            "qty": 0, "omzet": 0, "modal": 0,
+        })
+        row["qty"] += it["qty"]
+        row["omzet"] += it["subtotal"]
+        row["modal"] += (it["cost_price"] or 0) * it["qty"]
+    db.execute(text("""
+        INSERT INTO daily_product_sales (business_date, product_code, product_name, qty, omzet, modal)
+        VALUES (:d, :code, :name, :qty, :omzet, :modal)
+        ON CONFLICT(business_date, product_code) DO UPDATE SET
+            product_name = excluded.product_name,
+            qty = qty + excluded.qty,
+            omzet = omzet + excluded.omzet,
+            modal = modal + excluded.modal
+    """), list(per_product.values()))
+
+
+def rebuild_rollups(conn, timezone_name: str = None):
+    """Hitung ulang semua rollup dari transactions/transaction_items (untuk data historis).
+
+    Tanpa `timezone_name`, zona waktu dibaca dari tabel settings.
+    """
+    if timezone_name is None:
+        timezone_name = conn.execute(text("SELECT timezone FROM settings LIMIT 1")).scalar()
+    params = {"shift": local_date_modifier(timezone_name)}
+    for table in ROLLUP_TABLES:
+        conn.execute(text(f"DELETE FROM {table}"))
+    conn.execute(text("""
+        INSERT INTO daily_sales (business_date, omzet, modal, trx_count, items_sold)
+        SELECT t.d, t.omzet, COALESCE(i.modal, 0), t.trx_count, COALESCE(i.items_sold, 0)
+        FROM (
+            SELECT date(created_at, :shift) AS d, SUM(total) AS omzet, COUNT(*) AS trx_count
+            FROM transactions GROUP BY d
+        ) t
+        LEFT JOIN (
+            SELECT date(tr.created_at, :shift) AS d,
+                   SUM(COALESCE(ti.cost_price, 0) * ti.qty) AS modal,
+                   SUM(ti.qty) AS items_sold
+            FROM transaction_items ti JOIN transactions tr ON tr.id = ti.transaction_id
+            GROUP BY d
+        ) i ON i.d = t.d
+    """), params)
+    conn.execute(text("""
+        INSERT INTO daily_payment_sales (business_date, payment_method, omzet, trx_count)
+        SELECT date(created_at, :shift) AS d, payment_method, SUM(total), COUNT(*)
+        FROM transactions GROUP BY d, payment_method
+    """), params)
+    conn.execute(text("""
+        INSERT INTO daily_product_sales (business_date, product_code, product_name, qty, omzet, modal)
+        SELECT date(tr.created_at, :shift) AS d, ti.product_code, MAX(ti.product_name),
+               SUM(ti.qty), SUM(ti.subtotal), SUM(COALESCE(ti.cost_price, 0) * ti.qty)
+        FROM transaction_items ti JOIN transactions tr ON tr.id = ti.transaction_id
+        GROUP BY d, ti.product_code
+    """), params)
+
+
+def clear_rollups(db: Session):
+    for model in (DailyProductSales, DailyPaymentSales, DailySales):
+        db.query(model).delete()
+
+
+def get_sales_totals(db: Session, start_date: date, end_date: date) -> dict:
+    """Total omzet, modal, jumlah transaksi dan item terjual dalam rentang tanggal (inklusif)"""
+    row = (
+        db.query(
+            func.coalesce(func.sum(DailySales.omzet), 0),
+            func.coalesce(func.sum(DailySales.modal), 0),
+            func.coalesce(func.sum(DailySales.trx_count), 0),
+            func.coalesce(func.sum(DailySales.items_sold), 0),
+        )
+        .filter(DailySales.business_date >= start_date, DailySales.business_date <= end_date)
+        .one()
+    )
+    return {"omzet": row[0], "modal": row[1], "trx_count": row[2], "items_sold": row[3]}
+
+
+if __name__ == "__main__":
+    import sys
+    from db import engine
+    from migrations import run_migrations
+
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python rollups.py rebuild")
+        sys.exit(1)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+    print("Rollup penjualan harian berhasil dihitung ulang")
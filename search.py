@@ -0,0 +1,133 @@
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Index FTS5 (tokenizer trigram) untuk pencarian produk di layar kasir.
+# Tabel products_fts memakai external content dari products, jadi isinya
+# dijaga sinkron oleh trigger: tambah, update, hapus dan import Excel
+# otomatis ikut ter-index tanpa kode tambahan di route.
+PRODUCT_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        code, name, content='products', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, code, name) VALUES (new.id, new.code, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, code, name) VALUES ('delete', old.id, old.code, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF code, name ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, code, name) VALUES ('delete', old.id, old.code, old.name);
+        INSERT INTO products_fts(rowid, code, name) VALUES (new.id, new.code, new.name);
+    END
+    """,
+]
+
+# Trigram hanya bisa mencocokkan kata minimal 3 karakter
+MIN_TRIGRAM_LEN = 3
+MAX_SEARCH_LIMIT = 100
+
+logger = logging.getLogger("pos.search")
+
+# Ada/tidaknya index FTS disimpan di info koneksi pool, bukan variabel modul:
+# dicek sekali saat koneksi dibuka (db.py), jadi setelah import/ganti database
+# koneksi baru mengecek ulang sendiri.
+FTS_INFO_KEY = "products_fts"
+FTS_EXISTS_SQL = "SELECT name FROM sqlite_master WHERE type='table' AND name='products_fts'"
+
+
+def probe_product_search_index(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(FTS_EXISTS_SQL)
+        connection_record.info[FTS_INFO_KEY] = cursor.fetchone() is not None
+    finally:
+        cursor.close()
+
+
+def ensure_product_search_index(conn) -> bool:
+    """Buat index FTS5 + trigger jika belum ada. Return False jika SQLite tidak mendukung FTS5 trigram."""
+    exists = conn.execute(text(FTS_EXISTS_SQL)).fetchone()
+    try:
+        for ddl in PRODUCT_FTS_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+        available = True
+    except Exception as e:
+        logger.warning("FTS5 tidak tersedia, pencarian memakai LIKE: %s", e)
+        available = False
+    conn.info[FTS_INFO_KEY] = available
+    return available
+
+
+def _fts_enabled(db: Session) -> bool:
+    info = db.connection().info
+    if FTS_INFO_KEY not in info:
+        info[FTS_INFO_KEY] = db.execute(text(FTS_EXISTS_SQL)).fetchone() is not None
+    return info[FTS_INFO_KEY]
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_products(db: Session, q: str, limit: int = 20, offset: int = 0):
+    """Cari produk aktif berdasarkan kode/nama.
+
+    Return (rows, has_more). Kode yang sama persis selalu di urutan pertama,
+    sisanya diurutkan berdasarkan skor bm25 (nama lebih pendek lebih relevan).
+    """
+    q = (q or "").strip()
+    if not q:
+        return [], False
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    offset = max(0, offset)
+
+    terms = q.lower().split()
+    long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM_LEN]
+    short_terms = [t for t in terms if len(t) < MIN_TRIGRAM_LEN]
+
+    params = {"q": q, "limit": limit + 1, "offset": offset}
+    like_filters = []
+    for i, term in enumerate(short_terms if long_terms else terms):
+        params[f"like{i}"] = _like_pattern(term)
+        like_filters.append(f"(p.code LIKE :like{i} ESCAPE '\\' OR p.name LIKE :like{i} ESCAPE '\\')")
+
+    if long_terms and _fts_enabled(db):
+        params["match"] = " ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+        where = ["products_fts MATCH :match", "p.status = 'active'"] + like_filters
+        sql = f"""
+            SELECT p.id, p.code, p.name, p.price, p.stock
+            FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE {' AND '.join(where)}
+            ORDER BY (p.code = :q) DESC, bm25(products_fts, 2.0, 1.0), length(p.name), p.name
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        # Query pendek (< 3 huruf) atau FTS5 tidak tersedia: fallback ke LIKE
+        if long_terms:
+            for i, term in enumerate(long_terms, start=len(like_filters)):
+                params[f"like{i}"] = _like_pattern(term)
+                like_filters.append(f"(p.code LIKE :like{i} ESCAPE '\\' OR p.name LIKE :like{i} ESCAPE '\\')")
+        where = ["p.status = 'active'"] + like_filters
+        sql = f"""
+            SELECT p.id, p.code, p.name, p.price, p.stock
+            FROM products p
+            WHERE {' AND '.join(where)}
+            ORDER BY (p.code = :q) DESC, length(p.name), p.name
+            LIMIT :limit OFFSET :offset
+        """
+
+    rows = db.execute(text(sql), params).fetchall()
+    return rows[:limit], len(rows) > limit
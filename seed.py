@@ -1,10 +1,20 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
 from sqlalchemy.orm import Session
-from db import engine, Base, SessionLocal
+from db import engine, SessionLocal
 from models import User
 from auth import hash_password
+from migrations import run_migrations
+from rollups import rebuild_rollups
+from catalog import reset_catalog
+from report_cache import reset_report_version
+from settings_cache import get_tzinfo
 
 def seed():
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     db: Session = SessionLocal()
 
     # Admin user
@@ -39,5 +49,271 @@ def seed():
 
     db.close()
 
-if __name__ == "__main__":
+
+# -------- GENERATOR DATA SINTETIS ----------
+# Data volume produksi untuk uji performa lokal: produk dengan popularitas
+# Zipf, transaksi dengan pola jam buka toko dan akhir pekan, ukuran keranjang
+# realistis, serta histori stock_updates beberapa tahun. Baris ditulis lewat
+# executemany DB-API langsung per batch besar (tanpa ORM), lalu rollup harian
+# dan trx_sequences dihitung ulang. Ditujukan untuk database dev/benchmark.
+
+PRODUCT_BASES = [
+    "Beras", "Minyak Goreng", "Gula Pasir", "Teh Celup", "Kopi Bubuk", "Sabun Mandi", "Sampo",
+    "Mie Instan", "Susu UHT", "Biskuit", "Air Mineral", "Deterjen", "Pasta Gigi", "Kecap Manis",
+    "Saus Sambal", "Tepung Terigu", "Telur Ayam", "Roti Tawar", "Keripik", "Minuman Soda",
+    "Semen", "Cat Tembok", "Paku", "Pipa PVC", "Kabel Listrik", "Lampu LED", "Baut", "Lem Kayu",
+]
+PRODUCT_BRANDS = ["Sinar", "Mawar", "Garuda", "Bintang", "Rajawali", "Melati", "Nusantara", "Merapi", "Cendana", "Kencana"]
+PRODUCT_SIZES = ["250 ml", "500 ml", "1 L", "5 L", "100 g", "500 g", "1 kg", "5 kg", "isi 10", "isi 24", "1 pcs", "1 dus"]
+
+CASHIERS = ["Admin Toko", "Demo User", "Kasir Pagi", "Kasir Siang", "Kasir Malam"]
+PAYMENT_METHODS = ["cash", "qris", "transfer"]
+PAYMENT_WEIGHTS = [0.62, 0.30, 0.08]
+
+# Bobot transaksi per jam (waktu lokal toko), toko buka 07:00-21:59
+HOUR_WEIGHTS = {
+    7: 2, 8: 4, 9: 6, 10: 8, 11: 9, 12: 7, 13: 6, 14: 5,
+    15: 6, 16: 8, 17: 10, 18: 10, 19: 8, 20: 5, 21: 3,
+}
+WEEKEND_FACTOR = 1.3
+YEARLY_GROWTH = 0.15
+ZIPF_EXPONENT = 1.1
+RESTOCKS_PER_PRODUCT_YEAR = 6
+TRX_BATCH_SIZE = 50000
+
+
+def _fmt_datetimes(seconds) -> list:
+    """Epoch detik (UTC) -> string DateTime format SQLAlchemy SQLite"""
+    values = np.datetime_as_string(np.asarray(seconds, dtype="datetime64[s]"), unit="s")
+    return [v.replace("T", " ") + ".000000" for v in values.tolist()]
+
+
+def _generate_products(cur, rng, count: int):
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+    start = cur.fetchone()[0] + 1
+    ids = np.arange(start, start + count)
+    bases = rng.integers(0, len(PRODUCT_BASES), count)
+    brands = rng.integers(0, len(PRODUCT_BRANDS), count)
+    sizes = rng.integers(0, len(PRODUCT_SIZES), count)
+    cost = np.maximum(500, np.round(rng.lognormal(9.3, 0.9, count) / 100) * 100)
+    price = np.round(cost * rng.uniform(1.08, 1.35, count) / 500) * 500
+    stock = rng.integers(0, 500, count)
+    rows = [
+        (int(i), f"SKU{i:07d}", f"{PRODUCT_BASES[b]} {PRODUCT_BRANDS[r]} {PRODUCT_SIZES[s]}", p, c, int(st), "active", 0)
+        for i, b, r, s, p, c, st in zip(ids.tolist(), bases.tolist(), brands.tolist(), sizes.tolist(),
+                                        price.tolist(), cost.tolist(), stock.tolist())
+    ]
+    cur.executemany(
+        "INSERT INTO products (id, code, name, price, cost_price, stock, status, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def _transaction_times(rng, count: int, start_day: datetime, days: int, utc_offset: timedelta):
+    """Waktu transaksi (epoch detik UTC, terurut) dan tanggal lokal (YYYYMMDD) per transaksi"""
+    day_dates = [start_day + timedelta(days=d) for d in range(days)]
+    day_w = np.array([
+        (WEEKEND_FACTOR if d.weekday() >= 5 else 1.0) * (1 + YEARLY_GROWTH) ** (i / 365)
+        for i, d in enumerate(day_dates)
+    ])
+    hours = np.array(list(HOUR_WEIGHTS))
+    hour_w = np.array(list(HOUR_WEIGHTS.values()), dtype=float)
+
+    base = int((start_day - datetime(1970, 1, 1)).total_seconds())
+    local = np.sort(
+        base
+        + rng.choice(days, count, p=day_w / day_w.sum()) * 86400
+        + rng.choice(hours, count, p=hour_w / hour_w.sum()) * 3600
+        + rng.integers(0, 3600, count)
+    )
+    utc = local - int(utc_offset.total_seconds())
+    dates = np.array([d.strftime("%Y%m%d") for d in day_dates])[(local - base) // 86400]
+    # Jam hari ini yang belum lewat tidak boleh punya transaksi
+    past = utc <= int((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds())
+    return utc[past], dates[past]
+
+
+def _trx_numbers(cur, dates):
+    """Nomor urut per tanggal lokal, melanjutkan trx_sequences yang sudah ada"""
+    cur.execute("SELECT business_date, last_no FROM trx_sequences WHERE terminal = ''")
+    existing = dict(cur.fetchall())
+    unique, first, counts = np.unique(dates, return_index=True, return_counts=True)
+    offsets = np.array([existing.get(d, 0) for d in unique.tolist()])
+    numbers = np.arange(len(dates)) - np.repeat(first, counts) + 1 + np.repeat(offsets, counts)
+    last = {d: int(o + c) for d, o, c in zip(unique.tolist(), offsets.tolist(), counts.tolist())}
+    return numbers, last
+
+
+def _generate_transactions(cur, rng, count: int, years: int, utc_offset: timedelta, commit):
+    cur.execute("SELECT id, code, name, price, cost_price FROM products")
+    products = cur.fetchall()
+    if not products:
+        raise SystemExit("Tidak ada produk: jalankan dengan --products terlebih dahulu")
+    codes = np.array([p[1] for p in products], dtype=object)
+    names = np.array([p[2] for p in products], dtype=object)
+    prices = np.array([p[3] for p in products], dtype=float)
+    costs = np.array([p[4] or 0 for p in products], dtype=float)
+    # Popularitas Zipf: peringkat acak per produk, peluang ~ 1 / rank^s
+    ranks = rng.permutation(len(products)) + 1
+    popularity = 1.0 / ranks ** ZIPF_EXPONENT
+    popularity /= popularity.sum()
+
+    now_local = datetime.utcnow() + utc_offset
+    today = datetime(now_local.year, now_local.month, now_local.day)
+    start_day = today - timedelta(days=365 * years - 1)
+    times, dates = _transaction_times(rng, count, start_day, 365 * years, utc_offset)
+    numbers, last_numbers = _trx_numbers(cur, dates)
+    count = len(times)
+
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+    next_id = cur.fetchone()[0] + 1
+    total_items = 0
+    started = time.time()
+    for lo in range(0, count, TRX_BATCH_SIZE):
+        hi = min(lo + TRX_BATCH_SIZE, count)
+        n = hi - lo
+        trx_ids = np.arange(next_id + lo, next_id + hi)
+        basket = np.minimum(rng.geometric(0.3, n), 30)
+        item_trx = np.repeat(trx_ids, basket)
+        item_prod = rng.choice(len(products), int(basket.sum()), p=popularity)
+        qty = np.minimum(rng.geometric(0.7, len(item_prod)), 12)
+        subtotal = prices[item_prod] * qty
+
+        totals = np.bincount(item_trx - trx_ids[0], weights=subtotal, minlength=n)
+        methods = rng.choice(len(PAYMENT_METHODS), n, p=PAYMENT_WEIGHTS)
+        # Tunai dibayar dengan pecahan dibulatkan ke atas, non-tunai pas
+        paid = np.where(methods == 0, np.ceil(totals / 5000) * 5000 + rng.choice([0, 0, 5000, 50000], n), totals)
+        cashiers = rng.integers(0, len(CASHIERS), n)
+
+        trx_rows = zip(
+            trx_ids.tolist(),
+            [f"TRX-{d}-{no:04d}" for d, no in zip(dates[lo:hi].tolist(), numbers[lo:hi].tolist())],
+            _fmt_datetimes(times[lo:hi]),
+            [CASHIERS[c] for c in cashiers.tolist()],
+            [PAYMENT_METHODS[m] for m in methods.tolist()],
+            totals.tolist(),
+            paid.tolist(),
+            (paid - totals).tolist(),
+        )
+        cur.executemany(
+            'INSERT INTO transactions (id, trx_no, created_at, cashier, payment_method, total, paid, "change") '
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            trx_rows,
+        )
+        item_rows = zip(
+            item_trx.tolist(), codes[item_prod].tolist(), names[item_prod].tolist(),
+            prices[item_prod].tolist(), costs[item_prod].tolist(), qty.tolist(), subtotal.tolist(),
+        )
+        cur.executemany(
+            "INSERT INTO transaction_items (transaction_id, product_code, product_name, price, cost_price, qty, subtotal) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            item_rows,
+        )
+        commit()
+        total_items += len(item_prod)
+        elapsed = time.time() - started
+        print(f"  transaksi {hi:,}/{count:,}, item {total_items:,} ({total_items / max(elapsed, 1e-9):,.0f} item/detik)")
+
+    cur.executemany(
+        "INSERT INTO trx_sequences (business_date, terminal, last_no) VALUES (?, '', ?) "
+        "ON CONFLICT(business_date, terminal) DO UPDATE SET last_no = max(last_no, excluded.last_no)",
+        list(last_numbers.items()),
+    )
+    return total_items
+
+
+def _generate_stock_updates(cur, rng, years: int, utc_offset: timedelta):
+    cur.execute("SELECT id, code, name, cost_price FROM products")
+    products = cur.fetchall()
+    if not products:
+        return 0
+    count = len(products) * RESTOCKS_PER_PRODUCT_YEAR * years
+    idx = rng.integers(0, len(products), count)
+    now = int((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds())
+    times = np.sort(now - rng.integers(0, 365 * years * 86400, count))
+    # Jam kerja gudang: geser ke 08:00-16:59 waktu lokal
+    local_day = (times + int(utc_offset.total_seconds())) // 86400 * 86400
+    times = local_day - int(utc_offset.total_seconds()) + rng.integers(8 * 3600, 17 * 3600, count)
+    # Jam kerja hari ini yang belum lewat: mundurkan ke waktu sekarang
+    times = np.minimum(times, now)
+    old_stock = rng.integers(0, 60, count)
+    added = rng.choice([12, 24, 48, 60, 100, 144, 200], count)
+    cost = np.array([p[3] or 0 for p in products], dtype=float)[idx]
+    rows = zip(
+        [products[i][0] for i in idx.tolist()],
+        [products[i][1] for i in idx.tolist()],
+        [products[i][2] for i in idx.tolist()],
+        old_stock.tolist(), (old_stock + added).tolist(), added.tolist(),
+        cost.tolist(), (cost * added).tolist(), _fmt_datetimes(times),
+        ["Admin Toko"] * count,
+    )
+    cur.executemany(
+        "INSERT INTO stock_updates (product_id, product_code, product_name, old_stock, new_stock, stock_added, "
+        "cost_price, total_pengeluaran, created_at, updated_by) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return count
+
+
+def generate(products: int, transactions: int, years: int, seed_value: int = None, stock_updates: bool = True):
+    """Isi database dengan data sintetis (lihat komentar di atas)"""
     seed()
+    rng = np.random.default_rng(seed_value)
+    utc_offset = datetime.now(get_tzinfo()).utcoffset() or timedelta(0)
+    started = time.time()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        # Bulk load: durability tidak penting, kalau gagal ulangi saja
+        cur.execute("PRAGMA synchronous = OFF")
+        if products:
+            print(f"Membuat {products:,} produk...")
+            _generate_products(cur, rng, products)
+            raw.commit()
+        if transactions:
+            print(f"Membuat {transactions:,} transaksi selama {years} tahun...")
+            items = _generate_transactions(cur, rng, transactions, years, utc_offset, raw.commit)
+            raw.commit()
+            print(f"  {items:,} item transaksi")
+        if stock_updates:
+            print("Membuat histori stock_updates...")
+            count = _generate_stock_updates(cur, rng, years, utc_offset)
+            raw.commit()
+            print(f"  {count:,} stock update")
+        cur.close()
+    finally:
+        raw.invalidate()  # koneksi dengan synchronous=OFF tidak dikembalikan ke pool
+        raw.close()
+
+    print("Menghitung ulang rollup harian...")
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+
+    # Terminal kasir dan cache laporan yang sedang berjalan harus sinkron ulang
+    db = SessionLocal()
+    try:
+        reset_catalog(db)
+        reset_report_version(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Selesai dalam {time.time() - started:,.1f} detik")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Buat user default, opsional dengan data sintetis volume produksi")
+    parser.add_argument("--products", type=int, default=0, help="jumlah produk baru (kode SKUnnnnnnn)")
+    parser.add_argument("--transactions", type=int, default=0, help="jumlah transaksi (rata-rata ~3.3 item per transaksi)")
+    parser.add_argument("--years", type=int, default=3, help="rentang histori transaksi dan stock update")
+    parser.add_argument("--seed", type=int, default=None, help="seed random agar dataset bisa diulang")
+    parser.add_argument("--no-stock-updates", action="store_true", help="lewati histori stock_updates")
+    args = parser.parse_args()
+
+    if not args.products and not args.transactions:
+        seed()
+        return
+    generate(args.products, args.transactions, args.years, args.seed, not args.no_stock_updates)
+
+if __name__ == "__main__":
+    main()
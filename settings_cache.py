@@ -0,0 +1,92 @@
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytz
+from sqlalchemy.orm import Session
+
+from models import Setting
+
+# Cache in-process untuk baris Setting dan tzinfo yang sudah di-resolve.
+# Format tanggal/jam (filter Jinja, struk, laporan, nomor transaksi) cukup
+# membaca cache ini tanpa query ke database. Cache di-refresh oleh
+# update_settings/import_database (write-through), TTL hanya jaring pengaman
+# kalau ada beberapa proses worker uvicorn yang tidak saling tahu.
+
+TIMEZONE_MAP = {
+    "WIB": "Asia/Jakarta",      # UTC+7
+    "WITA": "Asia/Makassar",    # UTC+8
+    "WIT": "Asia/Jayapura"      # UTC+9
+}
+DEFAULT_TIMEZONE = "WIB"
+# Offset UTC tetap (Indonesia tidak memakai DST), dipakai untuk tanggal lokal di SQL
+UTC_OFFSET_HOURS = {"WIB": 7, "WITA": 8, "WIT": 9}
+SETTINGS_CACHE_TTL = 60  # detik
+
+# tzinfo hanya perlu di-resolve sekali per zona waktu
+TZINFO = {name: pytz.timezone(zone) for name, zone in TIMEZONE_MAP.items()}
+
+_lock = threading.Lock()
+_cache = {"settings": None, "loaded_at": None}
+stats = {"hits": 0, "misses": 0}
+
+
+def _snapshot(row: Setting):
+    if row is None:
+        return None
+    return SimpleNamespace(
+        id=row.id,
+        store_name=row.store_name,
+        store_address=row.store_address,
+        store_phone=row.store_phone,
+        timezone=row.timezone if row.timezone in TIMEZONE_MAP else DEFAULT_TIMEZONE,
+    )
+
+
+def refresh_settings_cache(db: Session):
+    """Baca ulang Setting dari database dan simpan ke cache (write-through setelah update)"""
+    snapshot = _snapshot(db.query(Setting).first())
+    with _lock:
+        _cache["settings"] = snapshot
+        _cache["loaded_at"] = time.monotonic()
+    return snapshot
+
+
+def invalidate_settings_cache():
+    with _lock:
+        _cache["loaded_at"] = None
+
+
+def get_settings(db: Session = None):
+    """Snapshot Setting (read-only) dari cache; None jika belum ada baris settings.
+
+    `db` hanya dipakai saat cache kosong/kedaluwarsa. Tanpa `db` dan cache
+    kosong, dibuka session sendiri.
+    """
+    loaded_at = _cache["loaded_at"]
+    if loaded_at is not None and time.monotonic() - loaded_at < SETTINGS_CACHE_TTL:
+        stats["hits"] += 1
+        return _cache["settings"]
+    stats["misses"] += 1
+    if db is not None:
+        return refresh_settings_cache(db)
+    from db import SessionLocal
+    session = SessionLocal()
+    try:
+        return refresh_settings_cache(session)
+    finally:
+        session.close()
+
+
+def get_timezone_name(db: Session = None) -> str:
+    settings = get_settings(db)
+    return settings.timezone if settings else DEFAULT_TIMEZONE
+
+
+def get_tzinfo(db: Session = None):
+    return TZINFO[get_timezone_name(db)]
+
+
+def get_utc_offset(db: Session = None) -> timedelta:
+    return timedelta(hours=UTC_OFFSET_HOURS[get_timezone_name(db)])
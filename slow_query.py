@@ -0,0 +1,177 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from metrics import current_route
+
+# Log query lambat. Statement yang lebih lama dari POS_SLOW_QUERY_MS dicatat
+# (SQL, bentuk parameter tanpa nilainya, durasi, route) beserta hasil
+# EXPLAIN QUERY PLAN ke file JSONL yang dirotasi. EXPLAIN dan penulisan file
+# dikerjakan thread latar belakang, request hanya memasukkan ke antrian.
+# POS_SLOW_QUERY_MS=0 mematikan pencatatan (hook engine tidak dipasang).
+SLOW_QUERY_MS = float(os.getenv("POS_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.path.abspath(os.getenv("POS_SLOW_QUERY_LOG", "./logs/slow_queries.jsonl"))
+SLOW_QUERY_LOG_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+SLOW_QUERY_QUEUE = 1000
+PLAN_CACHE_ENTRIES = 512
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_queue = queue.Queue(maxsize=SLOW_QUERY_QUEUE)
+_worker = None
+_worker_lock = threading.Lock()
+stats = {"recorded": 0, "dropped": 0}
+
+
+def _param_shape(parameters, executemany: bool):
+    """Tipe parameter saja (nilai tidak disimpan), mis. ["str", "int"] atau {"rows": 120, "row": [...]}"""
+    if executemany:
+        rows = list(parameters or [])
+        return {"rows": len(rows), "row": _param_shape(rows[0], False) if rows else []}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def _null_params(shape):
+    # Parameter pengganti untuk EXPLAIN: rencana query tidak bergantung pada nilainya
+    if isinstance(shape, dict) and "rows" in shape:
+        return _null_params(shape["row"])
+    if isinstance(shape, dict):
+        return {name: None for name in shape}
+    return [None] * len(shape)
+
+
+def install_slow_query_log(engine, name: str, db_path: str):
+    """Pasang pencatat query lambat pada engine sync (untuk async: engine.sync_engine)"""
+    if SLOW_QUERY_MS <= 0:
+        return
+    threshold = SLOW_QUERY_MS / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["pos_slow_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("pos_slow_started")
+        if elapsed < threshold:
+            return
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "engine": name,
+            "route": current_route(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "sql": statement,
+            "params": _param_shape(parameters, executemany),
+        }
+        _ensure_worker()
+        try:
+            _queue.put_nowait((db_path, entry))
+        except queue.Full:
+            stats["dropped"] += 1
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run_worker, name="slow-query-log", daemon=True)
+            _worker.start()
+
+
+def _make_logger():
+    os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger = logging.getLogger("pos.slow_query")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def _run_worker():
+    logger = _make_logger()
+    plans = {}  # sql -> rencana query (cache, EXPLAIN cukup sekali per statement)
+    while True:
+        db_path, entry = _queue.get()
+        sql = entry["sql"]
+        if sql not in plans:
+            if len(plans) >= PLAN_CACHE_ENTRIES:
+                plans.clear()
+            plans[sql] = explain_query_plan(db_path, sql, _null_params(entry["params"]))
+        entry["plan"] = plans[sql]
+        logger.info(json.dumps(entry, ensure_ascii=False))
+        stats["recorded"] += 1
+
+
+def explain_query_plan(db_path: str, sql: str, params) -> str:
+    """Hasil EXPLAIN QUERY PLAN sebagai teks berindentasi (koneksi read-only terpisah)"""
+    if not db_path or not sql.lstrip()[:7].upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=1)
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return f"(EXPLAIN gagal: {e})"
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+
+def _read_entries():
+    paths = [f"{SLOW_QUERY_LOG}.{i}" for i in range(SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [SLOW_QUERY_LOG]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def worst_queries(limit: int = 50):
+    """Ringkasan log per statement, diurutkan dari total durasi terbesar"""
+    groups = {}
+    for entry in _read_entries():
+        group = groups.get(entry["sql"])
+        if group is None:
+            group = groups[entry["sql"]] = {
+                "sql": entry["sql"], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set(),
+            }
+        group["count"] += 1
+        group["total_ms"] += entry["duration_ms"]
+        group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+        group["last_at"] = entry["at"]
+        group["params"] = entry["params"]
+        group["plan"] = entry.get("plan")
+        if entry.get("route"):
+            group["routes"].add(entry["route"])
+    result = sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)[:limit]
+    for group in result:
+        group["avg_ms"] = round(group["total_ms"] / group["count"], 2)
+        group["total_ms"] = round(group["total_ms"], 2)
+        group["routes"] = sorted(group["routes"])
+    return result
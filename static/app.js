@@ -206,29 +206,183 @@ async function submitCheckout(event) {
   return true;
 }
 
+// Pencarian produk di kasir dilakukan di server (/api/products/search),
+// jadi halaman kasir tidak perlu memuat seluruh katalog.
+const PRODUCT_SEARCH_LIMIT = 30;
+let productSearchTimer = null;
+let productSearchController = null;
+let productSearchState = { q: '', offset: 0 };
+
 function filterProducts() {
-  const q = (document.getElementById("search").value || "").toLowerCase();
+  const q = (document.getElementById("search").value || "").trim();
   const list = document.getElementById("productList");
   const hint = document.getElementById('cashier-product-hint');
   if (!list) return;
 
+  clearTimeout(productSearchTimer);
+
   // Jika query kosong, sembunyikan seluruh daftar dan tampilkan hint
   if (!q) {
+    if (productSearchController) productSearchController.abort();
     list.style.display = 'none';
+    list.innerHTML = '';
     if (hint) hint.textContent = 'Ketik untuk menampilkan produk';
     return;
   }
 
-  // Tampilkan daftar dan filter item
-  list.style.display = '';
-  if (hint) hint.textContent = `Hasil pencarian: "${q}"`;
+  // Debounce supaya tidak request di setiap ketukan
+  productSearchTimer = setTimeout(() => searchProducts(q, 0), 150);
+}
+
+async function searchProducts(q, offset) {
+  const list = document.getElementById("productList");
+  const hint = document.getElementById('cashier-product-hint');
+
+  if (productSearchController) productSearchController.abort();
+  productSearchController = new AbortController();
+
+  try {
+    const params = new URLSearchParams({ q, limit: PRODUCT_SEARCH_LIMIT, offset });
+    const response = await fetch(`/api/products/search?${params}`, { signal: productSearchController.signal });
+    const data = await response.json();
+
+    productSearchState = { q, offset: offset + data.items.length };
+    if (offset === 0) list.innerHTML = '';
+    const moreBtn = list.querySelector('.pitem-more');
+    if (moreBtn) moreBtn.remove();
+
+    data.items.forEach(p => list.appendChild(renderProductItem(p)));
+
+    if (data.has_more) {
+      const more = document.createElement('button');
+      more.type = 'button';
+      more.className = 'pitem pitem-more';
+      more.textContent = 'Tampilkan lebih banyak...';
+      more.onclick = () => searchProducts(productSearchState.q, productSearchState.offset);
+      list.appendChild(more);
+    }
+
+    list.style.display = '';
+    if (hint) {
+      hint.textContent = list.querySelector('.pitem')
+        ? `Hasil pencarian: "${q}"`
+        : `Tidak ada produk untuk "${q}"`;
+    }
+  } catch (error) {
+    if (error.name !== 'AbortError') console.error('Error searching products:', error);
+  }
+}
+
+function renderProductItem(p) {
+  const btn = document.createElement('button');
+  btn.className = 'pitem';
+  btn.dataset.code = p.code;
+  btn.product = p;
+  const name = document.createElement('b');
+  name.textContent = p.name;
+  const info = document.createElement('small');
+  info.textContent = `${p.code} • ${formatCurrency(p.price)} • Stok: ${p.stock}`;
+  btn.append(name, document.createElement('br'), info);
+  btn.onclick = () => addToCart(p.code, p.name, p.price);
+  return btn;
+}
+
+// Server-Sent Events: jam toko dan perubahan stok produk tanpa polling.
+// Waktu server hanya diterima sekali (event "hello"), selanjutnya jam
+// dihitung di browser dari selisih waktu dan offset zona waktu toko.
+let serverClock = null; // { skewMs, offsetMinutes, timezone }
+// Versi katalog terakhir yang diketahui (dari "hello" dan event "products"),
+// untuk mengejar perubahan yang terlewat selama SSE terputus
+let catalogVersion = null;
+
+const clockFormatter = new Intl.DateTimeFormat('id-ID', {
+  weekday: 'long',
+  year: 'numeric',
+  month: 'long',
+  day: 'numeric',
+  hour: '2-digit',
+  minute: '2-digit',
+  second: '2-digit',
+  hour12: false,
+  timeZone: 'UTC'
+});
+
+function renderClock() {
+  const timeDisplay = document.getElementById('current-time-display');
+  if (!timeDisplay || !serverClock) return;
+  // Geser waktu UTC dengan offset toko lalu format sebagai UTC
+  const storeTime = new Date(Date.now() + serverClock.skewMs + serverClock.offsetMinutes * 60000);
+  timeDisplay.textContent = clockFormatter.format(storeTime) + ' (' + serverClock.timezone + ')';
+}
+
+function applyProductEvent(data) {
+  if (data.version && (catalogVersion === null || data.full || data.version > catalogVersion)) catalogVersion = data.version;
+  const list = document.getElementById('productList');
+  if (!list) return;
+  if (data.full) {
+    // Perubahan besar (import/clear): ulangi pencarian yang sedang tampil
+    if (productSearchState.q && list.style.display !== 'none') searchProducts(productSearchState.q, 0);
+    return;
+  }
+  (data.deleted || []).forEach(code => {
+    const el = list.querySelector(`.pitem[data-code="${CSS.escape(code)}"]`);
+    if (el) el.remove();
+  });
+  (data.products || []).forEach(change => {
+    const el = list.querySelector(`.pitem[data-code="${CSS.escape(change.code)}"]`);
+    if (!el || !el.product) return;
+    const p = Object.assign({}, el.product, change);
+    if (p.status && p.status !== 'active') el.remove();
+    else el.replaceWith(renderProductItem(p));
+  });
+}
+
+// Delta sync: produk yang berubah/dihapus sejak versi `since`, diterapkan
+// seperti event "products" (snapshot penuh = ulangi pencarian)
+async function syncCatalog(since) {
+  try {
+    const response = await fetch(`/api/catalog/changes?since=${since}`);
+    if (!response.ok) return;
+    const data = await response.json();
+    const products = data.full ? [] : data.products.map(row => Object.fromEntries(data.columns.map((c, i) => [c, row[i]])));
+    applyProductEvent({ version: data.version, full: data.full, products, deleted: data.deleted });
+  } catch (error) {
+    console.error('Error syncing catalog:', error);
+  }
+}
 
-  [...list.children].forEach(btn => {
-    const text = btn.innerText.toLowerCase();
-    btn.style.display = text.includes(q) ? "" : "none";
+function connectEvents() {
+  if (!window.EventSource) return;
+  const source = new EventSource('/api/events');
+  source.addEventListener('hello', (e) => {
+    const data = JSON.parse(e.data);
+    serverClock = {
+      skewMs: data.server_time_ms - Date.now(),
+      offsetMinutes: data.utc_offset_minutes,
+      timezone: data.timezone
+    };
+    renderClock();
+    // Reconnect: ambil perubahan katalog yang terlewat selama terputus
+    if (catalogVersion !== null && data.catalog_version !== catalogVersion) syncCatalog(catalogVersion);
+    else catalogVersion = data.catalog_version;
   });
+  source.addEventListener('settings', (e) => {
+    const data = JSON.parse(e.data);
+    if (!serverClock) return;
+    serverClock.offsetMinutes = data.utc_offset_minutes;
+    serverClock.timezone = data.timezone;
+    renderClock();
+  });
+  source.addEventListener('products', (e) => applyProductEvent(JSON.parse(e.data)));
+  // EventSource otomatis reconnect; saat tersambung lagi "hello" dikirim ulang
 }
 
+document.addEventListener('DOMContentLoaded', () => {
+  if (!document.getElementById('current-time-display') && !document.getElementById('productList')) return;
+  connectEvents();
+  setInterval(renderClock, 1000);
+});
+
 // Reports page logic
 document.addEventListener('DOMContentLoaded', () => {
   if (document.getElementById('reports-page')) {
@@ -247,6 +401,60 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 });
 
+// Tabel transaksi laporan: halaman berikutnya dimuat dengan keyset cursor
+document.addEventListener('DOMContentLoaded', () => {
+  const loadMoreBtn = document.getElementById('load-more-trx');
+  if (!loadMoreBtn) return;
+
+  loadMoreBtn.addEventListener('click', async () => {
+    const tbody = document.getElementById('report-trx-body');
+    const mode = loadMoreBtn.dataset.mode;
+    loadMoreBtn.disabled = true;
+    loadMoreBtn.textContent = 'Memuat...';
+    try {
+      const params = new URLSearchParams({ mode, cursor: loadMoreBtn.dataset.nextCursor });
+      const response = await fetch(`/api/reports/transactions?${params}`);
+      const data = await response.json();
+      data.items.forEach(t => tbody.appendChild(renderReportTrxRow(t, mode)));
+      if (data.next_cursor) {
+        loadMoreBtn.dataset.nextCursor = data.next_cursor;
+      } else {
+        loadMoreBtn.parentElement.remove();
+      }
+    } catch (error) {
+      console.error('Error loading transactions:', error);
+    } finally {
+      loadMoreBtn.disabled = false;
+      loadMoreBtn.textContent = '⬇️ Muat lebih banyak';
+    }
+  });
+});
+
+function renderReportTrxRow(t, mode) {
+  const tr = document.createElement('tr');
+  const cells = [
+    ['col-trx', t.trx_no],
+    ['col-date', t.formatted_created_at],
+    ['col-cashier', t.cashier],
+    ['col-total', formatCurrency(t.total)],
+  ];
+  cells.forEach(([cls, value]) => {
+    const td = document.createElement('td');
+    td.className = cls;
+    td.textContent = value;
+    tr.appendChild(td);
+  });
+  const action = document.createElement('td');
+  action.className = 'col-action';
+  const link = document.createElement('a');
+  link.href = `/receipt/${t.id}?from=reports&mode=${encodeURIComponent(mode)}`;
+  link.style.cssText = 'color: #2ea043; text-decoration: none; font-weight: 500;';
+  link.textContent = '👁️ Lihat/Print';
+  action.appendChild(link);
+  tr.appendChild(action);
+  return tr;
+}
+
 async function loadReports() {
   // Get current mode from tabs
   const activeTab = document.querySelector('.tabs .tab.active');
@@ -276,152 +484,35 @@ async function loadReports() {
     }
   }
   
-  // Load Summary Report (with mode parameter)
-  fetch(`/api/reports/summary?mode=${currentMode}`)
+  // Semua panel laporan dari satu request (satu agregasi di server)
+  fetch(`/api/reports/dashboard?mode=${currentMode}`)
     .then(response => response.json())
     .then(data => {
-      document.getElementById('total-products').textContent = data.total_products || 0;
-      document.getElementById('total-transactions').textContent = data.total_transactions || 0;
-      document.getElementById('products-sold').textContent = data.products_sold_this_month || 0;
-    })
-    .catch(error => console.error('Error loading summary report:', error));
+      document.getElementById('total-products').textContent = data.summary.total_products || 0;
+      document.getElementById('total-transactions').textContent = data.summary.total_transactions || 0;
+      document.getElementById('products-sold').textContent = data.summary.products_sold_this_month || 0;
 
-  // Load Top Products Report
-  fetch(`/api/reports/top_products?mode=${currentMode}`)
-    .then(response => response.json())
-    .then(data => {
       const topSellingEl = document.getElementById('top-selling-products');
       topSellingEl.innerHTML = data.top_selling_products.slice(0, 5).map(p => `<li><span class="item-name">${p.name}</span><span class="item-qty">${p.total_qty_sold} unit</span></li>`).join('');
 
       const highestRevenueEl = document.getElementById('highest-revenue-products');
       highestRevenueEl.innerHTML = data.highest_revenue_products.slice(0, 5).map(p => `<li><span class="item-name">${p.name}</span><span class="item-qty">${formatCurrency(p.total_revenue)}</span></li>`).join('');
-    })
-    .catch(error => console.error('Error loading top products report:', error));
 
-  // Load Problem Products Report
-  fetch(`/api/reports/problem_products?mode=${currentMode}`)
-    .then(response => response.json())
-    .then(data => {
       const rarelySoldEl = document.getElementById('rarely-sold-products');
       rarelySoldEl.innerHTML = data.rarely_sold_products.slice(0, 5).map(p => `<li><span class="item-name">${p.name}</span><span class="item-qty">${p.total_qty_sold} unit</span></li>`).join('');
 
       const neverSoldEl = document.getElementById('never-sold-products');
       neverSoldEl.innerHTML = data.never_sold_products.slice(0, 5).map(p => `<li><span class="item-name">${p.name}</span></li>`).join('');
-    })
-    .catch(error => console.error('Error loading problem products report:', error));
 
-  // Load Stock Report
-  fetch(`/api/reports/stock?mode=${currentMode}`)
-    .then(response => response.json())
-    .then(data => {
       const lowStockEl = document.getElementById('low-stock-products');
       lowStockEl.innerHTML = data.low_stock_products.slice(0, 5).map(p => `<li><span class="item-name">${p.name}</span><span class="item-qty">Stok: ${p.stock}</span></li>`).join('');
 
       const overstockEl = document.getElementById('overstock-products');
       overstockEl.innerHTML = data.overstock_products.slice(0, 5).map(p => `<li><span class="item-name">${p.name}</span><span class="item-qty">Stok: ${p.stock}</span></li>`).join('');
-    })
-    .catch(error => console.error('Error loading stock report:', error));
 
-  // Load Sales Trend Report
-  fetch('/api/reports/sales_trend')
-    .then(response => response.json())
-    .then(data => {
-      if (data.sales_trend.length > 0) {
-        const chartCanvas = document.getElementById('sales-trend-chart');
-        const ctx = chartCanvas.getContext('2d');
-        
-        // Prepare chart data
-        const labels = data.sales_trend.map(s => s.month);
-        const values = data.sales_trend.map(s => s.total_sales);
-        
-        // Get theme colors
-        const isDarkMode = document.body.classList.contains('light-mode') === false;
-        const textColor = isDarkMode ? '#e3e9f3' : '#1a1f2e';
-        const gridColor = isDarkMode ? 'rgba(46, 160, 67, 0.1)' : 'rgba(46, 160, 67, 0.3)';
-        const primaryColor = isDarkMode ? '#2ea043' : '#1a8b45';
-        const primaryLight = isDarkMode ? 'rgba(46, 160, 67, 0.2)' : 'rgba(26, 139, 69, 0.35)';
-        
-        new Chart(ctx, {
-          type: 'line',
-          data: {
-            labels: labels,
-            datasets: [{
-              label: 'Omzet Penjualan (Rp)',
-              data: values,
-              borderColor: primaryColor,
-              backgroundColor: primaryLight,
-              borderWidth: isDarkMode ? 3 : 4,
-              fill: true,
-              tension: 0.4,
-              pointBackgroundColor: primaryColor,
-              pointBorderColor: isDarkMode ? '#fff' : '#fff',
-              pointBorderWidth: 3,
-              pointRadius: 7,
-              pointHoverRadius: 9,
-              pointHoverBackgroundColor: primaryColor,
-              pointHoverBorderColor: '#fff',
-              pointHoverBorderWidth: 3
-            }]
-          },
-          options: {
-            responsive: true,
-            maintainAspectRatio: true,
-            plugins: {
-              legend: {
-                display: true,
-                labels: {
-                  color: textColor,
-                  font: { size: 12, weight: '600' },
-                  usePointStyle: true,
-                  padding: 15
-                }
-              },
-              tooltip: {
-                backgroundColor: isDarkMode ? 'rgba(0, 0, 0, 0.8)' : 'rgba(0, 0, 0, 0.7)',
-                padding: 12,
-                titleColor: '#fff',
-                bodyColor: '#fff',
-                borderColor: primaryColor,
-                borderWidth: 1,
-                usePointStyle: true,
-                callbacks: {
-                  label: function(context) {
-                    return 'Rp ' + formatCurrency(context.parsed.y);
-                  }
-                }
-              }
-            },
-            scales: {
-              y: {
-                beginAtZero: true,
-                grid: {
-                  color: gridColor,
-                  drawBorder: false
-                },
-                ticks: {
-                  color: textColor,
-                  font: { size: 11 },
-                  callback: function(value) {
-                    return 'Rp ' + (value / 1000000).toFixed(1) + 'jt';
-                  }
-                }
-              },
-              x: {
-                grid: {
-                  display: false,
-                  drawBorder: false
-                },
-                ticks: {
-                  color: textColor,
-                  font: { size: 11 }
-                }
-              }
-            }
-          }
-        });
-      }
+      renderSalesTrendChart(data.sales_trend);
     })
-    .catch(error => console.error('Error loading sales trend report:', error));
+    .catch(error => console.error('Error loading reports dashboard:', error));
 
   // Export to Excel button logic
   const exportExcelBtn = document.getElementById('export-excel-btn');
@@ -451,9 +542,23 @@ async function loadReports() {
       exportExcelModal.style.display = 'none'; // Hide the modal
     });
 
-    confirmExportBtn.addEventListener('click', () => {
+    confirmExportBtn.addEventListener('click', async () => {
       exportExcelModal.style.display = 'none'; // Hide the modal
-      window.location.href = `/api/reports/export_excel?mode=${currentExportMode}`;
+      const originalText = exportExcelBtn.textContent;
+      exportExcelBtn.disabled = true;
+      try {
+        // Export dibuat di background, file diunduh setelah job selesai
+        const job = await runJob(`/api/jobs/export_report?mode=${currentExportMode}`, {}, (progress) => {
+          exportExcelBtn.textContent = `Menyiapkan... ${progress}%`;
+        });
+        window.location.href = job.download_url;
+      } catch (error) {
+        console.error('Error exporting report:', error);
+        await showAlert(error.message || 'Gagal membuat laporan Excel.', 'Error', 'error');
+      } finally {
+        exportExcelBtn.disabled = false;
+        exportExcelBtn.textContent = originalText;
+      }
     });
 
     // Hide modal if clicked outside of modal content
@@ -465,6 +570,103 @@ async function loadReports() {
   }
 }
 
+function renderSalesTrendChart(salesTrend) {
+  if (salesTrend.length > 0) {
+    const chartCanvas = document.getElementById('sales-trend-chart');
+    const ctx = chartCanvas.getContext('2d');
+    
+    // Prepare chart data
+    const labels = salesTrend.map(s => s.month);
+    const values = salesTrend.map(s => s.total_sales);
+    
+    // Get theme colors
+    const isDarkMode = document.body.classList.contains('light-mode') === false;
+    const textColor = isDarkMode ? '#e3e9f3' : '#1a1f2e';
+    const gridColor = isDarkMode ? 'rgba(46, 160, 67, 0.1)' : 'rgba(46, 160, 67, 0.3)';
+    const primaryColor = isDarkMode ? '#2ea043' : '#1a8b45';
+    const primaryLight = isDarkMode ? 'rgba(46, 160, 67, 0.2)' : 'rgba(26, 139, 69, 0.35)';
+    
+    new Chart(ctx, {
+      type: 'line',
+      data: {
+        labels: labels,
+        datasets: [{
+          label: 'Omzet Penjualan (Rp)',
+          data: values,
+          borderColor: primaryColor,
+          backgroundColor: primaryLight,
+          borderWidth: isDarkMode ? 3 : 4,
+          fill: true,
+          tension: 0.4,
+          pointBackgroundColor: primaryColor,
+          pointBorderColor: isDarkMode ? '#fff' : '#fff',
+          pointBorderWidth: 3,
+          pointRadius: 7,
+          pointHoverRadius: 9,
+          pointHoverBackgroundColor: primaryColor,
+          pointHoverBorderColor: '#fff',
+          pointHoverBorderWidth: 3
+        }]
+      },
+      options: {
+        responsive: true,
+        maintainAspectRatio: true,
+        plugins: {
+          legend: {
+            display: true,
+            labels: {
+              color: textColor,
+              font: { size: 12, weight: '600' },
+              usePointStyle: true,
+              padding: 15
+            }
+          },
+          tooltip: {
+            backgroundColor: isDarkMode ? 'rgba(0, 0, 0, 0.8)' : 'rgba(0, 0, 0, 0.7)',
+            padding: 12,
+            titleColor: '#fff',
+            bodyColor: '#fff',
+            borderColor: primaryColor,
+            borderWidth: 1,
+            usePointStyle: true,
+            callbacks: {
+              label: function(context) {
+                return 'Rp ' + formatCurrency(context.parsed.y);
+              }
+            }
+          }
+        },
+        scales: {
+          y: {
+            beginAtZero: true,
+            grid: {
+              color: gridColor,
+              drawBorder: false
+            },
+            ticks: {
+              color: textColor,
+              font: { size: 11 },
+              callback: function(value) {
+                return 'Rp ' + (value / 1000000).toFixed(1) + 'jt';
+              }
+            }
+          },
+          x: {
+            grid: {
+              display: false,
+              drawBorder: false
+            },
+            ticks: {
+              color: textColor,
+              font: { size: 11 }
+            }
+          }
+        }
+      }
+    });
+  }
+}
+
 function formatInputRupiah(input) {
   let value = input.value.replace(/[^\d]/g, ''); // Hapus semua kecuali angka
   if (value) {
@@ -818,6 +1020,23 @@ async function handleImportDatabase(event) {
   return false;
 }
 
+// Job background (import/export Excel): kirim request lalu pantau progress sampai selesai
+const JOB_POLL_INTERVAL = 1000;
+
+async function runJob(url, options, onProgress) {
+  const response = await fetch(url, Object.assign({ method: 'POST' }, options));
+  const accepted = await response.json();
+  if (!response.ok) throw new Error(accepted.detail || accepted.message || 'Gagal memulai proses.');
+
+  while (true) {
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    const job = await (await fetch(accepted.status_url)).json();
+    if (onProgress) onProgress(job.progress);
+    if (job.status === 'done') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Proses gagal.');
+  }
+}
+
 // Excel Import Logic
 document.addEventListener('DOMContentLoaded', () => {
   const importExcelForm = document.getElementById('import-excel-form');
@@ -841,14 +1060,12 @@ document.addEventListener('DOMContentLoaded', () => {
       uploadExcelBtn.textContent = 'Uploading...';
 
       try {
-        const response = await fetch('/products/import_excel', {
-          method: 'POST',
-          body: formData,
+        const job = await runJob('/api/jobs/import_products', { body: formData }, (progress) => {
+          uploadExcelBtn.textContent = `Memproses... ${progress}%`;
         });
+        const result = job.result;
 
-        const result = await response.json();
-
-        if (response.ok) {
+        if (result.ok) {
           await showAlert(result.message, 'Berhasil', 'success');
           // Reload the page to show updated product list
           window.location.reload();
@@ -857,7 +1074,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
       } catch (error) {
         console.error('Error importing Excel:', error);
-        await showAlert('Terjadi kesalahan jaringan atau server.', 'Error', 'error');
+        await showAlert(error.message || 'Terjadi kesalahan jaringan atau server.', 'Error', 'error');
       } finally {
         uploadExcelBtn.disabled = false;
         uploadExcelBtn.textContent = '⬆️ Upload & Import';
@@ -887,14 +1104,36 @@ document.addEventListener('DOMContentLoaded', () => {
       uploadStockBtn.textContent = 'Uploading...';
 
       try {
-        const response = await fetch('/products/import_stock_update', {
-          method: 'POST',
-          body: formData,
+        // Fase 1: preview perubahan tanpa menyimpan apa pun (file dibaca di job background)
+        const previewJob = await runJob('/api/jobs/preview_stock_update', { body: formData }, (progress) => {
+          uploadStockBtn.textContent = `Membaca file... ${progress}%`;
         });
+        const preview = previewJob.result;
+
+        let summary = `${preview.rows_changed} produk akan diupdate.`
+          + `\nStok bertambah: ${preview.stock_added} unit`
+          + `\nTotal Pengeluaran: ${formatCurrency(preview.total_pengeluaran)}`;
+        if (preview.unknown_codes.length > 0) {
+          summary += `\n\nKode tidak ditemukan: ${preview.unknown_codes.slice(0, 10).join(', ')}`
+            + (preview.unknown_codes.length > 10 ? ` (+${preview.unknown_codes.length - 10} lainnya)` : '');
+        }
+        if (preview.errors.length > 0) {
+          summary += `\n\n${preview.errors.length} baris dilewati:\n${preview.errors.slice(0, 10).join('\n')}`;
+        }
+        if (preview.rows_changed === 0) {
+          await showAlert(summary, 'Tidak Ada Perubahan', 'warning');
+          return;
+        }
+        if (!(await showConfirm(summary + '\n\nLanjutkan update stok?', 'Preview Update Stok'))) return;
 
-        const result = await response.json();
+        // Fase 2: terapkan diff yang sudah dikonfirmasi dalam satu transaksi
+        uploadStockBtn.textContent = 'Menyimpan...';
+        const applyData = new FormData();
+        applyData.append('token', preview.token);
+        const applyResponse = await fetch('/products/import_stock_update/apply', { method: 'POST', body: applyData });
+        const result = await applyResponse.json();
 
-        if (response.ok) {
+        if (applyResponse.ok) {
           let message = result.message;
           if (result.total_pengeluaran > 0) {
             message += `\n\nTotal Pengeluaran: ${formatCurrency(result.total_pengeluaran)}`;
@@ -903,15 +1142,11 @@ document.addEventListener('DOMContentLoaded', () => {
           // Reload the page to show updated product list
           window.location.reload();
         } else {
-          let errorMsg = result.detail || 'Terjadi kesalahan saat mengupdate stok.';
-          if (result.total_pengeluaran > 0) {
-            errorMsg += `\n\nTotal Pengeluaran: ${formatCurrency(result.total_pengeluaran)}`;
-          }
-          await showAlert(errorMsg, 'Error', 'error');
+          await showAlert(result.detail || 'Terjadi kesalahan saat mengupdate stok.', 'Error', 'error');
         }
       } catch (error) {
         console.error('Error importing stock update:', error);
-        await showAlert('Terjadi kesalahan jaringan atau server.', 'Error', 'error');
+        await showAlert(error.message || 'Terjadi kesalahan jaringan atau server.', 'Error', 'error');
       } finally {
         uploadStockBtn.disabled = false;
         uploadStockBtn.textContent = '⬆️ Upload & Update Stok';
@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# Aplikasi dijalankan di atas database sementara. Env harus di-set sebelum
+# modul aplikasi (db.py, jobs.py, ...) di-import.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="pos-test-")
+os.environ.update(
+    POS_DB_URL=f"sqlite:///{os.path.join(WORKDIR, 'pos.db')}",
+    POS_JOB_DIR=os.path.join(WORKDIR, "jobs"),
+    POS_PROFILE_DIR=os.path.join(WORKDIR, "profiles"),
+    POS_SLOW_QUERY_LOG=os.path.join(WORKDIR, "logs", "slow_queries.jsonl"),
+    POS_SLOW_QUERY_MS="0",
+    POS_BCRYPT_ROUNDS="4",
+)
+sys.path.insert(0, ROOT)
+# static/ dan templates/ dibaca relatif terhadap direktori kerja
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import seed
+    seed.seed()
+    import app as pos_app
+    with TestClient(pos_app.app) as client:
+        yield client
+
+
+def login(client, username: str, password: str):
+    resp = client.post("/login", data={"username": username, "password": password}, follow_redirects=False)
+    assert resp.status_code == 302 and resp.headers["location"] != "/login", resp.text
+
+
+def ensure_user(username: str, password: str, role: str = "kasir", display_name: str = None):
+    from auth import hash_password
+    from db import SessionLocal
+    from models import User
+    db = SessionLocal()
+    try:
+        if not db.query(User).filter(User.username == username).first():
+            db.add(User(username=username, password_hash=hash_password(password),
+                        display_name=display_name or username.title(), role=role))
+            db.commit()
+    finally:
+        db.close()
+
+
+def add_product(client, code: str, name: str):
+    form = {"code": code, "name": name, "cost_price": 500, "price": 1000, "stock": 5}
+    assert client.post("/products/add", data=form, follow_redirects=False).status_code == 302
+
+
+def product_id(code: str) -> int:
+    from db import SessionLocal
+    from models import Product
+    db = SessionLocal()
+    try:
+        return db.query(Product.id).filter(Product.code == code).scalar()
+    finally:
+        db.close()
+
+
+def wait_for_job(client, job_id: str, timeout: float = 30) -> dict:
+    """Poll /api/jobs/{id} sampai job selesai/gagal"""
+    deadline = time.time() + timeout
+    while True:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed") or time.time() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def run_job(client, url: str, **kwargs) -> dict:
+    """Submit job lalu tunggu hasilnya"""
+    resp = client.post(url, **kwargs)
+    assert resp.status_code == 202, resp.text
+    return wait_for_job(client, resp.json()["job_id"])
+
+
+@pytest.fixture
+def admin(client):
+    login(client, "admin", "admin123")
+    yield client
+    client.get("/logout", follow_redirects=False)
+
+
+@pytest.fixture
+def kasir(client):
+    """Client yang login sebagai user dengan role kasir (bukan admin)"""
+    ensure_user("kasir", "kasir123", role="kasir", display_name="Kasir")
+    login(client, "kasir", "kasir123")
+    yield client
+    client.get("/logout", follow_redirects=False)
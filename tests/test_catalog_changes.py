@@ -0,0 +1,57 @@
+from catalog import reset_catalog
+from conftest import add_product, product_id
+from db import SessionLocal
+
+
+def _changes(client, since: int) -> dict:
+    resp = client.get("/api/catalog/changes", params={"since": since})
+    assert resp.status_code == 200
+    data = resp.json()
+    data["codes"] = [dict(zip(data["columns"], row))["code"] for row in data["products"]]
+    return data
+
+
+def test_delta_and_tombstones(admin):
+    add_product(admin, "CAT-1", "Produk Katalog Satu")
+    add_product(admin, "CAT-2", "Produk Katalog Dua")
+    since = _changes(admin, 0)["version"]
+
+    form = {"pid": product_id("CAT-1"), "name": "Produk Katalog Baru"}
+    assert admin.post("/products/update_name", data=form).json()["success"]
+    assert admin.post("/products/delete", data={"pid": product_id("CAT-2")}, follow_redirects=False).status_code == 302
+
+    delta = _changes(admin, since)
+    assert not delta["full"]
+    assert delta["version"] > since
+    assert delta["codes"] == ["CAT-1"]
+    assert dict(zip(delta["columns"], delta["products"][0]))["name"] == "Produk Katalog Baru"
+    assert delta["deleted"] == ["CAT-2"]
+
+    # Sudah up to date: delta kosong
+    latest = _changes(admin, delta["version"])
+    assert not latest["full"] and latest["products"] == [] and latest["deleted"] == []
+
+    import app as pos_app
+    assert pos_app.get_events_hello()["catalog_version"] == delta["version"]
+
+
+def test_full_snapshot_fallbacks(admin):
+    add_product(admin, "CAT-3", "Produk Katalog Tiga")
+    version = _changes(admin, 0)["version"]
+
+    for since in (0, -5, version + 1000):
+        snapshot = _changes(admin, since)
+        assert snapshot["full"] and snapshot["deleted"] == []
+        assert "CAT-3" in snapshot["codes"]
+
+    # Reset katalog (clear/import database): versi lama sebelum reset dapat snapshot penuh
+    db = SessionLocal()
+    try:
+        reset_catalog(db)
+        db.commit()
+    finally:
+        db.close()
+    after_reset = _changes(admin, version)
+    assert after_reset["full"] and after_reset["version"] > version
+    assert "CAT-3" in after_reset["codes"]
+    assert not _changes(admin, after_reset["version"])["full"]
@@ -0,0 +1,83 @@
+import json
+
+from db import SessionLocal
+from models import Product, Transaction, TransactionItem
+
+
+def _add_products(*rows):
+    db = SessionLocal()
+    try:
+        for code, stock, cost_price in rows:
+            db.query(Product).filter(Product.code == code).delete()
+            db.add(Product(code=code, name=f"Produk {code}", price=1000, cost_price=cost_price, stock=stock))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _baseline(cart, stock, cost):
+    """Checkout lama: satu query per baris, stok di-clamp ke 0, produk tak dikenal cost_price 0"""
+    stock = dict(stock)
+    items = []
+    for it in cart:
+        known = it["code"] in stock
+        if known:
+            stock[it["code"]] = max(0, stock[it["code"]] - it["qty"])
+        items.append((it["code"], it["qty"], it["price"] * it["qty"], cost[it["code"]] if known else 0))
+    return stock, items
+
+
+def _checkout(client, cart, paid=1_000_000):
+    return client.post("/api/checkout", data={"payment_method": "cash", "paid": paid, "cart_json": json.dumps(cart)})
+
+
+def test_batched_checkout_matches_per_line_baseline(admin):
+    _add_products(("BATCH-A", 10, 700), ("BATCH-B", 2, 400))
+    cart = [
+        {"code": "BATCH-A", "name": "A", "price": 1000, "qty": 3},
+        {"code": "BATCH-B", "name": "B", "price": 500, "qty": 5},  # stok kurang: jadi 0, bukan error
+        {"code": "BATCH-TIDAK-ADA", "name": "X", "price": 250, "qty": 1},  # tetap terjual
+        {"code": "BATCH-A", "name": "A", "price": 1000, "qty": 2},
+    ]
+    expected_stock, expected_items = _baseline(
+        cart, {"BATCH-A": 10, "BATCH-B": 2}, {"BATCH-A": 700, "BATCH-B": 400})
+
+    resp = _checkout(admin, cart)
+    assert resp.status_code == 200 and resp.json()["success"], resp.text
+    receipt = resp.json()["receipt"]
+    assert receipt["total"] == 1000 * 5 + 500 * 5 + 250
+
+    db = SessionLocal()
+    try:
+        stock = dict(db.query(Product.code, Product.stock).filter(Product.code.in_(["BATCH-A", "BATCH-B"])))
+        trx = db.query(Transaction).filter(Transaction.trx_no == receipt["trx_no"]).one()
+        items = [
+            (it.product_code, it.qty, it.subtotal, it.cost_price)
+            for it in db.query(TransactionItem).filter(TransactionItem.transaction_id == trx.id).order_by(TransactionItem.id)
+        ]
+    finally:
+        db.close()
+    assert stock == expected_stock == {"BATCH-A": 5, "BATCH-B": 0}
+    assert items == expected_items
+
+
+def test_checkout_errors_do_not_write(admin):
+    _add_products(("BATCH-C", 10, 700))
+    cart = [{"code": "BATCH-C", "name": "C", "price": 1000, "qty": 1}]
+    db = SessionLocal()
+    try:
+        before = db.query(Transaction).count()
+    finally:
+        db.close()
+
+    assert _checkout(admin, cart, paid=999).json()["error"] == "paid-less"
+    assert _checkout(admin, []).json()["error"] == "empty"
+    resp = admin.post("/api/checkout", data={"payment_method": "cash", "paid": 1000, "cart_json": "{rusak"})
+    assert resp.status_code == 400 and resp.json()["error"] == "invalid"
+
+    db = SessionLocal()
+    try:
+        assert db.query(Transaction).count() == before
+        assert db.query(Product.stock).filter(Product.code == "BATCH-C").scalar() == 10
+    finally:
+        db.close()
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from conftest import login
+from db import SessionLocal
+from test_checkout import _add_products
+
+# Panel dashboard -> (helper per panel, kolom nilai, urutan menurun?)
+PANELS = {
+    "top_selling_products": ("top_products", "total_qty_sold", True),
+    "highest_revenue_products": ("top_products", "total_revenue", True),
+    "rarely_sold_products": ("problem_products", "total_qty_sold", False),
+    "never_sold_products": ("problem_products", None, None),
+    "low_stock_products": ("stock", "stock", False),
+    "overstock_products": ("stock", "stock", True),
+}
+
+
+def _rows(items, value):
+    return sorted((p["name"], round(p[value], 2) if value else None) for p in items)
+
+
+def _legacy(pos_app, db, mode):
+    return {
+        "summary": pos_app.get_summary_report_helper(db, mode),
+        "top_products": pos_app.get_top_products_report_helper(db, mode),
+        "problem_products": pos_app.get_problem_products_report_helper(db, mode),
+        "stock": pos_app.get_stock_report_helper(db, mode),
+        "sales_trend": pos_app.get_sales_trend_report_helper(db),
+    }
+
+
+@pytest.fixture(scope="module")
+def sales(client):
+    login(client, "admin", "admin123")
+    # Stok: hampir habis, normal, overstock; DASH-D tidak pernah terjual
+    _add_products(("DASH-A", 5, 400), ("DASH-B", 50, 300), ("DASH-C", 150, 200), ("DASH-D", 3, 100))
+    for cart in (
+        [{"code": "DASH-A", "name": "A", "price": 1000, "qty": 7}, {"code": "DASH-B", "name": "B", "price": 1500, "qty": 2}],
+        [{"code": "DASH-B", "name": "B", "price": 1500, "qty": 1}, {"code": "DASH-C", "name": "C", "price": 2500, "qty": 4}],
+    ):
+        resp = client.post("/api/checkout", data={"payment_method": "cash", "paid": 100_000, "cart_json": json.dumps(cart)})
+        assert resp.status_code == 200, resp.text
+    client.get("/logout", follow_redirects=False)
+
+
+@pytest.mark.parametrize("mode", ["daily", "monthly", "yearly"])
+def test_dashboard_matches_per_panel_helpers(sales, mode):
+    import app as pos_app
+    db = SessionLocal()
+    try:
+        dashboard = pos_app.get_dashboard_report_helper(db, mode)
+        legacy = _legacy(pos_app, db, mode)
+    finally:
+        db.close()
+
+    assert dashboard["summary"] == legacy["summary"]
+    assert dashboard["sales_trend"] == legacy["sales_trend"]["sales_trend"]
+    for key, (panel, value, descending) in PANELS.items():
+        # Isi sama; urutan hanya dibandingkan lewat nilai (nama dengan nilai sama boleh tertukar)
+        assert _rows(dashboard[key], value) == _rows(legacy[panel][key], value), key
+        if value:
+            values = [p[value] for p in dashboard[key]]
+            assert values == sorted(values, reverse=descending), key
+
+    names = lambda key: {p["name"] for p in dashboard[key]}
+    assert {"Produk DASH-A", "Produk DASH-B", "Produk DASH-C"} <= names("highest_revenue_products")
+    assert "Produk DASH-D" in names("never_sold_products")
+    assert {"Produk DASH-B"} <= names("rarely_sold_products")
+    assert "Produk DASH-C" in names("overstock_products")
@@ -0,0 +1,38 @@
+from db import SessionLocal
+from events import broker, publish_after_commit
+
+
+def _capture(monkeypatch) -> list:
+    published = []
+    monkeypatch.setattr(broker, "publish", lambda name, data: published.append((name, data)))
+    return published
+
+
+def test_pending_events_dropped_on_rollback(client, monkeypatch):
+    published = _capture(monkeypatch)
+    db = SessionLocal()
+    try:
+        publish_after_commit(db, "stock", {"code": "EVT-1", "stock": 1})
+        assert published == []
+        db.rollback()
+        assert published == []
+        assert "pending_events" not in db.info
+
+        # Commit berikutnya tidak ikut mengirim event dari transaksi yang dibatalkan
+        publish_after_commit(db, "stock", {"code": "EVT-2", "stock": 2})
+        db.commit()
+        assert published == [("stock", {"code": "EVT-2", "stock": 2})]
+    finally:
+        db.close()
+
+
+def test_pending_events_dropped_when_session_closed_without_commit(client, monkeypatch):
+    published = _capture(monkeypatch)
+    db = SessionLocal()
+    try:
+        db.connection()  # transaksi aktif, seperti request yang gagal di tengah jalan
+        publish_after_commit(db, "stock", {"code": "EVT-3", "stock": 3})
+    finally:
+        db.close()
+    assert published == []
+    assert "pending_events" not in db.info
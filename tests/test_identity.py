@@ -0,0 +1,17 @@
+import json
+
+import identity
+from identity import clear_identity_cache
+
+
+def test_async_checkout_loads_identity_without_sync_session(admin, monkeypatch):
+    def no_sync_session():
+        raise AssertionError("route async tidak boleh membuka SessionLocal di threadpool")
+
+    monkeypatch.setattr(identity, "SessionLocal", no_sync_session)
+    clear_identity_cache()
+    cart = json.dumps([{"code": "TIDAK-ADA", "name": "Produk", "price": 1000, "qty": 1}])
+    resp = admin.post("/api/checkout", data={"payment_method": "cash", "paid": 1000, "cart_json": cart})
+    assert resp.status_code == 200
+    assert resp.json()["receipt"]["cashier"] == "Admin Toko"
+    assert identity.stats["misses"] >= 1
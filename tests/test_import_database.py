@@ -0,0 +1,60 @@
+import json
+import sqlite3
+
+from db import DB_PATH, SessionLocal
+from models import Product
+
+
+def _add_product(code: str, stock: int):
+    db = SessionLocal()
+    try:
+        db.add(Product(code=code, name=f"Produk {code}", price=1000, cost_price=800, stock=stock))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _checkout(client, code: str):
+    cart = json.dumps([{"code": code, "name": f"Produk {code}", "price": 1000, "qty": 1}])
+    return client.post("/api/checkout", data={"payment_method": "cash", "paid": 1000, "cart_json": cart})
+
+
+def _backup(path):
+    source = sqlite3.connect(DB_PATH)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def test_async_checkout_writes_to_imported_database(admin, tmp_path):
+    # Pool async sudah memegang koneksi ke file database lama
+    _add_product("OLD-1", 10)
+    assert _checkout(admin, "OLD-1").json()["success"]
+
+    # File yang diimport: salinan database dengan produk yang belum ada di file lama
+    backup = tmp_path / "backup.db"
+    _add_product("IMPORT-1", 10)
+    _backup(backup)
+    db = SessionLocal()
+    try:
+        db.query(Product).filter(Product.code == "IMPORT-1").delete()
+        db.commit()
+    finally:
+        db.close()
+
+    resp = admin.post("/settings/import_db", files={"file": ("backup.db", backup.read_bytes())}, follow_redirects=False)
+    assert resp.headers["location"] == "/settings?msg=imported"
+
+    resp = _checkout(admin, "IMPORT-1")
+    assert resp.json()["success"], resp.text
+    trx_no = resp.json()["receipt"]["trx_no"]
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        assert conn.execute("SELECT stock FROM products WHERE code = 'IMPORT-1'").fetchone() == (9,)
+        assert conn.execute("SELECT COUNT(*) FROM transactions WHERE trx_no = ?", (trx_no,)).fetchone() == (1,)
+    finally:
+        conn.close()
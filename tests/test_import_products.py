@@ -0,0 +1,92 @@
+import io
+import math
+
+import pandas as pd
+
+from db import SessionLocal
+from importers import PRODUCT_IMPORT_COLUMNS, import_products
+from models import Product
+
+ROWS = [
+    ["IMP-1", "Produk Satu", 800, 1000, 10],
+    ["IMP-2", "Produk Dua", "abc", 1000, 5],
+    ["IMP-3", "Produk Tiga", 800, 1000, -1],
+    ["IMP-1", "Produk Satu Baru", 900, 1200, 7],  # kode dobel dalam satu file
+    ["IMP-ADA", "Produk Ada", 100, 200, 3],
+    ["IMP-4", "Produk Empat", None, 1000, 5],
+    ["IMP-5", "Produk Lima", 800, 1000, None],
+    [" IMP-6 ", "Produk Enam", 800, 1000, 2.9],
+]
+
+
+def _excel_frame(rows) -> pd.DataFrame:
+    """Round-trip lewat Excel supaya tipe kolom sama dengan upload sungguhan"""
+    buf = io.BytesIO()
+    pd.DataFrame(rows, columns=PRODUCT_IMPORT_COLUMNS).to_excel(buf, index=False)
+    buf.seek(0)
+    return pd.read_excel(buf, engine='openpyxl')
+
+
+def _baseline_import(df: pd.DataFrame, existing: set):
+    """Loop per baris dari versi lama /products/import_excel (tanpa database)"""
+    added = updated = 0
+    errors = []
+    for index, row in df.iterrows():
+        code = str(row['kode_produk']).strip()
+        name = str(row['nama_produk']).strip()
+        try:
+            cost_price = float(row['harga_asli'])
+            price = float(row['harga_jual'])
+            stock = int(row['stok'])
+            # Satu-satunya perubahan disengaja: harga kosong (NaN) dulu lolos lalu gagal
+            # NOT NULL saat commit (seluruh import 500), sekarang ditolak per baris
+            if math.isnan(cost_price) or math.isnan(price):
+                raise ValueError
+        except ValueError:
+            errors.append(f"Baris {index + 2}: Harga atau stok tidak valid untuk produk {code}.")
+            continue
+        if not code or not name or cost_price < 0 or price < 0 or stock < 0:
+            errors.append(f"Baris {index + 2}: Data produk tidak lengkap atau tidak valid (kode, nama, harga_asli, harga_jual, stok).")
+            continue
+        # Autoflush: kode baru yang muncul lagi di file yang sama terhitung "diperbarui"
+        if code in existing:
+            updated += 1
+        else:
+            existing.add(code)
+            added += 1
+    return added, updated, errors
+
+
+def test_import_messages_match_baseline(client):
+    db = SessionLocal()
+    try:
+        db.add(Product(code="IMP-ADA", name="Lama", price=1, cost_price=1, stock=1))
+        db.commit()
+        df = _excel_frame(ROWS)
+        added, updated, errors = _baseline_import(df, {"IMP-ADA"})
+        assert (added, updated, len(errors)) == (2, 2, 4)
+
+        ok, content = import_products(db, df)
+        assert ok is False
+        assert content["message"] == (f"Berhasil mengimpor {added} produk baru dan memperbarui {updated} produk."
+                                      " Namun, ada beberapa kesalahan:")
+        assert content["detail"] == "Beberapa produk gagal diimpor:\n" + "\n".join(errors)
+
+        products = {p.code: p for p in db.query(Product).filter(Product.code.like("IMP-%"))}
+        assert sorted(products) == ["IMP-1", "IMP-6", "IMP-ADA"]
+        # Baris terakhir untuk kode dobel yang dipakai, stok desimal dipotong seperti int()
+        assert (products["IMP-1"].name, products["IMP-1"].price, products["IMP-1"].stock) == ("Produk Satu Baru", 1200, 7)
+        assert products["IMP-6"].stock == 2
+        assert (products["IMP-ADA"].name, products["IMP-ADA"].stock) == ("Produk Ada", 3)
+    finally:
+        db.close()
+
+
+def test_import_without_errors(client):
+    db = SessionLocal()
+    try:
+        ok, content = import_products(db, _excel_frame([["IMP-OK", "Produk Oke", 100, 150, 4]]))
+        assert ok is True
+        assert content == {"message": "Berhasil mengimpor 1 produk baru dan memperbarui 0 produk."}
+    finally:
+        db.close()
@@ -0,0 +1,113 @@
+import io
+import os
+
+import pandas as pd
+
+import importers
+from conftest import run_job
+from db import SessionLocal
+from importers import STOCK_IMPORT_COLUMNS
+from models import Product, StockUpdate
+
+
+def _stock_file(code: str, stock: int, *more) -> bytes:
+    """File update stok; pasangan (kode, stok) tambahan lewat *more"""
+    rows = [(code, stock)] + list(more)
+    buf = io.BytesIO()
+    pd.DataFrame([[c, 800, 1000, s] for c, s in rows], columns=STOCK_IMPORT_COLUMNS).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def _set_stock(code: str, stock: int):
+    db = SessionLocal()
+    try:
+        product = db.query(Product).filter(Product.code == code).first()
+        if product is None:
+            db.add(Product(code=code, name=f"Produk {code}", price=1000, cost_price=800, stock=stock))
+        else:
+            product.stock = stock
+        db.commit()
+    finally:
+        db.close()
+
+
+def _sale_after_preview(monkeypatch, code: str):
+    """Stok berubah (seperti ada penjualan) tepat setelah preview dibuat"""
+    preview_stock_updates = importers.preview_stock_updates
+
+    def preview_then_sell(db, df):
+        preview = preview_stock_updates(db, df)
+        _set_stock(code, 9)
+        return preview
+
+    monkeypatch.setattr(importers, "preview_stock_updates", preview_then_sell)
+
+
+def test_stock_import_job_reports_conflict(client, monkeypatch):
+    # Job dijalankan langsung di proses test: monkeypatch tidak sampai ke proses worker jobs.py
+    import app as pos_app
+    from jobs import JobContext, job_file_path, new_job_id
+    _set_stock("STOK-2", 10)
+    _sale_after_preview(monkeypatch, "STOK-2")
+    job_id = new_job_id()
+    upload_path = job_file_path(job_id, "-upload.xlsx")
+    with open(upload_path, "wb") as f:
+        f.write(_stock_file("STOK-2", 5))
+    db = SessionLocal()
+    try:
+        result = pos_app._import_stock_job(db, JobContext(job_id), upload_path, "Admin")
+    finally:
+        db.close()
+    assert result["ok"] is False and result["conflict"] is True
+    assert not os.path.exists(upload_path)
+
+
+def test_stock_import_job_runs_in_worker_process(admin):
+    _set_stock("STOK-4", 10)
+    job = run_job(admin, "/api/jobs/import_stock_update", files={"file": ("stok.xlsx", _stock_file("STOK-4", 12))})
+    assert job["status"] == "done" and job["result"]["ok"], job
+    db = SessionLocal()
+    try:
+        assert db.query(Product.stock).filter(Product.code == "STOK-4").scalar() == 12
+    finally:
+        db.close()
+
+
+def test_preview_job_then_apply(admin):
+    _set_stock("STOK-3", 10)
+    job = run_job(admin, "/api/jobs/preview_stock_update", files={"file": ("stok.xlsx", _stock_file("STOK-3", 15))})
+    preview = job["result"]
+    assert job["status"] == "done" and preview["token"] == job["id"]
+    assert preview["rows_changed"] == 1 and preview["stock_added"] == 5
+
+    resp = admin.post("/products/import_stock_update/apply", data={"token": preview["token"]})
+    assert resp.status_code == 200
+    db = SessionLocal()
+    try:
+        assert db.query(Product.stock).filter(Product.code == "STOK-3").scalar() == 15
+    finally:
+        db.close()
+
+
+def test_apply_conflict_writes_nothing(admin):
+    _set_stock("STOK-5", 10)
+    _set_stock("STOK-6", 10)
+    job = run_job(admin, "/api/jobs/preview_stock_update",
+                  files={"file": ("stok.xlsx", _stock_file("STOK-5", 15, ("STOK-6", 20)))})
+    assert job["status"] == "done" and job["result"]["rows_changed"] == 2, job
+
+    # Penjualan STOK-6 setelah preview; STOK-5 (baris pertama) tidak boleh ikut tersimpan
+    _set_stock("STOK-6", 9)
+    resp = admin.post("/products/import_stock_update/apply", data={"token": job["result"]["token"]})
+    assert resp.status_code == 409
+    assert "berubah sejak preview" in resp.json()["detail"]
+
+    db = SessionLocal()
+    try:
+        stock = dict(db.query(Product.code, Product.stock).filter(Product.code.in_(["STOK-5", "STOK-6"])))
+        assert stock == {"STOK-5": 10, "STOK-6": 9}
+        assert db.query(StockUpdate).filter(StockUpdate.product_code.in_(["STOK-5", "STOK-6"])).count() == 0
+    finally:
+        db.close()
+    # Token sudah terpakai: user harus upload ulang
+    assert admin.post("/products/import_stock_update/apply", data={"token": job["result"]["token"]}).status_code == 404
@@ -0,0 +1,67 @@
+import io
+import os
+import time
+
+import pandas as pd
+
+from conftest import login, run_job
+from events import broker
+from importers import PRODUCT_IMPORT_COLUMNS
+from db import SessionLocal
+from jobs import PROCESS_OWNER, _boot_id, fail_interrupted_jobs, get_job, new_job_id
+from models import Job
+
+
+def _add_job(created_by: str, status: str = "done", owner: str = None) -> str:
+    job_id = new_job_id()
+    db = SessionLocal()
+    try:
+        db.add(Job(id=job_id, kind="export_report", status=status, created_by=created_by, owner=owner))
+        db.commit()
+    finally:
+        db.close()
+    return job_id
+
+
+def test_job_only_visible_to_owner_and_admin(kasir):
+    own_job = _add_job("kasir")
+    other_job = _add_job("admin")
+    assert kasir.get(f"/api/jobs/{own_job}").status_code == 200
+    assert kasir.get(f"/api/jobs/{other_job}").status_code == 404
+    assert kasir.get(f"/api/jobs/{other_job}/download").status_code == 404
+
+    kasir.get("/logout", follow_redirects=False)
+    login(kasir, "admin", "admin123")
+    assert kasir.get(f"/api/jobs/{own_job}").status_code == 200
+
+
+def test_startup_only_fails_jobs_of_dead_processes(client):
+    own = _add_job("admin", "running", PROCESS_OWNER)
+    other_worker = _add_job("admin", "running", f"{_boot_id()}/{os.getppid()}/abcd1234")
+    dead_worker = _add_job("admin", "queued", f"{_boot_id()}/{2 ** 22 + 1}/abcd1234")
+    before_reboot = _add_job("admin", "running", f"boot-lama/{os.getppid()}/abcd1234")
+    legacy = _add_job("admin", "running")
+
+    fail_interrupted_jobs()
+
+    db = SessionLocal()
+    try:
+        status = {job_id: get_job(db, job_id).status for job_id in (own, other_worker, dead_worker, before_reboot, legacy)}
+    finally:
+        db.close()
+    assert status == {own: "running", other_worker: "running", dead_worker: "failed", before_reboot: "failed", legacy: "failed"}
+
+
+def test_job_events_are_relayed_from_worker_process(admin, monkeypatch):
+    published = []
+    monkeypatch.setattr(broker, "publish", lambda name, data: published.append((name, data)))
+    buf = io.BytesIO()
+    pd.DataFrame([["JOB-EVT", "Produk Event", 800, 1000, 3]], columns=PRODUCT_IMPORT_COLUMNS).to_excel(buf, index=False)
+
+    job = run_job(admin, "/api/jobs/import_products", files={"file": ("produk.xlsx", buf.getvalue())})
+    assert job["status"] == "done", job
+    # Diteruskan oleh callback future setelah status job di-commit
+    deadline = time.time() + 5
+    while not published and time.time() < deadline:
+        time.sleep(0.05)
+    assert [data["products"][0]["code"] for name, data in published if name == "products"] == ["JOB-EVT"]
@@ -0,0 +1,82 @@
+import types
+
+from passlib.context import CryptContext
+
+import auth
+from conftest import ensure_user, login
+from db import SessionLocal
+from models import User
+
+
+def _post_login(client, username: str, password: str):
+    return client.post("/login", data={"username": username, "password": password}, follow_redirects=False)
+
+
+def _password_hash(username: str) -> str:
+    db = SessionLocal()
+    try:
+        return db.query(User.password_hash).filter(User.username == username).scalar()
+    finally:
+        db.close()
+
+
+def test_backoff_per_username(client, monkeypatch):
+    ensure_user("backoff", "benar123")
+    for _ in range(auth.LOGIN_FREE_ATTEMPTS):
+        assert _post_login(client, "backoff", "salah").status_code == 200
+    # Diblokir walau password benar; username lain tidak terpengaruh
+    resp = _post_login(client, "backoff", "benar123")
+    assert resp.status_code == 429 and "coba lagi dalam 2 detik" in resp.text
+    login(client, "admin", "admin123")
+    client.get("/logout", follow_redirects=False)
+
+    # Setelah masa blokir lewat, login benar mereset hitungan gagal
+    now = auth.time.monotonic()
+    monkeypatch.setattr(auth, "time", types.SimpleNamespace(monotonic=lambda: now + 3))
+    login(client, "backoff", "benar123")
+    client.get("/logout", follow_redirects=False)
+    assert auth.login_retry_after("backoff") == 0
+
+
+def test_unknown_username_still_runs_bcrypt(client, monkeypatch):
+    import app as pos_app
+    verified = []
+    verify_password_async = pos_app.verify_password_async
+
+    async def recording_verify(password, hashed):
+        verified.append(hashed)
+        return await verify_password_async(password, hashed)
+
+    monkeypatch.setattr(pos_app, "verify_password_async", recording_verify)
+    resp = _post_login(client, "tidak-ada", "admin123")
+    assert resp.status_code == 200 and "Username / password salah" in resp.text
+    assert verified == [auth.dummy_password_hash()]
+    assert verified[0].startswith(f"$2b${auth.BCRYPT_ROUNDS:02d}$")
+    auth.record_login_success("tidak-ada")
+
+
+def test_queue_limit_returns_503(client, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_QUEUE_LIMIT", 0)
+    resp = _post_login(client, "admin", "admin123")
+    assert resp.status_code == 503 and "sibuk" in resp.text
+    # Ditolak sebelum bcrypt: tidak dihitung sebagai percobaan gagal
+    assert auth.login_retry_after("admin") == 0
+
+
+def test_rehash_on_login_when_rounds_change(client):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=5).hash("rehash123")
+    ensure_user("rehash", "dummy")
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.username == "rehash").update({User.password_hash: old_hash})
+        db.commit()
+    finally:
+        db.close()
+
+    login(client, "rehash", "rehash123")
+    client.get("/logout", follow_redirects=False)
+    new_hash = _password_hash("rehash")
+    assert new_hash != old_hash and new_hash.startswith(f"$2b${auth.BCRYPT_ROUNDS:02d}$")
+    # Hash baru tetap bisa dipakai login
+    login(client, "rehash", "rehash123")
+    client.get("/logout", follow_redirects=False)
@@ -0,0 +1,23 @@
+import app as pos_app
+
+
+def test_metrics_requires_admin_or_token(client, monkeypatch):
+    client.get("/logout", follow_redirects=False)
+    monkeypatch.setattr(pos_app, "METRICS_TOKEN", "rahasia")
+
+    assert client.get("/metrics", follow_redirects=False).status_code == 302
+    assert client.get("/metrics", headers={"Authorization": "Bearer salah"}, follow_redirects=False).status_code == 302
+
+    resp = client.get("/metrics", headers={"Authorization": "Bearer rahasia"})
+    assert resp.status_code == 200
+    assert "pos_http_request_duration_seconds" in resp.text
+
+
+def test_metrics_without_token_configured(admin, monkeypatch):
+    monkeypatch.setattr(pos_app, "METRICS_TOKEN", "")
+    assert admin.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 200
+
+
+def test_healthz_stays_public(client):
+    client.get("/logout", follow_redirects=False)
+    assert client.get("/healthz").status_code == 200
@@ -0,0 +1,30 @@
+from profiler import profile_requested
+
+
+def _scope(query: bytes, headers=()):
+    return {"type": "http", "query_string": query, "headers": list(headers)}
+
+
+def test_profile_flag_is_parsed_from_the_query_string():
+    assert profile_requested(_scope(b"_profile=1"))
+    assert profile_requested(_scope(b"mode=daily&_profile=1"))
+    assert not profile_requested(_scope(b"x_profile=10"))
+    assert not profile_requested(_scope(b"_profile=10"))
+    assert not profile_requested(_scope(b"q=_profile=1"))
+    assert not profile_requested(_scope(b""))
+
+
+def test_profile_header():
+    assert profile_requested(_scope(b"", [(b"x-pos-profile", b"1")]))
+    assert not profile_requested(_scope(b"", [(b"x-pos-profile", b"0")]))
+
+
+def test_query_string_without_flag_is_not_parsed(monkeypatch):
+    import profiler
+
+    def fail(*args, **kwargs):
+        raise AssertionError("parse_qs tidak boleh dipanggil")
+
+    monkeypatch.setattr(profiler, "parse_qs", fail)
+    assert not profile_requested(_scope(b"mode=daily&page=2"))
+    assert profile_requested(_scope(b"mode=daily&_profile=1", [(b"x-pos-profile", b"1")]))
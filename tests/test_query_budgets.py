@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_every_route_within_query_budget():
+    # Proses terpisah: check_query_budgets.py membuat database fixture sendiri
+    # (seed.py, ratusan transaksi) sebelum modul aplikasi di-import
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "check_query_budgets.py"), "--verbose"],
+        cwd=ROOT, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr[-2000:]
@@ -0,0 +1,48 @@
+import json
+import re
+
+import report_cache
+
+SUMMARY = "/api/reports/summary"
+
+
+def _checkout(client):
+    cart = json.dumps([{"code": "CACHE-1", "name": "Produk Cache", "price": 5000, "qty": 1}])
+    resp = client.post("/api/checkout", data={"payment_method": "cash", "paid": 5000, "cart_json": cart})
+    assert resp.status_code == 200
+
+
+def test_etag_replay_and_invalidation_after_checkout(admin):
+    first = admin.get(SUMMARY, params={"mode": "daily"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert re.fullmatch(r'W/"[0-9a-f]{16}"', etag)
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    # ETag yang sama: 304 tanpa body, ETag tetap
+    replay = admin.get(SUMMARY, params={"mode": "daily"}, headers={"If-None-Match": etag})
+    assert replay.status_code == 304 and replay.content == b""
+    assert replay.headers["etag"] == etag
+    # Daftar ETag dan "*" juga dikenali
+    assert admin.get(SUMMARY, params={"mode": "daily"}, headers={"If-None-Match": f'W/"lama", {etag}'}).status_code == 304
+    assert admin.get(SUMMARY, params={"mode": "daily"}, headers={"If-None-Match": "*"}).status_code == 304
+
+    # Tanpa If-None-Match: body dari cache in-process, isi sama
+    hits = report_cache.stats["hits"]
+    again = admin.get(SUMMARY, params={"mode": "daily"})
+    assert again.json() == first.json() and report_cache.stats["hits"] == hits + 1
+
+    _checkout(admin)
+    after = admin.get(SUMMARY, params={"mode": "daily"}, headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["etag"] != etag
+    assert after.json()["total_transactions"] == first.json()["total_transactions"] + 1
+
+
+def test_etag_differs_per_endpoint_and_period(admin):
+    etags = {
+        admin.get(SUMMARY, params={"mode": "daily"}).headers["etag"],
+        admin.get(SUMMARY, params={"mode": "yearly"}).headers["etag"],
+        admin.get("/api/reports/dashboard", params={"mode": "daily"}).headers["etag"],
+    }
+    assert len(etags) == 3
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from db import SessionLocal
+from models import Transaction, TransactionItem
+from rollups import apply_checkout_to_rollups
+
+URL = "/api/reports/transactions"
+
+
+def _add_same_time_transactions(prefix: str, offsets, per_offset: int):
+    """Banyak transaksi dengan created_at persis sama (total 0: omzet laporan lain tidak berubah)"""
+    import app as pos_app
+    db = SessionLocal()
+    items = [{"product_code": prefix, "product_name": "Item Halaman", "price": 0, "cost_price": 0, "qty": 1, "subtotal": 0}]
+    try:
+        start, end = pos_app.get_report_period("daily", db)
+        for offset in offsets:
+            for i in range(per_offset):
+                trx = Transaction(trx_no=f"{prefix}-{offset.total_seconds()}-{i:03d}", created_at=start + offset,
+                                  cashier="admin", payment_method="cash", total=0, paid=0, change=0,
+                                  items=[TransactionItem(**it) for it in items])
+                db.add(trx)
+                apply_checkout_to_rollups(db, trx, items)
+        db.commit()
+        rows = (
+            db.query(Transaction.id)
+            .filter(Transaction.created_at >= start, Transaction.created_at <= end)
+            .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+            .all()
+        )
+        return [r.id for r in rows]
+    finally:
+        db.close()
+
+
+def test_load_more_across_equal_timestamps(admin):
+    import app as pos_app
+    # 3 x 40 transaksi: batas halaman (50, 100) jatuh di tengah grup created_at yang sama
+    offsets = [timedelta(seconds=1), timedelta(seconds=2, microseconds=500), timedelta(seconds=3)]
+    expected = _add_same_time_transactions("TRX-PAGE", offsets, 40)
+    assert len(expected) > 2 * pos_app.REPORT_PAGE_SIZE
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        resp = admin.get(URL, params={"mode": "daily", **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert len(data["items"]) <= pos_app.REPORT_PAGE_SIZE
+        seen.extend(item["id"] for item in data["items"])
+        pages += 1
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    # Tidak ada baris dobel atau terlewat, urutan sama dengan ORDER BY created_at DESC, id DESC
+    assert seen == expected
+    assert pages == -(-len(expected) // pos_app.REPORT_PAGE_SIZE)
+
+
+def test_invalid_cursor(admin):
+    assert admin.get(URL, params={"mode": "daily", "cursor": "bukan-cursor"}).status_code == 400
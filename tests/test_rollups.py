@@ -0,0 +1,86 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import text
+
+from db import SessionLocal, engine
+from models import Transaction, TransactionItem
+from rollups import ROLLUP_TABLES, apply_checkout_to_rollups, rebuild_rollups
+from test_checkout import _add_products
+
+
+def _snapshot():
+    with engine.connect() as conn:
+        return {
+            table: [tuple(round(v, 2) if isinstance(v, float) else v for v in row)
+                    for row in conn.execute(text(f"SELECT * FROM {table} ORDER BY 1, 2"))]
+            for table in ROLLUP_TABLES
+        }
+
+
+def _daily_omzet(business_date: str):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT omzet FROM daily_sales WHERE business_date = :d"), {"d": business_date}).scalar()
+
+
+def _add_transaction(trx_no: str, created_at: datetime, total: int):
+    """Transaksi dengan created_at tertentu (UTC), lewat jalur rollup yang sama dengan checkout"""
+    db = SessionLocal()
+    try:
+        if db.query(Transaction.id).filter(Transaction.trx_no == trx_no).first():
+            return
+        items = [{"product_code": "ROLL-A", "product_name": "Produk ROLL-A", "price": total, "cost_price": 600,
+                  "qty": 1, "subtotal": total}]
+        trx = Transaction(trx_no=trx_no, created_at=created_at, cashier="admin", payment_method="transfer",
+                          total=total, paid=total, change=0, items=[TransactionItem(**it) for it in items])
+        db.add(trx)
+        apply_checkout_to_rollups(db, trx, items)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _rebuild(timezone_name=None):
+    with engine.begin() as conn:
+        rebuild_rollups(conn, timezone_name)
+
+
+def test_incremental_rollups_match_rebuild(admin):
+    _add_products(("ROLL-A", 50, 600), ("ROLL-B", 50, 250))
+    for method, cart in [
+        ("cash", [{"code": "ROLL-A", "name": "A", "price": 1000, "qty": 2}]),
+        ("qris", [{"code": "ROLL-A", "name": "A", "price": 1000, "qty": 1},
+                  {"code": "ROLL-B", "name": "B", "price": 500, "qty": 4}]),
+        ("cash", [{"code": "ROLL-B", "name": "B", "price": 500, "qty": 1},
+                  {"code": "ROLL-TIDAK-ADA", "name": "X", "price": 200, "qty": 2}]),
+    ]:
+        r = admin.post("/api/checkout", data={"payment_method": method, "paid": 100_000, "cart_json": json.dumps(cart)})
+        assert r.status_code == 200, r.text
+    # 17:30 UTC = 00:30 WIB keesokan harinya
+    _add_transaction("TRX-ROLLUP-WIB", datetime(2025, 3, 1, 17, 30), 3000)
+
+    incremental = _snapshot()
+    _rebuild()
+    assert _snapshot() == incremental
+
+    # Dikunci per tanggal lokal toko, bukan tanggal UTC
+    assert _daily_omzet("2025-03-02") == 3000
+    assert _daily_omzet("2025-03-01") is None
+
+
+def test_timezone_change_rebuilds_rollups(admin):
+    # 16:30 UTC = 23:30 WIB (hari yang sama) = 01:30 WIT (keesokan harinya)
+    _add_transaction("TRX-ROLLUP-WIT", datetime(2025, 4, 1, 16, 30), 4000)
+    assert _daily_omzet("2025-04-01") == 4000
+
+    form = {"store_name": "Nama Toko Anda", "store_address": "Alamat Toko Anda", "store_phone": "", "timezone": "WIT"}
+    try:
+        assert admin.post("/settings", data=form, follow_redirects=False).status_code == 302
+        assert _daily_omzet("2025-04-01") is None
+        assert _daily_omzet("2025-04-02") == 4000
+        rollups = _snapshot()
+        _rebuild("WIT")
+        assert _snapshot() == rollups
+    finally:
+        admin.post("/settings", data=dict(form, timezone="WIB"), follow_redirects=False)
+    assert _daily_omzet("2025-04-01") == 4000
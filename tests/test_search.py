@@ -0,0 +1,60 @@
+import io
+
+import pandas as pd
+
+from conftest import add_product, product_id, run_job
+from importers import PRODUCT_IMPORT_COLUMNS
+
+
+def _codes(client, q: str):
+    resp = client.get("/api/products/search", params={"q": q})
+    assert resp.status_code == 200
+    return [item["code"] for item in resp.json()["items"]]
+
+
+def test_search_follows_add_edit_and_delete(admin):
+    add_product(admin, "SRC-1", "Kopi Gula Aren")
+    assert _codes(admin, "gula aren") == ["SRC-1"]
+    assert _codes(admin, "SRC-1")[0] == "SRC-1"
+
+    form = {"pid": product_id("SRC-1"), "name": "Teh Tarik Madu", "cost_price": 500, "price": 1000, "stock_add": 0, "stock": 5}
+    assert admin.post("/products/update", data=form, follow_redirects=False).status_code == 302
+    assert _codes(admin, "gula aren") == []
+    assert _codes(admin, "tarik madu") == ["SRC-1"]
+
+    form = {"pid": product_id("SRC-1"), "name": "Susu Kurma"}
+    assert admin.post("/products/update_name", data=form).json()["success"]
+    assert _codes(admin, "tarik") == []
+    assert _codes(admin, "kurma") == ["SRC-1"]
+
+    assert admin.post("/products/delete", data={"pid": product_id("SRC-1")}, follow_redirects=False).status_code == 302
+    assert _codes(admin, "kurma") == []
+
+
+def test_search_after_excel_import(admin):
+    buf = io.BytesIO()
+    pd.DataFrame([["SRC-XL", "Keripik Singkong Balado", 800, 1500, 10]], columns=PRODUCT_IMPORT_COLUMNS).to_excel(buf, index=False)
+    job = run_job(admin, "/api/jobs/import_products", files={"file": ("produk.xlsx", buf.getvalue())})
+    assert job["status"] == "done", job
+    assert _codes(admin, "singkong balado") == ["SRC-XL"]
+
+
+def test_short_terms_use_like_fallback(admin):
+    add_product(admin, "SRC-QZ", "QZ Bolu Pandan")
+    # < 3 huruf tidak bisa dicocokkan trigram: dicari dengan LIKE
+    assert _codes(admin, "qz") == ["SRC-QZ"]
+    # Campuran kata pendek + panjang: FTS untuk "pandan", LIKE untuk "qz"
+    assert _codes(admin, "qz pandan") == ["SRC-QZ"]
+    assert _codes(admin, "qx pandan") == []
+    # Wildcard LIKE di-escape
+    assert "SRC-QZ" not in _codes(admin, "%")
+
+
+def test_search_after_clear_database(admin):
+    """Mengosongkan database ikut mengosongkan index pencarian (dijalankan terakhir di file ini)"""
+    add_product(admin, "SRC-CLR", "Sirup Markisa")
+    assert _codes(admin, "markisa") == ["SRC-CLR"]
+    assert admin.post("/settings/clear_database", follow_redirects=False).headers["location"].endswith("database_cleared")
+    assert _codes(admin, "markisa") == []
+    add_product(admin, "SRC-CLR", "Sirup Markisa")
+    assert _codes(admin, "markisa") == ["SRC-CLR"]
@@ -0,0 +1,40 @@
+import settings_cache
+from db import SessionLocal
+from models import Setting
+
+FORM = {"store_name": "Nama Toko Anda", "store_address": "Alamat Toko Anda", "store_phone": "", "timezone": "WIB"}
+
+
+def _set_store_name_in_db(name: str):
+    """Ubah langsung di database, tanpa lewat route (cache tidak tahu)"""
+    db = SessionLocal()
+    try:
+        db.query(Setting).first().store_name = name
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_settings_post_writes_through_cache(admin):
+    settings_cache.get_settings()  # pastikan cache terisi
+    form = dict(FORM, store_name="Toko Cache Baru", store_phone="0812", timezone="WITA")
+    try:
+        assert admin.post("/settings", data=form, follow_redirects=False).status_code == 302
+
+        # Nilai baru langsung terbaca dari cache, tanpa miss
+        misses = settings_cache.stats["misses"]
+        cached = settings_cache.get_settings()
+        assert (cached.store_name, cached.store_phone, cached.timezone) == ("Toko Cache Baru", "0812", "WITA")
+        assert settings_cache.get_timezone_name() == "WITA"
+        assert settings_cache.stats["misses"] == misses
+
+        # Perubahan di luar route baru terlihat setelah cache di-invalidate
+        _set_store_name_in_db("Toko Diubah Manual")
+        assert settings_cache.get_settings().store_name == "Toko Cache Baru"
+        settings_cache.invalidate_settings_cache()
+        assert settings_cache.get_settings().store_name == "Toko Diubah Manual"
+        assert settings_cache.stats["misses"] == misses + 1
+    finally:
+        admin.post("/settings", data=FORM, follow_redirects=False)
+    assert settings_cache.get_timezone_name() == "WIB"
+    assert settings_cache.get_settings().store_name == "Nama Toko Anda"
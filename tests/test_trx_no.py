@@ -0,0 +1,76 @@
+import threading
+from datetime import datetime
+
+import pytz
+
+from db import SessionLocal
+from models import Transaction
+
+
+def _next_numbers(app_module, terminal, count=1):
+    db = SessionLocal()
+    try:
+        numbers = [app_module.make_trx_no(db, terminal) for _ in range(count)]
+        db.commit()
+        return numbers
+    finally:
+        db.close()
+
+
+def _freeze_day(monkeypatch, app_module, day):
+    now = pytz.timezone("Asia/Jakarta").localize(datetime(*day, 10, 0))
+    monkeypatch.setattr(app_module, "get_current_time_with_tz", lambda db=None: now)
+
+
+def test_sequential_within_day_and_rollover(client, monkeypatch):
+    import app as pos_app
+    _freeze_day(monkeypatch, pos_app, (2025, 5, 1))
+    assert _next_numbers(pos_app, "T1", 3) == ["TRX-20250501-T1-0001", "TRX-20250501-T1-0002", "TRX-20250501-T1-0003"]
+    assert _next_numbers(pos_app, "T1") == ["TRX-20250501-T1-0004"]
+    # Lane lain punya urutan sendiri
+    assert _next_numbers(pos_app, "T2") == ["TRX-20250501-T2-0001"]
+
+    _freeze_day(monkeypatch, pos_app, (2025, 5, 2))
+    assert _next_numbers(pos_app, "T1", 2) == ["TRX-20250502-T1-0001", "TRX-20250502-T1-0002"]
+
+
+def test_sequence_seeded_from_existing_transactions(client, monkeypatch):
+    """Upgrade di tengah hari: belum ada baris trx_sequences, nomor lanjut dari transaksi yang sudah ada"""
+    import app as pos_app
+    _freeze_day(monkeypatch, pos_app, (2025, 5, 3))
+    db = SessionLocal()
+    try:
+        for i in (1, 2, 3):
+            db.add(Transaction(trx_no=f"TRX-20250503-S1-{i:04d}", cashier="admin", total=0, paid=0, change=0))
+        # Lane lain di hari yang sama tidak ikut dihitung
+        db.add(Transaction(trx_no="TRX-20250503-S10-0001", cashier="admin", total=0, paid=0, change=0))
+        db.commit()
+    finally:
+        db.close()
+    assert _next_numbers(pos_app, "S1", 2) == ["TRX-20250503-S1-0004", "TRX-20250503-S1-0005"]
+
+
+def test_concurrent_sessions_get_unique_numbers(client, monkeypatch):
+    import app as pos_app
+    _freeze_day(monkeypatch, pos_app, (2025, 5, 4))
+    per_thread = 20
+    barrier = threading.Barrier(2)
+    results, errors = [], []
+
+    def worker():
+        try:
+            barrier.wait()
+            # Satu commit per nomor, seperti checkout; dua lane mulai bersamaan di hari baru
+            for _ in range(per_thread):
+                results.extend(_next_numbers(pos_app, "C1"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert sorted(results) == [f"TRX-20250504-C1-{i:04d}" for i in range(1, 2 * per_thread + 1)]
@@ -0,0 +1,53 @@
+import io
+import json
+
+from openpyxl import load_workbook
+
+from xlsx_stream import Sheet, stream_xlsx
+
+
+def test_sheet_rows_are_loaded_when_the_sheet_is_written():
+    calls = []
+
+    def rows(name):
+        def load():
+            calls.append(name)
+            return [(name, 1)]
+        return load
+
+    chunks = stream_xlsx([Sheet("Satu", ["A", "B"], rows("satu")), Sheet("Dua", ["A", "B"], rows("dua"))])
+    data = next(chunks)  # workbook.xml dan styles sudah terkirim
+    assert calls == []
+    data += b"".join(chunks)
+    assert calls == ["satu", "dua"]
+    assert load_workbook(io.BytesIO(data))["Dua"]["A2"].value == "dua"
+
+
+def test_report_export_values_and_styles(admin):
+    cart = json.dumps([{"code": "EXPORT-1", "name": "Produk Export", "price": 12500, "qty": 2}])
+    admin.post("/api/checkout", data={"payment_method": "qris", "paid": 25000, "cart_json": cart})
+
+    resp = admin.get("/api/reports/export_excel", params={"mode": "daily"})
+    assert resp.status_code == 200
+    wb = load_workbook(io.BytesIO(resp.content))
+    assert wb.sheetnames[:2] == ["Transaksi", "Ringkasan Keuangan"]
+    assert "Tren Penjualan" in wb.sheetnames
+
+    ws = wb["Transaksi"]
+    assert [c.value for c in ws[1]] == ["TRX_NO", "TANGGAL", "BULAN_TAHUN", "KASIR", "METODE_BAYAR", "TOTAL", "BAYAR", "KEMBALI"]
+    header = ws["A1"]
+    assert header.font.b and header.font.color.rgb == "FFFFFFFF"
+    assert header.fill.fgColor.rgb == "FF4472C4"
+    assert header.alignment.horizontal == "center"
+    assert ws.freeze_panes == "A2"
+
+    last = [c.value for c in ws[ws.max_row]]
+    assert last[4:] == ["qris", 25000, 25000, 0]
+    total = ws.cell(row=ws.max_row, column=6)
+    assert total.number_format == "#,##0" and total.alignment.horizontal == "right"
+    assert total.border.left.style == "thin"
+    assert ws.cell(row=ws.max_row, column=1).alignment.horizontal == "left"
+
+    summary = {row[0]: row[1] for row in wb["Ringkasan Keuangan"].iter_rows(min_row=2, values_only=True)}
+    assert summary["Total Pendapatan"] >= 25000
+    assert summary["Laba/Rugi"] == summary["Total Pendapatan"] - summary["Total Pengeluaran"]
@@ -0,0 +1,215 @@
+import itertools
+import math
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+
+# Penulis XLSX streaming untuk export laporan. File .xlsx disusun langsung
+# sebagai zip yang ditulis ke generator, jadi byte pertama sudah terkirim
+# ke browser sebelum query selesai dan memori tetap kecil berapapun jumlah
+# barisnya. Style ditetapkan saat baris ditulis lewat nama style (STYLES),
+# bukan dengan menelusuri ulang semua sel setelahnya.
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Nama style -> index cellXfs di styles.xml
+STYLES = {"default": 0, "header": 1, "text": 2, "number": 3}
+
+STYLES_XML = XML_DECL + f"""<styleSheet xmlns="{MAIN_NS}">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="#,##0"/></numFmts>
+<fonts count="2">
+<font><sz val="11"/><name val="Calibri"/></font>
+<font><b/><sz val="10"/><color rgb="FFFFFFFF"/><name val="Roboto"/></font>
+</fonts>
+<fills count="3">
+<fill><patternFill patternType="none"/></fill>
+<fill><patternFill patternType="gray125"/></fill>
+<fill><patternFill patternType="solid"><fgColor rgb="FF4472C4"/><bgColor rgb="FF4472C4"/></patternFill></fill>
+</fills>
+<borders count="2">
+<border><left/><right/><top/><bottom/><diagonal/></border>
+<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>
+</borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="4">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>
+<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1" applyAlignment="1"><alignment horizontal="left" vertical="center"/></xf>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="1" xfId="0" applyNumberFormat="1" applyBorder="1" applyAlignment="1"><alignment horizontal="right" vertical="center"/></xf>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+# Lebar kolom dihitung dari header + baris-baris awal (elemen <cols> harus
+# ditulis sebelum data), dibatasi 10-50 karakter seperti export sebelumnya.
+WIDTH_SAMPLE_ROWS = 1000
+MIN_COLUMN_WIDTH = 10
+MAX_COLUMN_WIDTH = 50
+# Data di-flush ke client setiap sekian baris
+FLUSH_EVERY_ROWS = 500
+
+
+class _ByteSink:
+    """File-like tanpa seek/tell: zipfile otomatis menulis mode streaming (data descriptor)"""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+class Sheet:
+    """Satu sheet. `rows` boleh iterable atau fungsi tanpa argumen yang
+    mengembalikan baris; fungsi baru dipanggil saat sheet ini ditulis, jadi
+    query sheet berikutnya belum berjalan selama sheet sebelumnya dikirim."""
+
+    def __init__(self, name: str, headers, rows):
+        self.name = name[:31]
+        self.headers = list(headers)
+        self.rows = rows
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _display_len(value) -> int:
+    if value is None:
+        return 0
+    if _is_number(value):
+        return len(f"{value:,.0f}")
+    return len(str(value))
+
+
+def _column_widths(headers, sample_rows):
+    widths = [len(str(h)) for h in headers]
+    for row in sample_rows:
+        for i, value in enumerate(row[:len(widths)]):
+            widths[i] = max(widths[i], _display_len(value))
+    return [min(max(w + 2, MIN_COLUMN_WIDTH), MAX_COLUMN_WIDTH) for w in widths]
+
+
+def _cell_xml(ref: str, value, header: bool = False) -> str:
+    if value is None:
+        return ""
+    if header:
+        style = STYLES["header"]
+    elif _is_number(value):
+        return f'<c r="{ref}" s="{STYLES["number"]}"><v>{value!r}</v></c>'
+    else:
+        style = STYLES["text"]
+    text = ILLEGAL_CHARACTERS_RE.sub("", str(value))
+    return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _row_xml(row_no: int, letters, values, header: bool = False) -> str:
+    cells = "".join(_cell_xml(f"{letters[i]}{row_no}", v, header) for i, v in enumerate(values[:len(letters)]))
+    attrs = ' ht="20" customHeight="1"' if header else ""
+    return f'<row r="{row_no}"{attrs}>{cells}</row>'
+
+
+def _iter_sheet_xml(sheet: Sheet):
+    letters = [get_column_letter(i + 1) for i in range(len(sheet.headers))]
+    rows = iter(sheet.rows() if callable(sheet.rows) else sheet.rows)
+    sample = list(itertools.islice(rows, WIDTH_SAMPLE_ROWS))
+    widths = _column_widths(sheet.headers, sample)
+
+    cols = "".join(
+        f'<col min="{i + 1}" max="{i + 1}" width="{w}" customWidth="1"/>' for i, w in enumerate(widths)
+    )
+    yield (
+        XML_DECL + f'<worksheet xmlns="{MAIN_NS}">'
+        '<sheetViews><sheetView workbookViewId="0">'
+        '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+        '<selection pane="bottomLeft"/>'
+        '</sheetView></sheetViews>'
+        '<sheetFormatPr defaultRowHeight="15"/>'
+        f'<cols>{cols}</cols><sheetData>'
+        + _row_xml(1, letters, sheet.headers, header=True)
+    )
+
+    row_no = 1
+    batch = []
+    for row in itertools.chain(sample, rows):
+        row_no += 1
+        batch.append(_row_xml(row_no, letters, list(row)))
+        if len(batch) >= FLUSH_EVERY_ROWS:
+            yield "".join(batch)
+            batch = []
+    yield "".join(batch) + "</sheetData></worksheet>"
+
+
+def _workbook_xml(sheets) -> str:
+    entries = "".join(
+        f'<sheet name={quoteattr(s.name)} sheetId="{i}" r:id="rId{i}"/>' for i, s in enumerate(sheets, start=1)
+    )
+    return XML_DECL + f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>{entries}</sheets></workbook>'
+
+
+def _workbook_rels_xml(sheets) -> str:
+    rels = "".join(
+        f'<Relationship Id="rId{i}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, len(sheets) + 1)
+    )
+    rels += f'<Relationship Id="rId{len(sheets) + 1}" Type="{REL_NS}/styles" Target="styles.xml"/>'
+    return XML_DECL + f'<Relationships xmlns="{PKG_REL_NS}">{rels}</Relationships>'
+
+
+def _content_types_xml(sheets) -> str:
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(sheets) + 1)
+    )
+    return XML_DECL + (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{overrides}</Types>'
+    )
+
+
+ROOT_RELS_XML = XML_DECL + (
+    f'<Relationships xmlns="{PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+
+def stream_xlsx(sheets):
+    """Generator byte file .xlsx untuk StreamingResponse. Sheet ditulis berurutan."""
+    sink = _ByteSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _content_types_xml(sheets))
+        zf.writestr("_rels/.rels", ROOT_RELS_XML)
+        zf.writestr("xl/workbook.xml", _workbook_xml(sheets))
+        zf.writestr("xl/_rels/workbook.xml.rels", _workbook_rels_xml(sheets))
+        zf.writestr("xl/styles.xml", STYLES_XML)
+        yield sink.drain()
+        for i, sheet in enumerate(sheets, start=1):
+            with zf.open(f"xl/worksheets/sheet{i}.xml", "w", force_zip64=True) as f:
+                for chunk in _iter_sheet_xml(sheet):
+                    f.write(chunk.encode("utf-8"))
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()